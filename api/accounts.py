@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+
+from .models import Account
+
+CACHE_KEY = 'account_id:{}'
+
+
+def cache_key(user_id):
+    return CACHE_KEY.format(user_id)
+
+
+def get_account_id(request):
+    """Номер счета текущего пользователя или None.
+
+    Результат запоминается на время запроса. Номер берется из кэша
+    user_id -> account_id и только потом из БД; запись в кэше
+    сбрасывается сигналами при создании и удалении счета, а также
+    forget_account, если операция не нашла счет, и попадает в кэш
+    только после фиксации транзакции. Сигналы сбрасывают запись во
+    всех воркерах, только если кэш общий.
+    """
+    if hasattr(request, '_account_id'):
+        return request._account_id
+    key = cache_key(request.user.id)
+    account_id = cache.get(key)
+    if account_id is None:
+        account_id = Account.objects.filter(
+            user_id=request.user.id
+        ).order_by('id').values_list('id', flat=True).first()
+        if account_id is not None:
+            remember_account(key, account_id)
+    request._account_id = account_id
+    return account_id
+
+
+def remember_account(key, account_id):
+    timeout = getattr(settings, 'ACCOUNT_CACHE_TTL', 300)
+    transaction.on_commit(lambda: cache.set(key, account_id, timeout))
+
+
+def get_account_id_or_404(request):
+    account_id = get_account_id(request)
+    if account_id is None:
+        raise Http404('Ваш счет не найден!')
+    return account_id
+
+
+def forget_account(user_id):
+    cache.delete(cache_key(user_id))
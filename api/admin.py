@@ -1,10 +1,85 @@
+import operator
+from functools import reduce
+
 from django.contrib import admin
+from django.db.models import Q
 
-from .models import Account, Action, Service, Transaction, Transfer, User
+from .models import (Account, Action, OutgoingEmail, Service, Transaction,
+                     Transfer, User)
+from .pagination import EstimatedCountPaginator
 
 EMPTY_VALUE = '-пусто-'
 
 
+class RangeListFilter(admin.FieldListFilter):
+    """Фильтр по диапазонам значений числового поля вместо списка всех
+    встречающихся значений."""
+
+    bounds = (0, 1000, 10000, 100000, 1000000)
+
+    def __init__(self, field, request, params, model, model_admin,
+                 field_path):
+        self.lookup_kwarg_since = f'{field_path}__gte'
+        self.lookup_kwarg_until = f'{field_path}__lt'
+        self.field_generic = f'{field_path}__'
+        self.range_params = {
+            name: value for name, value in params.items()
+            if name.startswith(self.field_generic)
+        }
+        self.links = [('Все', {})]
+        edges = (None,) + self.bounds + (None,)
+        for since, until in zip(edges, edges[1:]):
+            range_params = {}
+            if since is not None:
+                range_params[self.lookup_kwarg_since] = str(since)
+            if until is not None:
+                range_params[self.lookup_kwarg_until] = str(until)
+            self.links.append((self.label(since, until), range_params))
+        super().__init__(
+            field, request, params, model, model_admin, field_path
+        )
+
+    def label(self, since, until):
+        if since is None:
+            return f'меньше {until:,}'.replace(',', ' ')
+        if until is None:
+            return f'от {since:,}'.replace(',', ' ')
+        return f'{since:,} - {until:,}'.replace(',', ' ')
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg_since, self.lookup_kwarg_until]
+
+    def choices(self, changelist):
+        for title, range_params in self.links:
+            yield {
+                'selected': self.range_params == range_params,
+                'query_string': changelist.get_query_string(
+                    range_params, [self.field_generic]
+                ),
+                'display': title,
+            }
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Списки для таблиц с миллионами строк: оценка числа строк вместо
+    COUNT(*), сортировка по первичному ключу и поиск по номеру записи
+    без перебора связанных таблиц."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-id',)
+    id_search_fields = ('id',)
+    empty_value_display = EMPTY_VALUE
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if term.isdigit():
+            return queryset.filter(reduce(operator.or_, (
+                Q(**{field: int(term)}) for field in self.id_search_fields
+            ))), False
+        return super().get_search_results(request, queryset, search_term)
+
+
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = ('id', 'username', 'email', 'bio', 'role')
@@ -14,40 +89,62 @@ class UserAdmin(admin.ModelAdmin):
 
 
 @admin.register(Account)
-class AccountAdmin(admin.ModelAdmin):
+class AccountAdmin(LargeTableAdmin):
     list_display = ('id', 'balance', 'user')
-    search_fields = ('user',)
-    list_filter = ('user', 'balance')
-    empty_value_display = EMPTY_VALUE
+    search_fields = ('^user__username', '=user__email')
+    id_search_fields = ('id', 'user_id')
+    list_filter = (('balance', RangeListFilter),)
+    autocomplete_fields = ('user',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
 
 
 @admin.register(Action)
-class ActionAdmin(admin.ModelAdmin):
+class ActionAdmin(LargeTableAdmin):
     list_display = ('id', 'amount', 'date', 'account')
-    search_fields = ('account',)
-    list_filter = ('date', 'account')
-    empty_value_display = EMPTY_VALUE
+    list_select_related = ('account__user',)
+    search_fields = ('^account__user__username',)
+    id_search_fields = ('id', 'account_id')
+    list_filter = ('date', ('amount', RangeListFilter))
+    autocomplete_fields = ('account',)
 
 
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'description', 'price', 'currency')
     search_fields = ('name',)
-    list_filter = ('name', 'currency')
+    list_filter = ('currency',)
     empty_value_display = EMPTY_VALUE
 
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(LargeTableAdmin):
     list_display = ('id', 'date', 'account', 'service')
-    search_fields = ('account', 'service')
-    list_filter = ('date', 'service')
-    empty_value_display = EMPTY_VALUE
+    list_select_related = ('account__user', 'service')
+    search_fields = ('^account__user__username', '^service__name')
+    id_search_fields = ('id', 'account_id', 'service_id')
+    list_filter = ('date', ('amount', RangeListFilter))
+    autocomplete_fields = ('account', 'service')
 
 
 @admin.register(Transfer)
-class TransferAdmin(admin.ModelAdmin):
+class TransferAdmin(LargeTableAdmin):
     list_display = ('id', 'from_account', 'to_account', 'amount', 'date')
-    search_fields = ('from_account', 'to_account')
-    list_filter = ('date', 'from_account', 'to_account')
+    list_select_related = ('from_account__user', 'to_account__user')
+    search_fields = (
+        '^from_account__user__username', '^to_account__user__username'
+    )
+    id_search_fields = ('id', 'from_account_id', 'to_account_id')
+    list_filter = ('date', ('amount', RangeListFilter))
+    autocomplete_fields = ('from_account', 'to_account')
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'recipient', 'subject', 'created', 'attempts', 'sent_at'
+    )
+    search_fields = ('recipient',)
+    list_filter = ('sent_at',)
     empty_value_display = EMPTY_VALUE
@@ -0,0 +1,424 @@
+import gzip
+import json
+import os
+import re
+import shutil
+from datetime import datetime, timezone
+from decimal import Decimal
+from functools import lru_cache
+from itertools import groupby
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone as django_timezone
+from django.utils.functional import cached_property
+
+from .db import partitions
+from .models import Action, Transaction, Transfer
+
+BUCKETS = 64
+BUCKET_FIELDS = {
+    Action: ('account_id',),
+    Transaction: ('account_id',),
+    Transfer: ('from_account_id', 'to_account_id'),
+}
+MONTH_PATTERN = re.compile(r'^(\d{4})-(\d{2})$')
+COMPLETE = 'complete'
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archive_dir():
+    return getattr(
+        settings, 'HISTORY_ARCHIVE_DIR',
+        os.path.join(settings.BASE_DIR, 'archive')
+    )
+
+
+def table_dir(model):
+    return os.path.join(archive_dir(), model._meta.db_table)
+
+
+def month_dir(model, month):
+    return os.path.join(table_dir(model), f'{month:%Y-%m}')
+
+
+def bucket_path(directory, bucket):
+    return os.path.join(directory, f'{bucket:02d}.jsonl.gz')
+
+
+def archived_months(model):
+    try:
+        names = os.listdir(table_dir(model))
+    except FileNotFoundError:
+        return []
+    months = []
+    for name in names:
+        match = MONTH_PATTERN.match(name)
+        if match:
+            months.append(datetime(
+                int(match[1]), int(match[2]), 1, tzinfo=timezone.utc
+            ))
+    return sorted(months)
+
+
+def attnames(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} не сериализуется в архив')
+
+
+def index_path(directory, bucket):
+    return os.path.join(directory, f'{bucket:02d}.index.json')
+
+
+def read_index(directory, bucket):
+    """Индекс корзины: номер счета -> [смещение, длина, итоги по каждому
+    полю из BUCKET_FIELDS]; итог - [число строк, сумма, последняя дата]."""
+    path = index_path(directory, bucket)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return {}
+    return load_index(path, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=512)
+def load_index(path, mtime, size):
+    with open(path, encoding='utf-8') as file:
+        return {int(key): value for key, value in json.load(file).items()}
+
+
+def read_block(directory, bucket, entry):
+    offset, length = entry[:2]
+    with open(bucket_path(directory, bucket), 'rb') as file:
+        file.seek(offset)
+        data = gzip.decompress(file.read(length))
+    return [json.loads(line) for line in data.splitlines()]
+
+
+def read_month(model, directory):
+    """Все строки месяца; перевод из двух корзин читается один раз."""
+    first = BUCKET_FIELDS[model][0]
+    for bucket in range(BUCKETS):
+        for account, entry in read_index(directory, bucket).items():
+            for row in read_block(directory, bucket, entry):
+                if row[first] == account:
+                    yield row
+
+
+class AccountArchive:
+    """Архив истории одного счета для списков.
+
+    Поле lookup должно быть одним из BUCKET_FIELDS модели. Месяцы и
+    число строк счета берутся из индексов корзин, а сами строки
+    читаются при первом обращении к objects и только из блоков этого
+    счета.
+    """
+
+    def __init__(self, model, **lookup):
+        (name, value), = lookup.items()
+        if name not in BUCKET_FIELDS[model]:
+            raise ValueError(f'Архив {model.__name__} не разложен по {name}')
+        self.model = model
+        self.name = name
+        self.value = value
+        position = 2 + BUCKET_FIELDS[model].index(name)
+        bucket = value % BUCKETS
+        self.blocks = []
+        self.totals = []
+        for month in archived_months(model):
+            directory = month_dir(model, month)
+            entry = read_index(directory, bucket).get(value)
+            if entry is not None and entry[position][0]:
+                self.blocks.append((month, directory, entry[:2]))
+                self.totals.append(entry[position])
+        self.total = sum(count for count, _, _ in self.totals)
+
+    def count(self):
+        return self.total
+
+    def amount(self):
+        return sum(
+            (Decimal(amount) for _, amount, _ in self.totals), Decimal(0)
+        )
+
+    def last_date(self):
+        if not self.totals:
+            return None
+        return datetime.fromisoformat(self.totals[-1][2])
+
+    def __bool__(self):
+        return self.total > 0
+
+    def end(self):
+        """Начало месяца, следующего за последним архивным."""
+        if not self.blocks:
+            return None
+        return partitions.add_months(self.blocks[-1][0], 1)
+
+    @cached_property
+    def objects(self):
+        fields = {
+            field.attname: field for field in self.model._meta.concrete_fields
+        }
+        bucket = self.value % BUCKETS
+        objects = []
+        for _, directory, entry in self.blocks:
+            for row in read_block(directory, bucket, entry):
+                if row[self.name] == self.value:
+                    objects.append(self.model(**{
+                        key: fields[key].to_python(item)
+                        for key, item in row.items()
+                    }))
+        return objects
+
+
+def archived(model, **lookup):
+    """Объекты модели из архива, у которых поле lookup равно значению."""
+    return AccountArchive(model, **lookup).objects
+
+
+def recover(directory):
+    """Доводит до конца замену каталога месяца, прерванную после
+    фиксации транзакции, и убирает остатки прерванной выгрузки."""
+    temporary = f'{directory}.tmp'
+    previous = f'{directory}.old'
+    if os.path.exists(os.path.join(temporary, COMPLETE)):
+        replace_dir(temporary, directory)
+    shutil.rmtree(temporary, ignore_errors=True)
+    if os.path.exists(previous) and not os.path.exists(directory):
+        os.replace(previous, directory)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def recover_months(model):
+    try:
+        names = os.listdir(table_dir(model))
+    except FileNotFoundError:
+        return
+    for name in names:
+        month, _, suffix = name.partition('.')
+        if MONTH_PATTERN.match(month) and suffix in ('tmp', 'old'):
+            recover(os.path.join(table_dir(model), month))
+
+
+def replace_dir(source, directory):
+    previous = f'{directory}.old'
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(directory):
+        os.replace(directory, previous)
+    os.replace(source, directory)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+class MonthWriter:
+    """Пишет строки месяца во временный каталог.
+
+    Строки копятся в несжатых файлах корзин; finish сортирует каждую
+    корзину по счету и id, оставляя последнюю запись с каждым id, и
+    сжимает строки каждого счета отдельным блоком gzip, смещения
+    которого пишет в индекс корзины.
+    """
+
+    def __init__(self, model, directory):
+        self.fields = BUCKET_FIELDS[model]
+        self.directory = directory
+        self.temporary = f'{directory}.tmp'
+        self.files = {}
+        self.count = 0
+        self.committed = False
+        recover(directory)
+        os.makedirs(self.temporary)
+
+    def write(self, row):
+        line = json.dumps(row, default=encode_value).encode('utf-8')
+        accounts = {}
+        for position, field in enumerate(self.fields):
+            accounts[row[field]] = accounts.get(row[field], 0) | (
+                1 << position
+            )
+        for account, mask in accounts.items():
+            bucket = account % BUCKETS
+            if bucket not in self.files:
+                self.files[bucket] = open(
+                    os.path.join(self.temporary, f'{bucket:02d}.raw'), 'w+b'
+                )
+            self.files[bucket].write(
+                b'%d %d %d %s\n' % (account, row['id'], mask, line)
+            )
+        self.count += 1
+
+    def finish(self):
+        for bucket, raw in self.files.items():
+            self.finish_bucket(bucket, raw)
+            raw.close()
+            os.remove(raw.name)
+        self.files = {}
+        with open(os.path.join(self.temporary, COMPLETE), 'w'):
+            pass
+
+    def finish_bucket(self, bucket, raw):
+        raw.seek(0)
+        rows = {}
+        for line in raw:
+            account, pk, mask, data = line.split(b' ', 3)
+            rows[int(account), int(pk)] = (int(mask), data)
+        index = {}
+        with open(bucket_path(self.temporary, bucket), 'wb') as file:
+            for account, group in groupby(
+                sorted(rows.items()), key=lambda item: item[0][0]
+            ):
+                masks, lines = zip(*(value for _, value in group))
+                offset = file.tell()
+                file.write(gzip.compress(b''.join(lines)))
+                index[account] = [offset, file.tell() - offset] + [
+                    self.totals([
+                        line for mask, line in zip(masks, lines)
+                        if mask & (1 << position)
+                    ])
+                    for position in range(len(self.fields))
+                ]
+            file.flush()
+            os.fsync(file.fileno())
+        with open(index_path(self.temporary, bucket), 'w') as file:
+            json.dump(index, file)
+
+    @staticmethod
+    def totals(lines):
+        rows = [json.loads(line) for line in lines]
+        last = max(
+            (datetime.fromisoformat(row['date']) for row in rows),
+            default=None,
+        )
+        return [
+            len(rows),
+            str(sum((Decimal(row['amount']) for row in rows), Decimal(0))),
+            last and last.isoformat(),
+        ]
+
+    def publish(self):
+        self.committed = True
+        replace_dir(self.temporary, self.directory)
+
+    def discard(self):
+        for raw in self.files.values():
+            raw.close()
+        self.files = {}
+        shutil.rmtree(self.temporary, ignore_errors=True)
+
+
+def lock_partition(connection, cursor, table, month):
+    """Блокирует отдельную секцию месяца, если она есть."""
+    whole = (
+        connection.vendor == 'postgresql'
+        and partitions.is_partitioned(cursor, table)
+        and month in partitions.monthly_partitions(cursor, table)
+    )
+    if whole:
+        cursor.execute(
+            f'LOCK TABLE {partitions.partition_name(table, month)} '
+            'IN SHARE MODE'
+        )
+    return whole
+
+
+def archive_month(model, month):
+    """Переносит строки месяца в архив и удаляет их из базы.
+
+    Уже заархивированные строки этого месяца переписываются вместе с
+    новыми, повторы по id отбрасываются. Месяц с отдельной секцией
+    PostgreSQL блокируется на время выгрузки и удаляется целиком, иначе
+    строки удаляются по диапазону дат. Каталог месяца подменяется после
+    фиксации транзакции; если подмена не успела, ее завершает следующий
+    запуск.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    table = model._meta.db_table
+    until = partitions.add_months(month, 1)
+    directory = month_dir(model, month)
+    writer = MonthWriter(model, directory)
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            whole = lock_partition(connection, cursor, table, month)
+            for row in read_month(model, directory):
+                writer.write(row)
+            previous = writer.count
+            rows = model._base_manager.using(using).filter(
+                date__gte=month, date__lt=until
+            ).order_by('id').values(*attnames(model))
+            for row in rows.iterator():
+                writer.write(row)
+            if whole:
+                partitions.drop_partition(cursor, table, month)
+            else:
+                if connection.vendor == 'postgresql':
+                    partitions.maintenance(cursor)
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE date >= %s AND date < %s',
+                    [month, until]
+                )
+                if cursor.rowcount != writer.count - previous:
+                    raise ArchiveError(
+                        f'{table} {month:%Y-%m}: строки менялись во время '
+                        'архивации, повторите попытку'
+                    )
+            if writer.count:
+                writer.finish()
+                transaction.on_commit(writer.publish, using=using)
+            else:
+                writer.discard()
+    except BaseException:
+        if not writer.committed:
+            writer.discard()
+        raise
+    return writer.count - previous
+
+
+def months_to_archive(model, cutoff):
+    using = router.db_for_write(model)
+    months = set(
+        model._base_manager.using(using).filter(date__lt=cutoff)
+        .datetimes('date', 'month', tzinfo=timezone.utc)
+    )
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            if partitions.is_partitioned(cursor, model._meta.db_table):
+                months.update(
+                    month for month in partitions.monthly_partitions(
+                        cursor, model._meta.db_table
+                    ) if month < cutoff
+                )
+    return sorted(months)
+
+
+def maintain_partitions(model, now, months_ahead):
+    """Создает секции PostgreSQL на months_ahead месяцев вперед и
+    разносит строки из секции по умолчанию по месяцам."""
+    using = router.db_for_write(model)
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return []
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if not partitions.is_partitioned(cursor, model._meta.db_table):
+            return []
+        return partitions.ensure_partitions(
+            cursor, model._meta.db_table, now, months_ahead
+        )
+
+
+def cutoff_for(retention_months, now=None):
+    now = now or django_timezone.now()
+    return partitions.add_months(
+        partitions.month_start(now), -retention_months
+    )
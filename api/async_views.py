@@ -0,0 +1,102 @@
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from .serializers import EmailSerializer, TokenSerializer
+from .views import (CONFIRMATION_CODE_SENT, CONFIRMATION_THROTTLES,
+                    INVALID_CONFIRMATION_CODE, obtain_token, send_code)
+
+
+def api_request(request):
+    return Request(request, parsers=[
+        parser() for parser in api_settings.DEFAULT_PARSER_CLASSES
+    ])
+
+
+def render(response):
+    response.accepted_renderer = JSONRenderer()
+    response.accepted_media_type = JSONRenderer.media_type
+    response.renderer_context = {}
+    return response.render()
+
+
+def in_pool(function):
+    """Обертка sync_to_async(thread_sensitive=False): function
+    выполняется в пуле потоков цикла событий (ASGI_THREADS), а не в
+    общем потоке синхронного кода Django. У каждого потока пула свое
+    соединение с БД, устаревшие закрываются как в конце запроса."""
+
+    def call(*args, **kwargs):
+        close_old_connections()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)
+
+
+def check_throttles(request, throttle_classes):
+    durations = []
+    for throttle_class in throttle_classes:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            durations.append(throttle.wait())
+    if durations:
+        raise exceptions.Throttled(max(durations))
+
+
+def async_api_view(handler):
+    """Асинхронный аналог api_view для POST-ручек без аутентификации.
+
+    Разбор тела, валидация и формат ошибок совпадают с DRF, а работа с
+    БД и кэшем выполняется в пуле потоков через in_pool, не занимая
+    цикл событий и общий поток синхронного кода.
+    """
+
+    async def view(request):
+        request = api_request(request)
+        try:
+            if request.method != 'POST':
+                raise exceptions.MethodNotAllowed(request.method)
+            response = await handler(request)
+        except Exception as exc:
+            response = exception_handler(
+                exc, {'request': request, 'view': None}
+            )
+            if response is None:
+                raise
+        return render(response)
+
+    view.csrf_exempt = True
+    return view
+
+
+@async_api_view
+async def send_confirmation_code(request):
+    await in_pool(check_throttles)(request, CONFIRMATION_THROTTLES)
+    serializer = EmailSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    await in_pool(send_code)(serializer.validated_data.get('email'))
+    return Response(
+        {'result': CONFIRMATION_CODE_SENT}, status=status.HTTP_200_OK
+    )
+
+
+@async_api_view
+async def send_jwt_token(request):
+    serializer = TokenSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    token = await in_pool(obtain_token)(
+        serializer.validated_data.get('email'),
+        serializer.validated_data.get('confirmation_code')
+    )
+    if token is None:
+        return Response(
+            INVALID_CONFIRMATION_CODE, status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response({'token': str(token)}, status=status.HTTP_200_OK)
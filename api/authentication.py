@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTTokenUserAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import User
+
+
+class ClaimsUser(TokenUser):
+    """Пользователь, собранный из утверждений токена без запроса к БД."""
+
+    @cached_property
+    def role(self):
+        return self.token.get('role', User.USER)
+
+    @property
+    def is_user(self):
+        return self.role == User.USER
+
+    @property
+    def is_moderator(self):
+        return self.role == User.MODERATOR
+
+    @property
+    def is_admin(self):
+        return self.role == User.ADMIN or self.is_staff
+
+
+class UserCache:
+    """LRU-кэш пользователей в памяти процесса со сроком жизни записи.
+
+    Запись читается из БД не чаще раза в ttl секунд, поэтому отзыв
+    доступа или смена роли вступают в силу не позже чем через ttl.
+    Кэш свой у каждого процесса: при N воркерах один пользователь
+    читается из БД до N раз за ttl, а сигнал об изменении сбрасывает
+    запись только в том процессе, где пользователь был сохранен.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self.entries.move_to_end(user_id)
+                return entry[0]
+        user = User.objects.filter(pk=user_id).first()
+        with self.lock:
+            self.entries[user_id] = (user, now)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache(
+    maxsize=getattr(settings, 'JWT_USER_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'JWT_USER_CACHE_TTL', 60),
+)
+
+
+def issue_token(user):
+    token = AccessToken.for_user(user)
+    token['role'] = user.role
+    token['is_staff'] = user.is_staff
+    return token
+
+
+class ClaimsJWTAuthentication(JWTTokenUserAuthentication):
+    """Аутентификация по JWT без загрузки пользователя на каждый запрос.
+
+    Роль и is_staff берутся из токена. Номер счета в токен не входит:
+    счет может быть создан или удален в любой момент, а утверждение
+    токена до истечения срока не отозвать. Состояние
+    пользователя сверяется с user_cache: токен заблокированного
+    пользователя или выданный до смены роли отклоняется. Токены,
+    выданные до появления утверждений, обслуживаются полной моделью
+    пользователя из того же кэша.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        current = user_cache.get(user.id)
+        if current is None or not current.is_active:
+            raise AuthenticationFailed(
+                'Пользователь не найден или заблокирован.',
+                code='user_inactive'
+            )
+        if 'role' not in validated_token:
+            return current
+        if (current.role, current.is_staff) != (user.role, user.is_staff):
+            raise AuthenticationFailed(
+                'Права пользователя изменились, получите новый токен.',
+                code='token_outdated'
+            )
+        return user
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .db.routers import read_alias
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'catalog:version'
+PAGE_KEY = 'catalog:{}:{}'
+
+
+def get_version():
+    """Текущая версия каталога или None, если кэш недоступен.
+
+    Начальное значение берется из часов, чтобы после потери ключа
+    версия не вернулась к уже использованной.
+    """
+    try:
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, time.time_ns(), None)
+            version = cache.get(VERSION_KEY)
+        return version
+    except Exception:
+        logger.warning('Кэш каталога недоступен', exc_info=True)
+        return None
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+    except Exception:
+        logger.warning('Не удалось сбросить кэш каталога', exc_info=True)
+
+
+def invalidate():
+    """Поднимает версию каталога после фиксации транзакции; записи
+    прежней версии больше не читаются и вытесняются по таймауту.
+    Версия хранится в кэше Django, поэтому с кэшем в памяти процесса
+    другие воркеры видят изменения только через CATALOG_CACHE_TTL."""
+    transaction.on_commit(bump_version)
+
+
+def page_key(request, version):
+    query = sorted(
+        (name, sorted(values)) for name, values in request.query_params.lists()
+    )
+    digest = hashlib.sha1(
+        json.dumps([request.path, query]).encode()
+    ).hexdigest()
+    return PAGE_KEY.format(version, digest)
+
+
+def make_etag(data):
+    content = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return f'"{hashlib.md5(content.encode()).hexdigest()}"'
+
+
+def cache_get(key):
+    try:
+        return cache.get(key)
+    except Exception:
+        logger.warning('Кэш каталога недоступен', exc_info=True)
+        return None
+
+
+def entry_timeout():
+    """Ответ, прочитанный с реплики, может отставать от основной базы,
+    поэтому хранится не дольше REPLICA_STICKY_SECONDS."""
+    timeout = getattr(settings, 'CATALOG_CACHE_TTL', 300)
+    if read_alias.get() is not None:
+        timeout = min(
+            timeout, getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+        )
+    return timeout
+
+
+def cache_set(key, entry):
+    try:
+        cache.set(key, entry, entry_timeout())
+    except Exception:
+        logger.warning('Кэш каталога недоступен', exc_info=True)
+
+
+class CatalogCacheMixin:
+    """Кэширует ответы list и retrieve по версии каталога и отдает 304
+    на If-None-Match с текущим ETag. Без кэша ответ строится из БД."""
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, view, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return view(request, *args, **kwargs)
+        version = get_version()
+        key = None if version is None else page_key(request, version)
+        entry = None if key is None else cache_get(key)
+        if entry is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = {'data': response.data, 'etag': make_etag(response.data)}
+            if key is not None:
+                cache_set(key, entry)
+        etag = entry['etag']
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in (tag.replace('W/', '', 1) for tag in if_none_match):
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag}
+            )
+        return Response(entry['data'], headers={'ETag': etag})
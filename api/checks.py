@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register
+from django.db import connections
+
+DATABASE_OPTIONS = ('CONN_HEALTH_CHECKS', 'POOL')
+
+
+@register('database')
+def check_database_backends(app_configs, **kwargs):
+    """CONN_HEALTH_CHECKS и POOL понимает только бэкенд api.db.postgresql,
+    остальные бэкенды молча их игнорируют."""
+    errors = []
+    for alias in connections:
+        settings_dict = connections.settings[alias]
+        options = [
+            name for name in DATABASE_OPTIONS if settings_dict.get(name)
+        ]
+        if not options:
+            continue
+        from .db.postgresql.base import DatabaseWrapper
+        if isinstance(connections[alias], DatabaseWrapper):
+            continue
+        errors.append(Warning(
+            f'{", ".join(options)} для базы {alias!r} не действуют с '
+            f'бэкендом {settings_dict["ENGINE"]}.',
+            hint='Укажите DB_ENGINE=api.db.postgresql.',
+            id='api.W001',
+        ))
+    return errors
+
+
+def is_local_cache(alias='default'):
+    return isinstance(caches[alias], LocMemCache)
+
+
+@register('caches')
+def check_shared_cache(app_configs, **kwargs):
+    """Версия каталога, лимиты запросов и номера счетов хранятся в кэше
+    Django и без общего кэша у каждого воркера свои."""
+    if settings.DEBUG or not is_local_cache():
+        return []
+    return [Warning(
+        'Кэш по умолчанию хранится в памяти процесса: изменения каталога '
+        'и лимиты запросов не видны другим воркерам.',
+        hint='Укажите общий кэш в CACHE_BACKEND и CACHE_LOCATION.',
+        id='api.W002',
+    )]
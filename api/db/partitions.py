@@ -0,0 +1,243 @@
+import re
+from datetime import datetime, timezone
+
+PARTITION_KEY = 'date'
+GUARD_TABLE = 'api_transaction_purchase'
+MAINTENANCE_SETTING = 'api.partition_maintenance'
+
+GUARD_FORWARD = [
+    f'CREATE TABLE {GUARD_TABLE} ('
+    'account_id bigint NOT NULL, service_id bigint NOT NULL, '
+    'CONSTRAINT unique_account_service PRIMARY KEY (account_id, service_id))',
+    f'INSERT INTO {GUARD_TABLE} (account_id, service_id) '
+    'SELECT DISTINCT account_id, service_id FROM api_transaction',
+    'CREATE FUNCTION api_transaction_purchase_insert() RETURNS trigger '
+    'LANGUAGE plpgsql AS $$ BEGIN '
+    f'INSERT INTO {GUARD_TABLE} (account_id, service_id) '
+    'VALUES (NEW.account_id, NEW.service_id); '
+    'RETURN NULL; END $$',
+    'CREATE FUNCTION api_transaction_purchase_delete() RETURNS trigger '
+    'LANGUAGE plpgsql AS $$ BEGIN '
+    f"IF coalesce(current_setting('{MAINTENANCE_SETTING}', true), '') "
+    "<> 'on' THEN "
+    f'DELETE FROM {GUARD_TABLE} WHERE account_id = OLD.account_id '
+    'AND service_id = OLD.service_id; '
+    'END IF; RETURN NULL; END $$',
+    'CREATE FUNCTION api_transaction_purchase_update() RETURNS trigger '
+    'LANGUAGE plpgsql AS $$ BEGIN '
+    'IF (OLD.account_id, OLD.service_id) IS DISTINCT FROM '
+    '(NEW.account_id, NEW.service_id) THEN '
+    f'DELETE FROM {GUARD_TABLE} WHERE account_id = OLD.account_id '
+    'AND service_id = OLD.service_id; '
+    f'INSERT INTO {GUARD_TABLE} (account_id, service_id) '
+    'VALUES (NEW.account_id, NEW.service_id); '
+    'END IF; RETURN NULL; END $$',
+    'CREATE FUNCTION api_transaction_purchase_truncate() RETURNS trigger '
+    f'LANGUAGE plpgsql AS $$ BEGIN TRUNCATE {GUARD_TABLE}; '
+    'RETURN NULL; END $$',
+    'CREATE TRIGGER api_transaction_purchase_insert '
+    'AFTER INSERT ON api_transaction FOR EACH ROW '
+    'EXECUTE FUNCTION api_transaction_purchase_insert()',
+    'CREATE TRIGGER api_transaction_purchase_delete '
+    'AFTER DELETE ON api_transaction FOR EACH ROW '
+    'EXECUTE FUNCTION api_transaction_purchase_delete()',
+    'CREATE TRIGGER api_transaction_purchase_update '
+    'AFTER UPDATE OF account_id, service_id ON api_transaction '
+    'FOR EACH ROW EXECUTE FUNCTION api_transaction_purchase_update()',
+    'CREATE TRIGGER api_transaction_purchase_truncate '
+    'AFTER TRUNCATE ON api_transaction FOR EACH STATEMENT '
+    'EXECUTE FUNCTION api_transaction_purchase_truncate()',
+]
+GUARD_BACKWARD = [
+    'DROP TRIGGER IF EXISTS api_transaction_purchase_insert '
+    'ON api_transaction',
+    'DROP TRIGGER IF EXISTS api_transaction_purchase_delete '
+    'ON api_transaction',
+    'DROP TRIGGER IF EXISTS api_transaction_purchase_update '
+    'ON api_transaction',
+    'DROP TRIGGER IF EXISTS api_transaction_purchase_truncate '
+    'ON api_transaction',
+    'DROP FUNCTION IF EXISTS api_transaction_purchase_insert()',
+    'DROP FUNCTION IF EXISTS api_transaction_purchase_delete()',
+    'DROP FUNCTION IF EXISTS api_transaction_purchase_update()',
+    'DROP FUNCTION IF EXISTS api_transaction_purchase_truncate()',
+    f'DROP TABLE IF EXISTS {GUARD_TABLE}',
+]
+
+
+def month_start(value):
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+
+def default_partition(table):
+    return f'{table}_default'
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        'SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [table]
+    )
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def monthly_partitions(cursor, table):
+    """Месяцы, для которых у таблицы есть отдельная секция."""
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i '
+        'JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = %s::regclass', [table]
+    )
+    pattern = re.compile(rf'^{re.escape(table)}_p(\d{{4}})_(\d{{2}})$')
+    months = []
+    for name, in cursor.fetchall():
+        match = pattern.match(name)
+        if match:
+            months.append(datetime(
+                int(match[1]), int(match[2]), 1, tzinfo=timezone.utc
+            ))
+    return sorted(months)
+
+
+def maintenance(cursor):
+    """Строки, которые секционирование и архивация переносят или
+    удаляют, не снимают отметки о покупках."""
+    cursor.execute(
+        'SELECT set_config(%s, %s, true)', [MAINTENANCE_SETTING, 'on']
+    )
+
+
+def create_partition(cursor, table, month):
+    """Создает секцию месяца и переносит в нее строки этого месяца из
+    секции по умолчанию. Вызывается внутри транзакции."""
+    name = partition_name(table, month)
+    until = add_months(month, 1)
+    default = default_partition(table)
+    maintenance(cursor)
+    cursor.execute(
+        f'CREATE TABLE {name} '
+        f'(LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    )
+    cursor.execute(
+        f'INSERT INTO {name} SELECT * FROM {default} '
+        f'WHERE {PARTITION_KEY} >= %s AND {PARTITION_KEY} < %s',
+        [month, until]
+    )
+    cursor.execute(
+        f'DELETE FROM {default} '
+        f'WHERE {PARTITION_KEY} >= %s AND {PARTITION_KEY} < %s',
+        [month, until]
+    )
+    cursor.execute(
+        f'ALTER TABLE {table} ATTACH PARTITION {name} '
+        'FOR VALUES FROM (%s) TO (%s)', [month, until]
+    )
+
+
+def ensure_partitions(cursor, table, now, months_ahead=3, source=None):
+    """Создает секции для месяцев со строками в source (по умолчанию -
+    в секции по умолчанию) и для текущего и months_ahead следующих
+    месяцев."""
+    cursor.execute(
+        f"SELECT DISTINCT date_trunc('month', {PARTITION_KEY} "
+        f"AT TIME ZONE 'UTC') FROM {source or default_partition(table)}"
+    )
+    months = {
+        month.replace(tzinfo=timezone.utc) for month, in cursor.fetchall()
+    }
+    current = month_start(now)
+    months.update(
+        add_months(current, count) for count in range(months_ahead + 1)
+    )
+    existing = set(monthly_partitions(cursor, table))
+    created = sorted(months - existing)
+    for month in created:
+        create_partition(cursor, table, month)
+    return created
+
+
+def drop_partition(cursor, table, month):
+    name = partition_name(table, month)
+    cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {name}')
+    cursor.execute(f'DROP TABLE {name}')
+
+
+def table_constraints(cursor, table, kind):
+    cursor.execute(
+        'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint '
+        'WHERE conrelid = %s::regclass AND contype = %s', [table, kind]
+    )
+    return cursor.fetchall()
+
+
+def table_indexes(cursor, table):
+    """Определения индексов, кроме созданных ограничениями."""
+    cursor.execute(
+        'SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i '
+        'WHERE i.indrelid = %s::regclass AND NOT EXISTS ('
+        'SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)',
+        [table]
+    )
+    return [definition for definition, in cursor.fetchall()]
+
+
+def rebuild_table(cursor, table, now, partitioned):
+    """Пересоздает таблицу секционированной по месяцам поля date или
+    обычной, копируя строки, индексы и внешние ключи.
+
+    Первичный ключ секционированной таблицы - (id, date), потому что
+    уникальный индекс должен включать ключ секционирования.
+    Уникальные ограничения кроме первичного ключа переносятся только
+    в обычную таблицу.
+    """
+    cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, 'id'])
+    sequence, = cursor.fetchone()
+    foreign_keys = table_constraints(cursor, table, 'f')
+    uniques = table_constraints(cursor, table, 'u')
+    indexes = table_indexes(cursor, table)
+    old = f'{table}_old'
+    cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+    cursor.execute(f'ALTER TABLE {table} RENAME TO {old}')
+    if partitioned:
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE ({PARTITION_KEY})'
+        )
+        cursor.execute(
+            f'CREATE TABLE {default_partition(table)} '
+            f'PARTITION OF {table} DEFAULT'
+        )
+        ensure_partitions(cursor, table, now, source=old)
+    else:
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS)'
+        )
+    cursor.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+    cursor.execute(f'DROP TABLE {old}')
+    if partitioned:
+        cursor.execute(
+            f'ALTER TABLE {table} ADD PRIMARY KEY (id, {PARTITION_KEY})'
+        )
+    else:
+        cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id)')
+        for name, definition in uniques:
+            cursor.execute(
+                f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}'
+            )
+    for definition in indexes:
+        cursor.execute(definition.replace(' ON ONLY ', ' ON ', 1))
+    for name, definition in foreign_keys:
+        cursor.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}'
+        )
+    cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений с БД, общий для потоков процесса.
+
+    Если все max_size соединений заняты, поток ждет освобождения не
+    дольше timeout секунд. Перед выдачей простаивавшего соединения
+    вызывается check, мертвые соединения отбрасываются. После fork
+    пул начинается заново, чтобы не делить сокеты с родителем.
+    """
+
+    def __init__(self, max_size, timeout, check=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check = check
+        self.condition = threading.Condition()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.idle = []
+        self.size = 0
+        self.stats = {
+            'acquired': 0,
+            'created': 0,
+            'closed': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'timeouts': 0,
+        }
+
+    def acquire(self, connect):
+        started = time.monotonic()
+        while True:
+            connection = self.take(started)
+            if connection is None:
+                break
+            if self.check is None or self.check(connection):
+                with self.condition:
+                    self.stats['acquired'] += 1
+                return connection
+            self.release(connection, discard=True)
+        try:
+            connection = connect()
+        except BaseException:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.stats['created'] += 1
+            self.stats['acquired'] += 1
+        return connection
+
+    def take(self, started):
+        """Простаивающее соединение или None, если можно открыть новое."""
+        with self.condition:
+            if self.pid != os.getpid():
+                self.reset()
+            waited = False
+            while not self.idle and self.size >= self.max_size:
+                remaining = started + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'Нет свободных соединений за {self.timeout} с'
+                    )
+                if not waited:
+                    self.stats['waits'] += 1
+                    waited = True
+                self.condition.wait(remaining)
+            if waited:
+                self.stats['wait_seconds'] += time.monotonic() - started
+            if self.idle:
+                return self.idle.pop()
+            self.size += 1
+            return None
+
+    def release(self, connection, discard=False):
+        with self.condition:
+            if self.pid != os.getpid():
+                return
+            if discard or connection.closed:
+                self.size -= 1
+                self.stats['closed'] += 1
+            else:
+                self.idle.append(connection)
+            self.condition.notify()
+        if discard and not connection.closed:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def close_idle(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+            self.stats['closed'] += len(idle)
+            self.condition.notify_all()
+        for connection in idle:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def snapshot(self):
+        with self.condition:
+            return dict(
+                self.stats,
+                max_size=self.max_size,
+                size=self.size,
+                idle=len(self.idle),
+                in_use=self.size - len(self.idle),
+            )
@@ -0,0 +1,164 @@
+import threading
+from functools import partial
+
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from api.db.pool import ConnectionPool, PoolTimeout
+from api.metrics import registry
+
+Database = base.Database
+
+pools = {}
+pools_lock = threading.Lock()
+
+POOL_METRICS = {
+    'max_size': ('api_db_pool_max_size', 'gauge',
+                 'Максимальный размер пула соединений'),
+    'size': ('api_db_pool_connections', 'gauge',
+             'Открытые соединения пула'),
+    'in_use': ('api_db_pool_in_use', 'gauge',
+               'Выданные соединения пула'),
+    'idle': ('api_db_pool_idle', 'gauge',
+             'Свободные соединения пула'),
+    'acquired': ('api_db_pool_acquired_total', 'counter',
+                 'Выдачи соединений из пула'),
+    'created': ('api_db_pool_created_total', 'counter',
+                'Новые соединения пула'),
+    'closed': ('api_db_pool_closed_total', 'counter',
+               'Отброшенные соединения пула'),
+    'waits': ('api_db_pool_waits_total', 'counter',
+              'Ожидания свободного соединения'),
+    'wait_seconds': ('api_db_pool_wait_seconds_total', 'counter',
+                     'Суммарное время ожидания соединения'),
+    'timeouts': ('api_db_pool_timeouts_total', 'counter',
+                 'Отказы по таймауту ожидания соединения'),
+}
+
+
+def is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Database.Error:
+        return False
+    return True
+
+
+def close_pools(alias=None):
+    """Закрывает простаивающие соединения пулов, например перед
+    удалением базы данных."""
+    with pools_lock:
+        items = list(pools.items())
+    for (pool_alias, _), pool in items:
+        if alias is None or pool_alias == alias:
+            pool.close_idle()
+
+
+def collect_pool_metrics():
+    values = {}
+    with pools_lock:
+        items = list(pools.items())
+    for (alias, _), pool in items:
+        for stat, value in pool.snapshot().items():
+            key = f'{POOL_METRICS[stat][0]}|database="{alias}"'
+            values[key] = values.get(key, 0) + value
+    return values
+
+
+registry.register_collector(collect_pool_metrics, {
+    name: (kind, description)
+    for name, kind, description in POOL_METRICS.values()
+})
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с проверкой постоянных соединений и пулом.
+
+    При CONN_HEALTH_CHECKS постоянное соединение проверяется перед
+    первым запросом в каждом HTTP-запросе, как в Django 4.1. Ключ POOL
+    в настройках БД включает пул в процессе: закрытое Django
+    соединение возвращается в пул, а не разрывается.
+    """
+
+    creation_class = DatabaseCreation
+    health_check_done = False
+
+    def get_pool(self, conn_params):
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+        key = (
+            self.alias,
+            tuple(sorted(
+                (name, repr(value)) for name, value in conn_params.items()
+            )),
+        )
+        with pools_lock:
+            pool = pools.get(key)
+            if pool is None:
+                check = (
+                    is_usable
+                    if self.settings_dict.get('CONN_HEALTH_CHECKS') else None
+                )
+                pool = pools[key] = ConnectionPool(
+                    max_size=options.get('MAX_SIZE', 10),
+                    timeout=options.get('TIMEOUT', 5),
+                    check=check,
+                )
+            return pool
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        if self.pool is None:
+            return super().get_new_connection(conn_params)
+        try:
+            connection = self.pool.acquire(
+                partial(super().get_new_connection, conn_params)
+            )
+        except PoolTimeout as error:
+            raise Database.OperationalError(str(error))
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def connect(self):
+        self.health_check_done = True
+        super().connect()
+
+    def _close(self):
+        pool = getattr(self, 'pool', None)
+        if pool is None or self.connection is None:
+            return super()._close()
+        connection = self.connection
+        discard = False
+        try:
+            status = connection.get_transaction_status()
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            connection.autocommit = self.settings_dict['AUTOCOMMIT']
+        except Database.Error:
+            discard = True
+        pool.release(connection, discard=discard)
+
+    def ensure_connection(self):
+        if (self.connection is not None
+                and self.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not self.health_check_done
+                and not self.in_atomic_block):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
@@ -0,0 +1,83 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from fnmatch import fnmatchcase
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_KEY = 'db_primary:{}'
+
+read_alias = ContextVar('read_alias', default=None)
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def choose_replica():
+    aliases = replicas()
+    return random.choice(aliases) if aliases else None
+
+
+@contextmanager
+def read_from_replica(alias=None):
+    """Направляет чтения внутри блока на реплику alias или на
+    случайную из DATABASE_REPLICAS."""
+    token = read_alias.set(alias or choose_replica())
+    try:
+        yield
+    finally:
+        read_alias.reset(token)
+
+
+def stream_from_replica(content, alias):
+    """Итератор по content, который читает из реплики alias: потоковый
+    ответ выполняет запросы уже после выхода из middleware."""
+    iterator = iter(content)
+    finished = object()
+    while True:
+        with read_from_replica(alias):
+            chunk = next(iterator, finished)
+        if chunk is finished:
+            return
+        yield chunk
+
+
+def is_replica_view(view_name):
+    return any(
+        fnmatchcase(view_name, pattern)
+        for pattern in getattr(settings, 'DATABASE_REPLICA_VIEWS', ())
+    )
+
+
+def pin_to_primary(user_id):
+    """После записи чтения пользователя идут в основную базу
+    REPLICA_STICKY_SECONDS секунд, пока реплика догоняет изменения."""
+    timeout = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+    if timeout > 0:
+        cache.set(PIN_KEY.format(user_id), True, timeout)
+
+
+def is_pinned(user_id):
+    return user_id is not None and bool(cache.get(PIN_KEY.format(user_id)))
+
+
+class ReplicaRouter:
+    """Чтения в запросах, отмеченных ReplicaMiddleware, идут на
+    реплику, все остальные чтения и все записи - в основную базу."""
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas():
+            return False
+        return None
@@ -0,0 +1,148 @@
+import operator
+import re
+from functools import reduce
+
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django_filters import rest_framework as filters
+
+from . import rates
+from .models import Service
+
+PRICE_FILTERS = ('min_price', 'max_price', 'price_currency')
+SEARCH_CONFIG = 'simple'
+SEARCH_TABLE = 'api_service_fts'
+SEARCH_TRIGGERS = {
+    'api_service_fts_insert':
+        'AFTER INSERT ON api_service BEGIN '
+        'INSERT INTO api_service_fts(rowid, name, description) '
+        'VALUES (new.id, new.name, new.description); END',
+    'api_service_fts_delete':
+        'AFTER DELETE ON api_service BEGIN '
+        'INSERT INTO api_service_fts(api_service_fts, rowid, name, '
+        "description) VALUES ('delete', old.id, old.name, "
+        'old.description); END',
+    'api_service_fts_update':
+        'AFTER UPDATE ON api_service BEGIN '
+        'INSERT INTO api_service_fts(api_service_fts, rowid, name, '
+        "description) VALUES ('delete', old.id, old.name, "
+        'old.description); '
+        'INSERT INTO api_service_fts(rowid, name, description) '
+        'VALUES (new.id, new.name, new.description); END',
+}
+
+
+def restore_search_triggers(connection):
+    """Пересоздает триггеры полнотекстового индекса SQLite, если их нет.
+
+    SQLite пересоздает таблицу api_service при изменении ее полей, и
+    триггеры пропадают вместе со старой таблицей; после этого индекс
+    перестраивается целиком. Возвращает имена восстановленных триггеров.
+    """
+    if connection.vendor != 'sqlite':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            'AND name = %s', [SEARCH_TABLE]
+        )
+        if cursor.fetchone() is None:
+            return []
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+            "AND tbl_name = 'api_service'"
+        )
+        existing = {name for name, in cursor.fetchall()}
+        missing = [name for name in SEARCH_TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(f'CREATE TRIGGER {name} {SEARCH_TRIGGERS[name]}')
+        if missing:
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) '
+                "VALUES ('rebuild')"
+            )
+    return missing
+
+
+def search_terms(value):
+    return re.findall(r'\w+', value.lower())
+
+
+def price_range(low, high):
+    condition = Q()
+    if low is not None:
+        condition &= Q(price__gte=low)
+    if high is not None:
+        condition &= Q(price__lte=high)
+    return condition
+
+
+class ServiceFilter(filters.FilterSet):
+    """Фильтры каталога услуг.
+
+    search ищет слова по началу в названии и описании через
+    полнотекстовый индекс. min_price и max_price сравниваются с ценой в
+    валюте услуги, а вместе с price_currency - с ценой, пересчитанной в
+    эту валюту по текущим курсам, чтобы в выборку попадали услуги во
+    всех валютах.
+    """
+
+    search = filters.CharFilter(method='filter_search')
+    min_price = filters.NumberFilter()
+    max_price = filters.NumberFilter()
+    price_currency = filters.ChoiceFilter(choices=Service.CUREENCY)
+
+    class Meta:
+        model = Service
+        fields = ['currency']
+
+    def filter_queryset(self, queryset):
+        data = self.form.cleaned_data
+        for name, value in data.items():
+            if name not in PRICE_FILTERS:
+                queryset = self.filters[name].filter(queryset, value)
+        return self.filter_price(
+            queryset, data.get('min_price'), data.get('max_price'),
+            data.get('price_currency')
+        )
+
+    def filter_price(self, queryset, low, high, currency):
+        if low is None and high is None:
+            return queryset
+        if not currency:
+            return queryset.filter(price_range(low, high))
+        table = rates.get_provider().get_rates()
+        rate = table[currency]
+        conditions = [
+            Q(currency=code) & price_range(
+                None if low is None else low * rate / table[code],
+                None if high is None else high * rate / table[code],
+            )
+            for code, _ in Service.CUREENCY if code in table
+        ]
+        return queryset.filter(reduce(operator.or_, conditions))
+
+    def filter_search(self, queryset, name, value):
+        terms = search_terms(value)
+        if not terms:
+            return queryset
+        vendor = connections[queryset.db].vendor
+        if vendor == 'postgresql':
+            return queryset.alias(search=SearchVector(
+                'name', 'description', config=SEARCH_CONFIG
+            )).filter(search=SearchQuery(
+                ' & '.join(f'{term}:*' for term in terms),
+                search_type='raw', config=SEARCH_CONFIG
+            ))
+        if vendor == 'sqlite':
+            return queryset.filter(id__in=RawSQL(
+                f'SELECT rowid FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s',
+                [' '.join(f'"{term}"*' for term in terms)]
+            ))
+        return queryset.filter(reduce(operator.and_, (
+            Q(name__icontains=term) | Q(description__icontains=term)
+            for term in terms
+        )))
@@ -0,0 +1,241 @@
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from . import catalog
+from .models import Service
+from .validators import validate_price
+
+FORMATS = ('csv', 'json', 'jsonl')
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/json': 'json',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+}
+FIELDS = ('name', 'description', 'price', 'currency')
+ERRORS_LIMIT = 1000
+CHUNK_ATTEMPTS = 3
+
+
+class InvalidImport(Exception):
+    """Файл нельзя дочитать; report - отчет об уже записанных строках."""
+
+    def __init__(self, message, report=None):
+        super().__init__(message)
+        self.report = report
+
+
+class ReadError(Exception):
+    pass
+
+
+class ServiceImportSerializer(serializers.Serializer):
+    external_id = serializers.CharField(max_length=100)
+    name = serializers.CharField(max_length=50)
+    description = serializers.CharField()
+    price = serializers.DecimalField(
+        max_digits=12, decimal_places=2, validators=[validate_price]
+    )
+    currency = serializers.ChoiceField(
+        choices=Service.CUREENCY, default=Service.RUB
+    )
+
+
+def parse_content_type(header):
+    """Формат выгрузки и кодировка из заголовка Content-Type или
+    (None, None), если тип или кодировка не поддерживаются."""
+    media_type, *params = header.split(';')
+    file_format = CONTENT_TYPES.get(media_type.strip().lower())
+    charset = 'utf-8'
+    for param in params:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            charset = value.strip().strip('"') or charset
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        return None, None
+    return file_format, charset
+
+
+def decode_lines(chunks, charset):
+    """Строки текста из кусков байтов в кодировке charset."""
+    decoder = codecs.getincrementaldecoder(charset)()
+    pending = ''
+    for chunk in chunks:
+        *lines, pending = (pending + decoder.decode(chunk)).split('\n')
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def read_rows(lines, file_format):
+    """Строки файла выгрузки в виде словарей.
+
+    lines - итератор строк текста; csv и jsonl читаются построчно, json
+    ожидает массив объектов целиком. Строка jsonl с ошибкой разбора
+    возвращается как исключение, чтобы попасть в отчет.
+    """
+    if file_format == 'csv':
+        return (
+            {name: value for name, value in row.items() if value != ''}
+            for row in csv.DictReader(lines)
+        )
+    if file_format == 'jsonl':
+        return (parse_line(line) for line in lines if line.strip())
+    if file_format == 'json':
+        try:
+            rows = json.loads(''.join(lines))
+        except ValueError as error:
+            raise InvalidImport(f'Некорректный JSON: {error}')
+        if not isinstance(rows, list):
+            raise InvalidImport('Ожидается массив объектов')
+        return iter(rows)
+    raise InvalidImport(f'Неизвестный формат: {file_format}')
+
+
+def parse_line(line):
+    try:
+        return json.loads(line)
+    except ValueError as error:
+        return error
+
+
+def guard_reading(rows):
+    """Ошибку декодирования или разбора csv возвращает последним
+    элементом, чтобы уже прочитанные строки пачки были записаны."""
+    try:
+        yield from rows
+    except (UnicodeDecodeError, csv.Error) as error:
+        yield ReadError(error)
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row, errors):
+        self.failed += 1
+        if len(self.errors) < ERRORS_LIMIT:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+def validate_row(serializer, row):
+    if isinstance(row, ValueError):
+        return None, {'row': [f'Некорректный JSON: {row}']}
+    if not isinstance(row, dict):
+        return None, {'row': ['Ожидается объект']}
+    try:
+        return serializer.run_validation(row), None
+    except serializers.ValidationError as error:
+        return None, error.detail
+
+
+def import_services(rows, chunk_size=1000):
+    """Создает и обновляет услуги по external_id пачками по chunk_size.
+
+    Каждая пачка проверяется и записывается в своей транзакции одним
+    SELECT, bulk_update и bulk_create. Ошибочные строки попадают в
+    отчет с номером строки и не мешают остальным. Если файл не удается
+    дочитать, прочитанные строки записываются, а InvalidImport несет
+    отчет о них.
+    """
+    report = ImportReport()
+    serializer = ServiceImportSerializer()
+    number = 0
+    failure = None
+    try:
+        for chunk in chunked(guard_reading(rows), chunk_size):
+            valid = {}
+            for row in chunk:
+                number += 1
+                if isinstance(row, ReadError):
+                    failure = f'Ошибка чтения строки {number}: {row}'
+                    break
+                data, errors = validate_row(serializer, row)
+                if errors:
+                    report.error(number, errors)
+                    continue
+                if data['external_id'] in valid:
+                    report.error(number, {'external_id': [
+                        'Повторяется в пачке, строка '
+                        f'{valid[data["external_id"]][0]}'
+                    ]})
+                    continue
+                valid[data['external_id']] = (number, data)
+            save_chunk(valid, report)
+    finally:
+        if report.created or report.updated:
+            catalog.invalidate()
+    if failure is not None:
+        raise InvalidImport(failure, report)
+    return report
+
+
+def save_chunk(valid, report):
+    """Записывает пачку; если параллельный импорт успел создать услугу
+    с тем же external_id, пачка перечитывается и пишется заново."""
+    for attempt in range(1, CHUNK_ATTEMPTS + 1):
+        try:
+            created, updated, unchanged = write_chunk(valid)
+        except IntegrityError:
+            if attempt == CHUNK_ATTEMPTS:
+                raise
+            continue
+        report.created += created
+        report.updated += updated
+        report.unchanged += unchanged
+        return
+
+
+@transaction.atomic
+def write_chunk(valid):
+    existing = Service.objects.select_for_update().in_bulk(
+        list(valid), field_name='external_id'
+    )
+    to_create = []
+    to_update = []
+    unchanged = 0
+    for external_id, (_, data) in valid.items():
+        service = existing.get(external_id)
+        if service is None:
+            to_create.append(Service(**data))
+            continue
+        if all(getattr(service, field) == data[field] for field in FIELDS):
+            unchanged += 1
+            continue
+        for field in FIELDS:
+            setattr(service, field, data[field])
+        to_update.append(service)
+    Service.objects.bulk_update(to_update, FIELDS)
+    Service.objects.bulk_create(to_create)
+    return len(to_create), len(to_update), unchanged
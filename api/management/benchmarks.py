@@ -0,0 +1,27 @@
+from api.models import Account, User
+
+
+def percentile(values, q):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def seed_accounts(prefix, count, balance=0):
+    User.objects.bulk_create(
+        User(username=f'{prefix}{i}', email=f'{prefix}{i}@bench.local')
+        for i in range(count)
+    )
+    users = User.objects.filter(username__startswith=prefix)
+    Account.objects.bulk_create(
+        Account(user=user, balance=balance) for user in users
+    )
+    return list(
+        Account.objects.filter(user__username__startswith=prefix)
+        .select_related('user').order_by('id')
+    )
+
+
+def cleanup_accounts(prefix):
+    Account.objects.filter(user__username__startswith=prefix).delete()
+    User.objects.filter(username__startswith=prefix).delete()
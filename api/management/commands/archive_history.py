@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.archive import (BUCKET_FIELDS, ArchiveError, archive_month,
+                         cutoff_for, maintain_partitions, months_to_archive,
+                         recover_months)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создание месячных секций истории операций на несколько месяцев '
+        'вперед и перенос месяцев старше срока хранения в сжатые файлы '
+        'HISTORY_ARCHIVE_DIR. Запускайте раз в месяц.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-months', type=int,
+            default=getattr(settings, 'HISTORY_RETENTION_MONTHS', 12),
+            help='Сколько последних месяцев оставить в базе'
+        )
+        parser.add_argument(
+            '--months-ahead', type=int, default=3,
+            help='На сколько месяцев вперед создать секции'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать месяцы, которые будут перенесены'
+        )
+
+    def handle(self, *args, **options):
+        if options['retention_months'] < 1:
+            raise CommandError('Срок хранения - минимум один месяц')
+        now = timezone.now()
+        cutoff = cutoff_for(options['retention_months'], now)
+        for model in BUCKET_FIELDS:
+            label = model._meta.db_table
+            if not options['dry_run']:
+                recover_months(model)
+                created = maintain_partitions(
+                    model, now, options['months_ahead']
+                )
+                for month in created:
+                    self.stdout.write(f'{label}: секция {month:%Y-%m}')
+            for month in months_to_archive(model, cutoff):
+                if options['dry_run']:
+                    self.stdout.write(f'{label}: {month:%Y-%m}')
+                    continue
+                try:
+                    count = archive_month(model, month)
+                except (ArchiveError, OSError) as error:
+                    raise CommandError(error)
+                self.stdout.write(
+                    f'{label}: {month:%Y-%m} в архиве, строк: {count}'
+                )
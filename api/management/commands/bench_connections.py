@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.db.utils import load_backend
+
+from api.db.postgresql.base import close_pools, pools, pools_lock
+from api.management.benchmarks import percentile
+
+ENGINE = 'api.db.postgresql'
+MODES = ('connect', 'persistent', 'pool')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение задержки запросов к PostgreSQL при новом соединении на '
+        'каждый запрос, постоянных соединениях и пуле соединений.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modes', nargs='+', choices=MODES, default=list(MODES)
+        )
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Количество запросов на один поток'
+        )
+        parser.add_argument('--pool-size', type=int, default=4)
+        parser.add_argument('--pool-timeout', type=float, default=5)
+        parser.add_argument(
+            '--query', default='SELECT 1',
+            help='SQL, выполняемый в каждом запросе'
+        )
+        parser.add_argument('--output', help='Файл для отчета в JSON')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Бенчмарк рассчитан на PostgreSQL')
+        report = {
+            'threads': options['threads'],
+            'requests_per_thread': options['requests'],
+            'query': options['query'],
+            'modes': {},
+        }
+        for mode in options['modes']:
+            summary = self.run(mode, options)
+            report['modes'][mode] = summary
+            self.stdout.write(
+                f'{mode:10} {summary["rps"]:>9} rps  '
+                f'p50 {summary["p50_ms"]:>7} мс  '
+                f'p95 {summary["p95_ms"]:>7} мс  '
+                f'p99 {summary["p99_ms"]:>7} мс  '
+                f'ошибки {summary["errors"]}'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=4)
+
+    def settings_dict(self, mode, options):
+        settings_dict = dict(
+            connection.settings_dict,
+            ENGINE=ENGINE,
+            CONN_MAX_AGE=None if mode == 'persistent' else 0,
+            CONN_HEALTH_CHECKS=mode != 'connect',
+            POOL=None,
+        )
+        if mode == 'pool':
+            settings_dict['POOL'] = {
+                'MAX_SIZE': options['pool_size'],
+                'TIMEOUT': options['pool_timeout'],
+            }
+        return settings_dict
+
+    def run(self, mode, options):
+        """Каждый поток повторяет цикл обработки HTTP-запроса: сигналы
+        request_started и request_finished закрывают устаревшие
+        соединения так же, как это делает Django.
+        """
+        alias = f'bench-{mode}'
+        backend = load_backend(ENGINE)
+        settings_dict = self.settings_dict(mode, options)
+        durations = []
+        errors = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(options['threads'] + 1)
+
+        def worker():
+            wrapper = backend.DatabaseWrapper(dict(settings_dict), alias)
+            own = []
+            failed = 0
+            barrier.wait()
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                wrapper.close_if_unusable_or_obsolete()
+                try:
+                    with wrapper.cursor() as cursor:
+                        cursor.execute(options['query'])
+                        cursor.fetchall()
+                except DatabaseError:
+                    failed += 1
+                wrapper.close_if_unusable_or_obsolete()
+                own.append((time.perf_counter() - started) * 1000)
+            wrapper.close()
+            with lock:
+                durations.extend(own)
+                errors.append(failed)
+
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(options['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        summary = {
+            'requests': len(durations),
+            'rps': round(len(durations) / elapsed, 1),
+            'p50_ms': round(percentile(durations, 50), 3),
+            'p95_ms': round(percentile(durations, 95), 3),
+            'p99_ms': round(percentile(durations, 99), 3),
+            'errors': sum(errors),
+        }
+        if mode == 'pool':
+            with pools_lock:
+                stats = [
+                    pool.snapshot() for (name, _), pool in pools.items()
+                    if name == alias
+                ]
+            summary['pool'] = stats[0] if stats else None
+            close_pools(alias)
+        return summary
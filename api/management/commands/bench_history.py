@@ -0,0 +1,182 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIClient
+
+from api.management.benchmarks import (cleanup_accounts, percentile,
+                                       seed_accounts)
+from api.models import Action, Service, Transaction, Transfer
+
+PREFIX = 'bench-history-'
+CHUNK_SIZE = 10000
+
+ENDPOINTS = (
+    ('actions', '/api/v1/actions/',
+     lambda account: Action.objects.filter(account=account)),
+    ('transactions', '/api/v1/transactions/',
+     lambda account: Transaction.objects.filter(account=account)),
+    ('transfers', '/api/v1/transfers/',
+     lambda account: Transfer.objects.filter(from_account=account)),
+    ('to_my_account', '/api/v1/transfers/to_my_account/',
+     lambda account: Transfer.objects.filter(to_account=account)),
+)
+
+POSTGRES_SEED_SQL = {
+    Action: (
+        'INSERT INTO {table} (account_id, amount, date) '
+        'SELECT (%(accounts)s::bigint[])[1 + g %% %(count)s], '
+        '1 + (g %% 1000), now() - g * interval \'1 second\' '
+        'FROM generate_series(%(start)s, %(stop)s) AS g'
+    ),
+    Transaction: (
+        'INSERT INTO {table} (account_id, service_id, amount, date) '
+        'SELECT (%(accounts)s::bigint[])[1 + g %% %(count)s], '
+        '(%(services)s::bigint[])[1 + g / %(count)s], '
+        '1 + (g %% 1000), now() - g * interval \'1 second\' '
+        'FROM generate_series(%(start)s, %(stop)s) AS g'
+    ),
+    Transfer: (
+        'INSERT INTO {table} (from_account_id, to_account_id, amount, date) '
+        'SELECT (%(accounts)s::bigint[])[1 + g %% %(count)s], '
+        '(%(accounts)s::bigint[])[1 + (g + 1) %% %(count)s], '
+        '1 + (g %% 1000), now() - g * interval \'1 second\' '
+        'FROM generate_series(%(start)s, %(stop)s) AS g'
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет таблицы истории заданным числом строк и записывает '
+        'план запроса и задержку каждого списка истории. '
+        'Быстрое наполнение через generate_series доступно на PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+',
+            default=[10 ** 5, 10 ** 6, 10 ** 7],
+            help='Число строк в каждой таблице истории на каждом шаге'
+        )
+        parser.add_argument('--accounts', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=20)
+        parser.add_argument('--output', help='Файл для отчета в JSON')
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Не удалять сгенерированные данные'
+        )
+
+    def handle(self, *args, **options):
+        self.cleanup()
+        self.accounts = seed_accounts(PREFIX, options['accounts'])
+        self.services = []
+        client = APIClient()
+        client.force_authenticate(user=self.accounts[0].user)
+
+        report, seeded = [], 0
+        for size in sorted(options['sizes']):
+            self.stdout.write(f'Наполнение до {size} строк...')
+            self.seed(seeded, size)
+            seeded = size
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            for name, url, queryset in ENDPOINTS:
+                result = self.measure(
+                    client, url, queryset(self.accounts[0]),
+                    options['requests']
+                )
+                result.update(endpoint=name, rows=size)
+                report.append(result)
+                self.stdout.write(
+                    f'{size:>10} {name:<15} '
+                    f'p50 {result["p50_ms"]:.2f} мс, '
+                    f'p99 {result["p99_ms"]:.2f} мс'
+                )
+
+        if not options['keep']:
+            self.cleanup()
+        output = json.dumps(report, ensure_ascii=False, indent=4)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def measure(self, client, url, queryset, requests):
+        explain_options = {}
+        if connection.vendor == 'postgresql':
+            explain_options = {'analyze': True, 'buffers': True}
+        plan = queryset.order_by('date')[:10].explain(**explain_options)
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            client.get(url)
+            latencies.append(time.perf_counter() - started)
+        return {
+            'plan': plan.splitlines(),
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+        }
+
+    def seed(self, start, stop):
+        self.ensure_services(stop)
+        for model in (Action, Transaction, Transfer):
+            for chunk_start in range(start, stop, CHUNK_SIZE):
+                chunk_stop = min(chunk_start + CHUNK_SIZE, stop)
+                if connection.vendor == 'postgresql':
+                    self.seed_postgres(model, chunk_start, chunk_stop)
+                else:
+                    model.objects.bulk_create(
+                        self.build(model, number)
+                        for number in range(chunk_start, chunk_stop)
+                    )
+
+    def seed_postgres(self, model, start, stop):
+        sql = POSTGRES_SEED_SQL[model].format(table=model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {
+                'accounts': [account.id for account in self.accounts],
+                'services': [service.id for service in self.services],
+                'count': len(self.accounts),
+                'start': start,
+                'stop': stop - 1,
+            })
+
+    def build(self, model, number):
+        count = len(self.accounts)
+        account = self.accounts[number % count]
+        amount = 1 + number % 1000
+        if model is Action:
+            return Action(account=account, amount=amount)
+        if model is Transaction:
+            return Transaction(
+                account=account, amount=amount,
+                service=self.services[number // count]
+            )
+        return Transfer(
+            from_account=account, amount=amount,
+            to_account=self.accounts[(number + 1) % count]
+        )
+
+    def ensure_services(self, rows):
+        needed = rows // len(self.accounts) + 1
+        Service.objects.bulk_create(
+            Service(name=f'{PREFIX}{i}', description=PREFIX, price=1)
+            for i in range(len(self.services), needed)
+        )
+        self.services = list(
+            Service.objects.filter(name__startswith=PREFIX).order_by('id')
+        )
+
+    def cleanup(self):
+        for model, field in ((Action, 'account'),
+                             (Transaction, 'account'),
+                             (Transfer, 'from_account')):
+            model.objects.filter(**{
+                f'{field}__user__username__startswith': PREFIX
+            }).delete()
+        cleanup_accounts(PREFIX)
+        Service.objects.filter(name__startswith=PREFIX).delete()
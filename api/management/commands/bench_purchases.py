@@ -0,0 +1,92 @@
+import decimal
+import time
+from itertools import product
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api import operations
+from api.management.benchmarks import (cleanup_accounts, percentile,
+                                       seed_accounts)
+from api.models import Account, Service, Transaction
+
+PREFIX = 'bench-purchase-'
+
+
+def legacy_purchase(user, service, rate):
+    if not Account.objects.filter(user=user).exists():
+        return
+    user_account = Account.objects.get(user=user)
+    if Transaction.objects.filter(
+        account=user_account, service=service
+    ).exists():
+        return
+    service_price = round(service.price * decimal.Decimal(rate), 2)
+    if user_account.balance - service_price < 0:
+        return
+    user_account.balance -= service_price
+    user_account.save()
+    Transaction.objects.create(
+        account=user_account, service=service, amount=service_price
+    )
+
+
+def atomic_purchase(user, service, rate):
+    account_id = Account.objects.filter(
+        user=user
+    ).order_by('id').values_list('id', flat=True).first()
+    if account_id is None:
+        return
+    service_price = round(service.price * decimal.Decimal(rate), 2)
+    try:
+        operations.purchase(account_id, service.id, service_price)
+    except operations.OperationError:
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение задержки (p50/p99) и числа запросов на одну покупку '
+        'для прежней и атомарной реализации покупки услуги'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--services', type=int, default=20)
+
+    def handle(self, *args, **options):
+        implementations = (
+            ('legacy', legacy_purchase),
+            ('atomic', atomic_purchase),
+        )
+        for name, implementation in implementations:
+            self.cleanup()
+            users, services = self.seed(options['users'], options['services'])
+            latencies, queries = [], []
+            for user, service in product(users, services):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    implementation(user, service, 1)
+                    latencies.append(time.perf_counter() - started)
+                queries.append(len(captured))
+            self.stdout.write(
+                f'{name}: покупок {len(latencies)}, '
+                f'p50 {percentile(latencies, 50) * 1000:.2f} мс, '
+                f'p99 {percentile(latencies, 99) * 1000:.2f} мс, '
+                f'запросов на покупку {sum(queries) / len(queries):.2f}'
+            )
+        self.cleanup()
+
+    def seed(self, users_count, services_count):
+        accounts = seed_accounts(PREFIX, users_count, balance=1000000)
+        Service.objects.bulk_create(
+            Service(name=f'{PREFIX}{i}', description=PREFIX, price=10)
+            for i in range(services_count)
+        )
+        services = list(Service.objects.filter(name__startswith=PREFIX))
+        return [account.user for account in accounts], services
+
+    def cleanup(self):
+        cleanup_accounts(PREFIX)
+        Service.objects.filter(name__startswith=PREFIX).delete()
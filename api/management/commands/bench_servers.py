@@ -0,0 +1,151 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand, CommandError
+
+from api.authentication import issue_token
+from api.management.benchmarks import cleanup_accounts, seed_accounts
+from api.management.loadtest import call, run_load, summarize
+from api.models import Service
+
+PREFIX = 'bench-server-'
+MODES = ('sync', 'gthread', 'asgi')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение пропускной способности и задержки gunicorn в режимах '
+        'WSGI sync, WSGI gthread и ASGI (uvicorn) на одинаковой смеси '
+        'запросов к текущей базе данных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modes', nargs='+', choices=MODES, default=list(MODES)
+        )
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='Число потоков на воркер в режиме gthread'
+        )
+        parser.add_argument(
+            '--asgi-concurrency', type=int, default=32,
+            help='Число одновременных запросов на воркер в режиме asgi'
+        )
+        parser.add_argument('--clients', type=int, default=16)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Количество запросов на одного клиента'
+        )
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--output', help='Файл для отчета в JSON')
+
+    def handle(self, *args, **options):
+        cleanup_accounts(PREFIX)
+        accounts = seed_accounts(PREFIX, options['clients'], balance=1000)
+        service = Service.objects.create(
+            name=f'{PREFIX}service', description='bench', price=10
+        )
+        clients = [
+            {
+                'token': str(issue_token(account.user)),
+                'email': account.user.email,
+                'code': default_token_generator.make_token(account.user),
+            }
+            for account in accounts
+        ]
+
+        def make_call(index, iteration):
+            client = clients[index]
+            kind = iteration % 4
+            if kind == 0:
+                return call('services', 'GET', '/api/v1/services/')
+            if kind == 1:
+                return call(
+                    'accounts', 'GET', '/api/v1/accounts/',
+                    token=client['token']
+                )
+            if kind == 2:
+                return call(
+                    'actions', 'GET', '/api/v1/actions/',
+                    token=client['token']
+                )
+            return call('auth_token', 'POST', '/api/v1/auth/token/', {
+                'email': client['email'],
+                'confirmation_code': client['code'],
+            })
+
+        report = {
+            'clients': options['clients'],
+            'requests_per_client': options['requests'],
+            'workers': options['workers'],
+            'database': settings.DATABASES['default']['ENGINE'],
+            'modes': {},
+        }
+        try:
+            for mode in options['modes']:
+                server = self.start_server(mode, options)
+                try:
+                    run_load(
+                        '127.0.0.1', options['port'], make_call,
+                        options['clients'], 4
+                    )
+                    records, elapsed = run_load(
+                        '127.0.0.1', options['port'], make_call,
+                        options['clients'], options['requests']
+                    )
+                finally:
+                    server.terminate()
+                    server.wait(timeout=30)
+                summary = summarize(records, elapsed)
+                report['modes'][mode] = summary
+                total = summary['total']
+                self.stdout.write(
+                    f'{mode:8} {total["rps"]:>9} rps  '
+                    f'p50 {total["p50_ms"]:>8} мс  '
+                    f'p95 {total["p95_ms"]:>8} мс  '
+                    f'p99 {total["p99_ms"]:>8} мс  '
+                    f'ошибки {total["error_rate"]:.2%}'
+                )
+        finally:
+            service.delete()
+            cleanup_accounts(PREFIX)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=4)
+
+    def start_server(self, mode, options):
+        env = dict(
+            os.environ,
+            SERVER_MODE=mode,
+            GUNICORN_BIND=f'127.0.0.1:{options["port"]}',
+            WEB_CONCURRENCY=str(options['workers']),
+            GUNICORN_THREADS=str(options['threads']),
+            ASGI_CONCURRENCY=str(options['asgi_concurrency']),
+            DJANGO_SETTINGS_MODULE=os.environ['DJANGO_SETTINGS_MODULE'],
+        )
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+            cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Сервер в режиме {mode} не запустился')
+            try:
+                socket.create_connection(
+                    ('127.0.0.1', options['port']), timeout=1
+                ).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'Сервер в режиме {mode} не отвечает')
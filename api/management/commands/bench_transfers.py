@@ -0,0 +1,141 @@
+import random
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+
+from api import operations
+from api.management.benchmarks import cleanup_accounts, seed_accounts
+from api.models import Account
+
+PREFIX = 'bench-transfer-'
+
+
+class Command(BaseCommand):
+    help = (
+        'Многопоточный замер пропускной способности переводов '
+        'с проверкой сохранения суммы балансов. '
+        'Запускать на PostgreSQL: SQLite сериализует запись.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=20)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument(
+            '--transfers', type=int, default=500,
+            help='Количество переводов на один поток'
+        )
+        parser.add_argument('--balance', type=Decimal, default=Decimal(1000))
+        parser.add_argument('--max-amount', type=Decimal, default=Decimal(50))
+        parser.add_argument(
+            '--hot', type=float, default=0.0,
+            help='Доля переводов, затрагивающих один "горячий" счет'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1,
+            help='Проводить переводы пачками через transfer_batch'
+        )
+
+    def handle(self, *args, **options):
+        if options['accounts'] < 2:
+            raise CommandError('Нужно минимум два счета')
+        cleanup_accounts(PREFIX)
+        account_ids = [
+            account.id for account in
+            seed_accounts(PREFIX, options['accounts'], options['balance'])
+        ]
+        total_before = self.total(account_ids)
+
+        counters = Counter()
+        lock = threading.Lock()
+        threads = [
+            threading.Thread(
+                target=self.worker,
+                args=(account_ids, options, counters, lock)
+            )
+            for _ in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total_after = self.total(account_ids)
+        negative = Account.objects.filter(
+            id__in=account_ids, balance__lt=0
+        ).count()
+        cleanup_accounts(PREFIX)
+
+        attempts = sum(counters.values())
+        self.stdout.write(f'Потоков: {options["threads"]}, '
+                          f'счетов: {len(account_ids)}, '
+                          f'размер пачки: {options["batch_size"]}')
+        self.stdout.write(f'Попыток перевода: {attempts} '
+                          f'за {elapsed:.2f} с')
+        self.stdout.write(f'Успешных: {counters["ok"]}, '
+                          f'недостаточно средств: {counters["insufficient"]}, '
+                          f'ошибок: {counters["errors"]}')
+        self.stdout.write(f'Переводов в секунду: {attempts / elapsed:.1f}')
+        self.stdout.write(f'Сумма балансов до: {total_before}, '
+                          f'после: {total_after}')
+        if total_before != total_after or negative:
+            raise CommandError('Нарушена целостность балансов!')
+        self.stdout.write(self.style.SUCCESS('Сумма балансов сохранена'))
+
+    def worker(self, account_ids, options, counters, lock):
+        rng = random.Random()
+        local = Counter()
+        batch_size = options['batch_size']
+        try:
+            for _ in range(0, options['transfers'], batch_size):
+                items = [
+                    self.random_transfer(rng, account_ids, options)
+                    for _ in range(batch_size)
+                ]
+                try:
+                    if batch_size == 1:
+                        outcomes = [operations.transfer(
+                            items[0]['from_account'], items[0]['to_account'],
+                            items[0]['amount']
+                        )]
+                    else:
+                        outcomes = operations.transfer_batch(items)
+                except operations.InsufficientFunds:
+                    outcomes = [operations.InsufficientFunds()]
+                except Exception:
+                    local['errors'] += len(items)
+                    continue
+                for outcome in outcomes:
+                    if isinstance(outcome, operations.InsufficientFunds):
+                        local['insufficient'] += 1
+                    elif isinstance(outcome, operations.OperationError):
+                        local['errors'] += 1
+                    else:
+                        local['ok'] += 1
+        finally:
+            connection.close()
+        with lock:
+            counters.update(local)
+
+    def random_transfer(self, rng, account_ids, options):
+        pair = rng.sample(account_ids, 2)
+        if rng.random() < options['hot']:
+            pair = [account_ids[0], rng.choice(account_ids[1:])]
+            rng.shuffle(pair)
+        cents = rng.randint(1, int(options['max_amount'] * 100))
+        return {
+            'from_account': pair[0],
+            'to_account': pair[1],
+            'amount': Decimal(cents) / 100,
+        }
+
+    def total(self, account_ids):
+        return Account.objects.filter(
+            id__in=account_ids
+        ).aggregate(total=Sum('balance'))['total']
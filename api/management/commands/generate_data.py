@@ -0,0 +1,186 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api import catalog, rates
+from api.management.fixtures import insert_rows
+from api.models import Account, Action, Service, Transaction, Transfer, User
+
+CURRENCIES = [code for code, _ in Service.CUREENCY]
+ACTION_FIELDS = ('account_id', 'amount', 'date')
+TRANSACTION_FIELDS = ('account_id', 'service_id', 'amount', 'date')
+TRANSFER_FIELDS = ('from_account_id', 'to_account_id', 'amount', 'date')
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерация согласованных синтетических данных для замеров: '
+        'пользователи, счета, услуги, пополнения, покупки и переводы. '
+        'Баланс каждого счета равен сумме его истории.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--services', type=int, default=100)
+        parser.add_argument(
+            '--deposits', type=int, default=5,
+            help='Пополнений на пользователя'
+        )
+        parser.add_argument(
+            '--purchases', type=int, default=3,
+            help='Попыток покупки на пользователя'
+        )
+        parser.add_argument(
+            '--transfers', type=int, default=5,
+            help='Попыток перевода на пользователя'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней растянуть историю'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Пользователей в одной пачке; переводы идут внутри пачки'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='synthetic-')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 2:
+            raise CommandError('В пачке нужно минимум два пользователя')
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        started = time.perf_counter()
+        services = self.create_services()
+        prefix = options['prefix']
+        first = User.objects.filter(username__startswith=prefix).count()
+        totals = {'users': 0, 'actions': 0, 'transactions': 0, 'transfers': 0}
+        for start in range(0, options['users'], options['chunk_size']):
+            size = min(options['chunk_size'], options['users'] - start)
+            counts = self.generate_chunk(first + start, size, services)
+            for key, value in counts.items():
+                totals[key] += value
+            self.stdout.write(
+                f'Пользователей: {start + size}/{options["users"]}, '
+                f'{time.perf_counter() - started:.1f} с'
+            )
+        catalog.invalidate()
+        self.stdout.write(
+            ', '.join(f'{key}: {value}' for key, value in totals.items())
+            + f'; {time.perf_counter() - started:.1f} с'
+        )
+
+    def create_services(self):
+        prefix = self.options['prefix']
+        Service.objects.bulk_create(
+            Service(
+                name=f'{prefix}{i}', description=f'{prefix}service',
+                price=Decimal(self.rng.randint(100, 500000)) / 100,
+                currency=self.rng.choice(CURRENCIES),
+            )
+            for i in range(self.options['services'])
+        )
+        return [
+            (service.id, rates.to_rub(service.price, service.currency))
+            for service in Service.objects.filter(
+                description=f'{prefix}service'
+            )
+        ]
+
+    def random_date(self):
+        return self.now - timedelta(
+            seconds=self.rng.uniform(0, self.options['days'] * 86400)
+        )
+
+    def simulate(self, size, services):
+        """Разыгрывает события по времени и возвращает итоговые балансы
+        и журналы с номерами счетов внутри пачки."""
+        options = self.options
+        events = []
+        for index in range(size):
+            for kind in ('deposits', 'purchases', 'transfers'):
+                events.extend(
+                    (self.random_date(), kind, index)
+                    for _ in range(options[kind])
+                )
+        events.sort()
+        balances = [Decimal(0)] * size
+        purchased = set()
+        actions, transactions, transfers = [], [], []
+        for date, kind, index in events:
+            if kind == 'deposits':
+                amount = Decimal(self.rng.randint(100, 1000000)) / 100
+                balances[index] += amount
+                actions.append((index, amount, date))
+            elif kind == 'purchases' and services:
+                service_id, price = self.rng.choice(services)
+                if (index, service_id) in purchased or balances[index] < price:
+                    continue
+                purchased.add((index, service_id))
+                balances[index] -= price
+                transactions.append((index, service_id, price, date))
+            elif kind == 'transfers' and size > 1:
+                to_index = self.rng.randrange(size - 1)
+                to_index += to_index >= index
+                amount = (balances[index] * Decimal(
+                    self.rng.randint(1, 50)
+                ) / 100).quantize(Decimal('0.01'))
+                if amount <= 0:
+                    continue
+                balances[index] -= amount
+                balances[to_index] += amount
+                transfers.append((index, to_index, amount, date))
+        return balances, actions, transactions, transfers
+
+    @transaction.atomic
+    def generate_chunk(self, first, size, services):
+        prefix = self.options['prefix']
+        batch_size = self.options['batch_size']
+        balances, actions, transactions, transfers = self.simulate(
+            size, services
+        )
+        names = [f'{prefix}{first + index}' for index in range(size)]
+        User.objects.bulk_create(
+            (User(username=name, email=f'{name}@synthetic.local')
+             for name in names),
+            batch_size=batch_size
+        )
+        user_ids = dict(
+            User.objects.filter(username__in=names)
+            .values_list('username', 'id')
+        )
+        Account.objects.bulk_create(
+            (Account(user_id=user_ids[name], balance=balance)
+             for name, balance in zip(names, balances)),
+            batch_size=batch_size
+        )
+        account_ids = dict(
+            Account.objects.filter(user_id__in=user_ids.values())
+            .values_list('user_id', 'id')
+        )
+        accounts = [account_ids[user_ids[name]] for name in names]
+        insert_rows(Action, ACTION_FIELDS, (
+            (accounts[index], amount, date)
+            for index, amount, date in actions
+        ), batch_size)
+        insert_rows(Transaction, TRANSACTION_FIELDS, (
+            (accounts[index], service_id, amount, date)
+            for index, service_id, amount, date in transactions
+        ), batch_size)
+        insert_rows(Transfer, TRANSFER_FIELDS, (
+            (accounts[index], accounts[to_index], amount, date)
+            for index, to_index, amount, date in transfers
+        ), batch_size)
+        return {
+            'users': size,
+            'actions': len(actions),
+            'transactions': len(transactions),
+            'transfers': len(transfers),
+        }
@@ -0,0 +1,66 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import FORMATS, InvalidImport, import_services, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузка и обновление каталога услуг из CSV, JSON или JSON Lines '
+        'по external_id. Ошибочные строки попадают в отчет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл выгрузки или - для stdin')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--output', help='Файл для отчета в JSON')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or self.guess_format(options['path'])
+        try:
+            if options['path'] == '-':
+                report = self.load(sys.stdin, file_format, options)
+            else:
+                with open(options['path'], encoding='utf-8',
+                          newline='') as file:
+                    report = self.load(file, file_format, options)
+        except InvalidImport as error:
+            if error.report is not None:
+                self.write_report(error.report, options)
+            raise CommandError(error)
+        except OSError as error:
+            raise CommandError(error)
+        self.write_report(report, options)
+
+    def write_report(self, report, options):
+        output = json.dumps(report.as_dict(), ensure_ascii=False, indent=4)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        else:
+            self.stdout.write(
+                f'Создано: {report.created}, обновлено: {report.updated}, '
+                f'без изменений: {report.unchanged}, '
+                f'с ошибкой: {report.failed}'
+            )
+            for error in report.errors:
+                self.stderr.write(
+                    f'Строка {error["row"]}: '
+                    f'{json.dumps(error["errors"], ensure_ascii=False)}'
+                )
+
+    def load(self, file, file_format, options):
+        return import_services(
+            read_rows(file, file_format), chunk_size=options['chunk_size']
+        )
+
+    def guess_format(self, path):
+        extension = path.rsplit('.', 1)[-1].lower()
+        if extension in FORMATS:
+            return extension
+        if extension == 'ndjson':
+            return 'jsonl'
+        raise CommandError('Укажите формат файла через --format')
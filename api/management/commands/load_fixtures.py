@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from api import catalog
+from api.management.fixtures import InvalidFixture, load_fixture
+
+
+class Command(BaseCommand):
+    help = (
+        'Быстрая загрузка JSON-фикстуры: файл читается потоково, объекты '
+        'записываются пачками bulk_create в порядке зависимостей моделей, '
+        'без сигналов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл фикстуры в формате JSON')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--ignorenonexistent', '-i', action='store_true',
+            help='Пропускать поля, которых нет в моделях'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with open(options['path'], encoding='utf-8') as file:
+                counts = load_fixture(
+                    file, options['database'], options['batch_size'],
+                    options['ignorenonexistent']
+                )
+        except (OSError, InvalidFixture) as error:
+            raise CommandError(error)
+        catalog.invalidate()
+        for label, count in sorted(counts.items()):
+            self.stdout.write(f'{label:30} {count:>10}')
+        self.stdout.write(
+            f'Загружено объектов: {sum(counts.values())} '
+            f'за {time.perf_counter() - started:.2f} с'
+        )
@@ -0,0 +1,150 @@
+import json
+import random
+import subprocess
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.authentication import issue_token
+from api.management.benchmarks import cleanup_accounts, seed_accounts
+from api.management.loadtest import call, run_load, summarize
+from api.models import Service
+
+PREFIX = 'loadtest-'
+SCENARIOS = ('deposits', 'transfers', 'purchases', 'history')
+HISTORY = (
+    ('history_actions', '/api/v1/actions/'),
+    ('history_transactions', '/api/v1/transactions/'),
+    ('history_transfers', '/api/v1/transfers/'),
+    ('history_to_my_account', '/api/v1/transfers/to_my_account/'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест денежных ручек запущенного сервера: пополнения, '
+        'переводы, покупки и чтение истории. Отчет в JSON по каждой ручке.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', default='http://127.0.0.1:8000',
+            help='Адрес запущенного сервера'
+        )
+        parser.add_argument(
+            '--scenarios', nargs='+', choices=SCENARIOS,
+            default=list(SCENARIOS)
+        )
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--services', type=int, default=100)
+        parser.add_argument('--balance', type=int, default=100000)
+        parser.add_argument('--clients', type=int, default=16)
+        parser.add_argument(
+            '--requests', type=int, default=250,
+            help='Количество запросов на одного клиента'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для отчета в JSON')
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Не удалять созданных пользователей и услуги'
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Укажите адрес вида http://host:port')
+        if options['users'] < 2:
+            raise CommandError('Для переводов нужно минимум два пользователя')
+
+        self.cleanup()
+        accounts = seed_accounts(
+            PREFIX, options['users'], balance=options['balance']
+        )
+        Service.objects.bulk_create(
+            Service(name=f'{PREFIX}{i}', description='loadtest', price=1)
+            for i in range(options['services'])
+        )
+        services = list(
+            Service.objects.filter(name__startswith=PREFIX)
+            .order_by('id').values_list('id', flat=True)
+        )
+        users = [
+            (account.id, str(issue_token(account.user)))
+            for account in accounts
+        ]
+        account_ids = [account_id for account_id, _ in users]
+        scenarios = options['scenarios']
+        generators = [
+            random.Random(options['seed'] + index)
+            for index in range(options['clients'])
+        ]
+
+        def make_call(index, iteration):
+            rng = generators[index]
+            account_id, token = users[rng.randrange(len(users))]
+            scenario = scenarios[iteration % len(scenarios)]
+            if scenario == 'deposits':
+                return call('deposit', 'POST', '/api/v1/actions/', {
+                    'account': account_id, 'amount': rng.randint(1, 100),
+                }, token)
+            if scenario == 'transfers':
+                to_account = rng.choice(account_ids)
+                while to_account == account_id:
+                    to_account = rng.choice(account_ids)
+                return call('transfer', 'POST', '/api/v1/transfers/', {
+                    'from_account': account_id,
+                    'to_account': to_account,
+                    'amount': rng.randint(1, 100),
+                }, token)
+            if scenario == 'purchases':
+                service_id = rng.choice(services)
+                return call(
+                    'purchase', 'GET',
+                    f'/api/v1/services/{service_id}/purchase/', token=token
+                )
+            name, path = rng.choice(HISTORY)
+            return call(name, 'GET', path, token=token)
+
+        try:
+            records, elapsed = run_load(
+                url.hostname, url.port or 80, make_call,
+                options['clients'], options['requests']
+            )
+        finally:
+            if not options['keep']:
+                self.cleanup()
+
+        report = {
+            'commit': self.commit(),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'url': options['url'],
+            'scenarios': scenarios,
+            'users': options['users'],
+            'clients': options['clients'],
+            'requests_per_client': options['requests'],
+            'elapsed_seconds': round(elapsed, 3),
+            'endpoints': summarize(records, elapsed),
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=4)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True,
+                check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def cleanup(self):
+        cleanup_accounts(PREFIX)
+        Service.objects.filter(name__startswith=PREFIX).delete()
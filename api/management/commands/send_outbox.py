@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = 'Фоновая отправка писем из очереди OutgoingEmail.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь один раз и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_pending(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Отправлено: {sent}, с ошибкой: {failed}')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
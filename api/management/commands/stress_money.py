@@ -0,0 +1,227 @@
+import json
+import multiprocessing
+import random
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+from django.db.models import Sum
+
+from api import operations
+from api.management.benchmarks import cleanup_accounts, seed_accounts
+from api.models import Account, Action, Service, Transaction, Transfer
+
+PREFIX = 'stress-'
+OPERATIONS = ('transfer', 'purchase', 'deposit')
+
+
+def run_operations(account_ids, services, count, seed, max_amount, weights):
+    rng = random.Random(seed)
+    outcomes = Counter()
+    try:
+        for _ in range(count):
+            kind = rng.choices(OPERATIONS, weights)[0]
+            account_id = rng.choice(account_ids)
+            amount = Decimal(rng.randint(1, max_amount))
+            try:
+                if kind == 'transfer':
+                    operations.transfer(
+                        account_id, rng.choice(account_ids), amount
+                    )
+                elif kind == 'purchase':
+                    service_id, price = rng.choice(services)
+                    operations.purchase(account_id, service_id, price)
+                else:
+                    operations.deposit(account_id, amount)
+                outcomes[f'{kind}:ok'] += 1
+            except (operations.OperationError, DatabaseError) as error:
+                outcomes[f'{kind}:{type(error).__name__}'] += 1
+    finally:
+        connection.close()
+    return outcomes
+
+
+def run_threads(account_ids, services, threads, count, seed, max_amount,
+                weights):
+    results = []
+    lock = threading.Lock()
+
+    def target(index):
+        outcomes = run_operations(
+            account_ids, services, count, seed + index, max_amount, weights
+        )
+        with lock:
+            results.append(outcomes)
+
+    workers = [
+        threading.Thread(target=target, args=(index,))
+        for index in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(results, Counter())
+
+
+def run_process(arguments):
+    return run_threads(*arguments)
+
+
+class Command(BaseCommand):
+    help = (
+        'Стресс-тест одновременного движения денег: случайные переводы, '
+        'покупки и пополнения из многих потоков и процессов с проверкой '
+        'сохранения балансов. Запускать на PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=50)
+        parser.add_argument('--services', type=int, default=20)
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Количество потоков в каждом процессе'
+        )
+        parser.add_argument(
+            '--operations', type=int, default=500,
+            help='Количество операций на один поток'
+        )
+        parser.add_argument('--balance', type=Decimal, default=Decimal(500))
+        parser.add_argument('--max-amount', type=int, default=100)
+        parser.add_argument(
+            '--weights', type=int, nargs=3, default=[6, 2, 2],
+            metavar=('TRANSFER', 'PURCHASE', 'DEPOSIT'),
+            help='Доли переводов, покупок и пополнений'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для отчета в JSON')
+
+    def handle(self, *args, **options):
+        self.cleanup()
+        accounts = seed_accounts(
+            PREFIX, options['accounts'], balance=options['balance']
+        )
+        Service.objects.bulk_create(
+            Service(
+                name=f'{PREFIX}{i}', description='stress', price=10 + i
+            )
+            for i in range(options['services'])
+        )
+        account_ids = [account.id for account in accounts]
+        services = [
+            (service.id, service.price)
+            for service in Service.objects.filter(name__startswith=PREFIX)
+        ]
+        tasks = [
+            (account_ids, services, options['threads'], options['operations'],
+             options['seed'] + index * options['threads'],
+             options['max_amount'], options['weights'])
+            for index in range(options['processes'])
+        ]
+
+        try:
+            started = time.perf_counter()
+            if options['processes'] == 1:
+                outcomes = run_threads(*tasks[0])
+            else:
+                connections.close_all()
+                context = multiprocessing.get_context('fork')
+                with context.Pool(options['processes']) as pool:
+                    outcomes = sum(pool.map(run_process, tasks), Counter())
+            elapsed = time.perf_counter() - started
+            violations = self.verify(
+                account_ids, options['balance'], outcomes
+            )
+        finally:
+            self.cleanup()
+
+        total = sum(outcomes.values())
+        report = {
+            'accounts': len(account_ids),
+            'processes': options['processes'],
+            'threads': options['threads'],
+            'operations': total,
+            'elapsed_seconds': round(elapsed, 3),
+            'ops_per_second': round(total / elapsed, 1),
+            'outcomes': dict(sorted(outcomes.items())),
+            'violations': violations,
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=4)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+        if violations:
+            raise CommandError(
+                f'Нарушены инварианты балансов: {len(violations)}'
+            )
+
+    def verify(self, account_ids, balance, outcomes):
+        """Сверяет балансы с журналами операций.
+
+        Баланс каждого счета должен совпасть с начальным плюс
+        пополнения и входящие переводы минус покупки и исходящие
+        переводы, сумма балансов - с начальной суммой плюс пополнения
+        минус покупки, а число строк в журналах - с числом успешных
+        операций.
+        """
+        def totals(model, field):
+            rows = model.objects.filter(**{f'{field}__in': account_ids})
+            return dict(
+                rows.order_by().values(field).annotate(total=Sum('amount'))
+                .values_list(field, 'total')
+            ), rows.count()
+
+        deposits, deposit_rows = totals(Action, 'account_id')
+        purchases, purchase_rows = totals(Transaction, 'account_id')
+        sent, transfer_rows = totals(Transfer, 'from_account_id')
+        received, _ = totals(Transfer, 'to_account_id')
+        balances = dict(
+            Account.objects.filter(id__in=account_ids)
+            .values_list('id', 'balance')
+        )
+
+        violations = []
+        for account_id, current in balances.items():
+            expected = (
+                balance
+                + deposits.get(account_id, 0) + received.get(account_id, 0)
+                - purchases.get(account_id, 0) - sent.get(account_id, 0)
+            )
+            if current != expected:
+                violations.append(
+                    f'Счет {account_id}: баланс {current}, '
+                    f'по журналам {expected}'
+                )
+            if current < 0:
+                violations.append(
+                    f'Счет {account_id}: отрицательный баланс {current}'
+                )
+
+        expected_total = (
+            balance * len(account_ids)
+            + sum(deposits.values()) - sum(purchases.values())
+        )
+        if sum(balances.values()) != expected_total:
+            violations.append(
+                f'Сумма балансов {sum(balances.values())}, '
+                f'ожидалось {expected_total}'
+            )
+        for kind, rows in (('transfer', transfer_rows),
+                           ('purchase', purchase_rows),
+                           ('deposit', deposit_rows)):
+            if outcomes[f'{kind}:ok'] != rows:
+                violations.append(
+                    f'Успешных операций {kind}: {outcomes[f"{kind}:ok"]}, '
+                    f'строк в журнале: {rows}'
+                )
+        return violations
+
+    def cleanup(self):
+        cleanup_accounts(PREFIX)
+        Service.objects.filter(name__startswith=PREFIX).delete()
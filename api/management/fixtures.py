@@ -0,0 +1,262 @@
+import csv
+import io
+import json
+from contextlib import contextmanager
+
+from django.core.management.color import no_style
+from django.core.serializers import base, python
+from django.db import connections, router, transaction
+
+READ_SIZE = 1 << 16
+
+
+class InvalidFixture(Exception):
+    pass
+
+
+class ArrayReader:
+    def __init__(self, file, read_size):
+        self.file = file
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+
+    def read_more(self):
+        chunk = self.file.read(self.read_size)
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return bool(chunk)
+
+    def peek(self):
+        """Следующий непробельный символ или None в конце файла."""
+        while True:
+            while (self.position < len(self.buffer)
+                   and self.buffer[self.position].isspace()):
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more():
+                return None
+
+    def expect(self, chars, message):
+        char = self.peek()
+        if char is None or char not in chars:
+            raise InvalidFixture(message)
+        self.position += 1
+        return char
+
+    def decode(self):
+        while True:
+            try:
+                value, stop = self.decoder.raw_decode(
+                    self.buffer, self.position
+                )
+            except json.JSONDecodeError as error:
+                if not self.read_more():
+                    raise InvalidFixture(f'Некорректный JSON: {error}')
+                continue
+            self.buffer, self.position = self.buffer[stop:], 0
+            return value
+
+
+def iter_array(file, read_size=READ_SIZE):
+    """Объекты JSON-массива из файла по одному, без чтения файла целиком."""
+    reader = ArrayReader(file, read_size)
+    reader.expect('[', 'Ожидается JSON-массив')
+    if reader.peek() == ']':
+        reader.position += 1
+    else:
+        while True:
+            if reader.peek() != '{':
+                raise InvalidFixture('Ожидается объект')
+            yield reader.decode()
+            if reader.expect(',]', 'Ожидается , или ]') == ']':
+                break
+    if reader.peek() is not None:
+        raise InvalidFixture('Лишние данные после конца массива')
+
+
+def dependencies(model):
+    return {
+        field.related_model
+        for field in model._meta.concrete_fields
+        if field.is_relation and field.related_model is not model
+    }
+
+
+def dependency_order(models):
+    """Модели в порядке, при котором связанные записи вставляются
+    раньше ссылающихся на них."""
+    ordered, visiting = [], set()
+
+    def visit(model):
+        if model in ordered or model in visiting:
+            return
+        visiting.add(model)
+        for parent in dependencies(model):
+            if parent in models:
+                visit(parent)
+        visiting.discard(model)
+        ordered.append(model)
+
+    for model in sorted(models, key=lambda model: model._meta.label):
+        visit(model)
+    return ordered
+
+
+@contextmanager
+def raw_dates(models):
+    """Отключает auto_now и auto_now_add, чтобы bulk_create сохранил
+    даты из данных, а не текущее время."""
+    fields = [
+        field
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def insert_rows(model, fields, rows, batch_size=5000):
+    """Вставляет кортежи значений полей fields.
+
+    На PostgreSQL строки передаются одной командой COPY в обход ORM, на
+    других базах - через bulk_create с сохранением переданных дат.
+    """
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor != 'postgresql':
+        with raw_dates([model]):
+            model.objects.bulk_create(
+                (model(**dict(zip(fields, row))) for row in rows),
+                batch_size=batch_size
+            )
+        return
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    columns = ', '.join(
+        quote(model._meta.get_field(name).column) for name in fields
+    )
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {quote(model._meta.db_table)} ({columns}) '
+            'FROM STDIN WITH (FORMAT csv)',
+            buffer
+        )
+
+
+class FixtureLoader:
+    """Загружает объекты фикстуры пачками bulk_create и bulk_update.
+
+    Объекты копятся по моделям; перед записью пачки модели
+    записываются накопленные объекты моделей, на которые она
+    ссылается. Существующие по pk записи обновляются, как в loaddata,
+    сигналы не отправляются.
+    """
+
+    def __init__(self, using, batch_size):
+        self.using = using
+        self.batch_size = batch_size
+        self.pending = {}
+        self.counts = {}
+
+    def add(self, deserialized):
+        model = type(deserialized.object)
+        batch = self.pending.setdefault(model, [])
+        batch.append(deserialized)
+        if len(batch) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model, seen=None):
+        seen = set() if seen is None else seen
+        seen.add(model)
+        for parent in dependencies(model):
+            if parent in self.pending and parent not in seen:
+                self.flush(parent, seen)
+        batch = self.pending.pop(model, [])
+        if not batch:
+            return
+        objects = [item.object for item in batch]
+        manager = model._base_manager.using(self.using)
+        existing = set(manager.filter(
+            pk__in=[obj.pk for obj in objects if obj.pk is not None]
+        ).values_list('pk', flat=True))
+        fields = [
+            field.name for field in model._meta.concrete_fields
+            if not field.primary_key
+        ]
+        with raw_dates([model]):
+            manager.bulk_update(
+                [obj for obj in objects if obj.pk in existing], fields
+            )
+            manager.bulk_create(
+                [obj for obj in objects if obj.pk not in existing]
+            )
+        self.write_m2m(model, batch, existing)
+        self.counts[model] = self.counts.get(model, 0) + len(batch)
+
+    def write_m2m(self, model, batch, existing):
+        """Связи многие-ко-многим пишутся в промежуточную таблицу одним
+        bulk_create на поле; у существующих объектов прежние связи
+        удаляются, как при set()."""
+        for field in model._meta.many_to_many:
+            values = [
+                (item.object, item.m2m_data[field.name]) for item in batch
+                if field.name in (item.m2m_data or {})
+            ]
+            through = field.remote_field.through
+            if not through._meta.auto_created:
+                for obj, related in values:
+                    getattr(obj, field.name).set(related)
+                continue
+            manager = through._base_manager.using(self.using)
+            source = through._meta.get_field(field.m2m_field_name())
+            target = through._meta.get_field(field.m2m_reverse_field_name())
+            replaced = [obj.pk for obj, _ in values if obj.pk in existing]
+            if replaced:
+                manager.filter(**{f'{source.name}__in': replaced}).delete()
+            manager.bulk_create([
+                through(**{source.attname: obj.pk, target.attname: pk})
+                for obj, related in values for pk in related
+            ], batch_size=self.batch_size)
+
+    def finish(self):
+        for model in dependency_order(set(self.pending)):
+            self.flush(model)
+        self.reset_sequences()
+
+    def reset_sequences(self):
+        connection = connections[self.using]
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), list(self.counts)
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def load_fixture(file, using, batch_size=5000, ignorenonexistent=False):
+    loader = FixtureLoader(using, batch_size)
+    with transaction.atomic(using=using):
+        for data in iter_array(file):
+            try:
+                for deserialized in python.Deserializer(
+                    [data], using=using, ignorenonexistent=ignorenonexistent
+                ):
+                    loader.add(deserialized)
+            except base.DeserializationError as error:
+                raise InvalidFixture(str(error))
+        loader.finish()
+    return {
+        model._meta.label: count for model, count in loader.counts.items()
+    }
@@ -0,0 +1,97 @@
+import http.client
+import json
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from api.management.benchmarks import percentile
+
+Call = namedtuple('Call', ('name', 'method', 'path', 'body', 'headers'))
+
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+def call(name, method, path, body=None, token=None):
+    headers = dict(JSON_HEADERS)
+    if token is not None:
+        headers['Authorization'] = f'Bearer {token}'
+    if body is not None:
+        body = json.dumps(body)
+    return Call(name, method, path, body, headers)
+
+
+def run_load(host, port, make_call, clients, requests):
+    """Гоняет нагрузку из clients потоков по requests запросов в каждом.
+
+    Каждый поток держит свое keep-alive соединение; make_call(client,
+    iteration) возвращает Call для очередного запроса. Результат:
+    список (имя, статус, длительность) и общее время прогона.
+    """
+    records = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients + 1)
+
+    def client(index):
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        own = []
+        barrier.wait()
+        for iteration in range(requests):
+            request = make_call(index, iteration)
+            started = time.perf_counter()
+            try:
+                connection.request(
+                    request.method, request.path, request.body,
+                    request.headers
+                )
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                status = 0
+            own.append((request.name, status, time.perf_counter() - started))
+        connection.close()
+        with lock:
+            records.extend(own)
+
+    threads = [
+        threading.Thread(target=client, args=(index,))
+        for index in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return records, time.perf_counter() - started
+
+
+def summarize(records, elapsed):
+    """Запросы в секунду, перцентили задержки и доля ошибок.
+
+    Ошибкой считается обрыв соединения или ответ 5xx; остальные коды
+    выводятся в разбивке по статусам.
+    """
+    by_name = defaultdict(list)
+    for name, status, duration in records:
+        by_name[name].append((status, duration))
+    by_name['total'] = [(status, duration) for _, status, duration in records]
+
+    report = {}
+    for name, calls in by_name.items():
+        durations = [duration * 1000 for _, duration in calls]
+        statuses = defaultdict(int)
+        for status, _ in calls:
+            statuses[str(status)] += 1
+        errors = sum(1 for status, _ in calls if status == 0 or status >= 500)
+        report[name] = {
+            'requests': len(calls),
+            'rps': round(len(calls) / elapsed, 1),
+            'p50_ms': round(percentile(durations, 50), 2),
+            'p95_ms': round(percentile(durations, 95), 2),
+            'p99_ms': round(percentile(durations, 99), 2),
+            'error_rate': round(errors / len(calls), 4),
+            'statuses': dict(sorted(statuses.items())),
+        }
+    return report
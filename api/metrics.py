@@ -0,0 +1,273 @@
+import fcntl
+import glob
+import hmac
+import ipaddress
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+HISTOGRAMS = {
+    'api_request_duration_seconds': (
+        'Полное время обработки запроса', DURATION_BUCKETS
+    ),
+    'api_db_duration_seconds': (
+        'Время выполнения SQL-запросов за запрос', DURATION_BUCKETS
+    ),
+    'api_serialize_duration_seconds': (
+        'Время построения serializer.data без SQL', DURATION_BUCKETS
+    ),
+    'api_render_duration_seconds': (
+        'Время отрисовки ответа рендерером', DURATION_BUCKETS
+    ),
+    'api_db_queries': (
+        'Число SQL-запросов за запрос', QUERY_BUCKETS
+    ),
+}
+REQUESTS_TOTAL = 'api_requests_total'
+GAUGES = {}
+SNAPSHOT_PATTERN = re.compile(r'^metrics-(\d+)\.json$')
+RETIRED = 'metrics-retired.json'
+
+
+class Registry:
+    """Счетчики и гистограммы по маршрутам в памяти процесса.
+
+    Если задан METRICS_DIR, каждый процесс периодически сохраняет
+    свой снимок в отдельный файл, а /metrics суммирует снимки всех
+    воркеров, поэтому внешний сервис для сбора не нужен. Каталог должен
+    быть своим у каждого хоста или контейнера: снимки завершившихся
+    процессов распознаются по pid.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.requests = {}
+        self.collectors = []
+        self.flushed_at = 0
+
+    def register_collector(self, collect, metrics):
+        """Подключает функцию, возвращающую значения метрик на момент
+        снимка, в виде {'имя|метки': значение}; metrics описывает их как
+        {имя: (gauge или counter, описание)}.
+        """
+        GAUGES.update(metrics)
+        self.collectors.append(collect)
+
+    def observe(self, route, method, status, values):
+        with self.lock:
+            key = f'{REQUESTS_TOTAL}|{route}|{method}|{status}'
+            self.requests[key] = self.requests.get(key, 0) + 1
+            for name, value in values.items():
+                buckets = HISTOGRAMS[name][1]
+                key = f'{name}|{route}|{method}'
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = {
+                        'buckets': [0] * (len(buckets) + 1),
+                        'sum': 0,
+                    }
+                histogram['buckets'][bisect_left(buckets, value)] += 1
+                histogram['sum'] += value
+        self.maybe_flush()
+
+    def snapshot(self):
+        gauges = {}
+        for collect in self.collectors:
+            gauges.update(collect())
+        with self.lock:
+            return json.loads(json.dumps({
+                'histograms': self.histograms,
+                'requests': self.requests,
+                'gauges': gauges,
+            }))
+
+    def maybe_flush(self):
+        directory = getattr(settings, 'METRICS_DIR', None)
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+        if not directory or time.monotonic() - self.flushed_at < interval:
+            return
+        self.flushed_at = time.monotonic()
+        self.flush(directory)
+
+    def flush(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        descriptor, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(path, self.snapshot_path(directory))
+
+    def snapshot_path(self, directory):
+        return os.path.join(directory, f'metrics-{os.getpid()}.json')
+
+    def collect(self):
+        snapshots = [self.snapshot()]
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if directory:
+            own = self.snapshot_path(directory)
+            self.retire_dead(directory)
+            os.makedirs(directory, exist_ok=True)
+            with locked(directory, fcntl.LOCK_SH):
+                paths = glob.glob(os.path.join(directory, 'metrics-*.json'))
+                for path in paths:
+                    if path == own:
+                        continue
+                    snapshot = read_snapshot(path)
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+        return merge(snapshots)
+
+    def retire_dead(self, directory):
+        """Складывает счетчики и гистограммы завершившихся воркеров в
+        metrics-retired.json и удаляет их снимки, чтобы каталог не рос
+        и счетчики не уменьшались. Значения gauges отбрасываются."""
+        dead = []
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            match = SNAPSHOT_PATTERN.match(name)
+            if match and not process_alive(int(match[1])):
+                dead.append(os.path.join(directory, name))
+        if not dead:
+            return
+        with locked(directory, fcntl.LOCK_EX):
+            retired_path = os.path.join(directory, RETIRED)
+            snapshots = [read_snapshot(retired_path)]
+            snapshots += [read_snapshot(path) for path in dead]
+            retired = merge(
+                [snapshot for snapshot in snapshots if snapshot is not None]
+            )
+            retired['gauges'] = {}
+            descriptor, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump(retired, file)
+            os.replace(path, retired_path)
+            for path in dead:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+@contextmanager
+def locked(directory, operation):
+    with open(os.path.join(directory, 'metrics.lock'), 'a') as lock:
+        fcntl.flock(lock, operation)
+        yield
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_snapshot(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def merge(snapshots):
+    merged = {'histograms': {}, 'requests': {}, 'gauges': {}}
+    for snapshot in snapshots:
+        for key, value in snapshot['requests'].items():
+            merged['requests'][key] = merged['requests'].get(key, 0) + value
+        for key, value in snapshot.get('gauges', {}).items():
+            merged['gauges'][key] = merged['gauges'].get(key, 0) + value
+        for key, histogram in snapshot['histograms'].items():
+            target = merged['histograms'].setdefault(
+                key, {'buckets': [0] * len(histogram['buckets']), 'sum': 0}
+            )
+            for index, count in enumerate(histogram['buckets']):
+                target['buckets'][index] += count
+            target['sum'] += histogram['sum']
+    return merged
+
+
+def render(data):
+    lines = [
+        f'# HELP {REQUESTS_TOTAL} Число обработанных запросов',
+        f'# TYPE {REQUESTS_TOTAL} counter',
+    ]
+    for key, value in sorted(data['requests'].items()):
+        _, route, method, status = key.split('|')
+        lines.append(
+            f'{REQUESTS_TOTAL}{{route="{route}",method="{method}",'
+            f'status="{status}"}} {value}'
+        )
+    for name, (description, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} histogram')
+        for key, histogram in sorted(data['histograms'].items()):
+            metric, route, method = key.split('|')
+            if metric != name:
+                continue
+            labels = f'route="{route}",method="{method}"'
+            cumulative = 0
+            bounds = [str(bound) for bound in buckets] + ['+Inf']
+            for bound, count in zip(bounds, histogram['buckets']):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{name}_sum{{{labels}}} {histogram["sum"]}')
+            lines.append(f'{name}_count{{{labels}}} {cumulative}')
+    gauges = data.get('gauges', {})
+    for name, (kind, description) in GAUGES.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for key, value in sorted(gauges.items()):
+            metric, labels = key.split('|')
+            if metric == name:
+                lines.append(f'{name}{{{labels}}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def metrics_allowed(request):
+    """Адрес клиента входит в METRICS_ALLOWED_NETWORKS или передан
+    заголовок Authorization: Bearer METRICS_TOKEN."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and hmac.compare_digest(header, f'Bearer {token}'):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network)
+        for network in getattr(settings, 'METRICS_ALLOWED_NETWORKS', ())
+        if network
+    )
+
+
+def metrics_view(request):
+    if not metrics_allowed(request):
+        raise Http404
+    return HttpResponse(
+        render(registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
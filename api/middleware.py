@@ -0,0 +1,189 @@
+import asyncio
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .checks import is_local_cache
+from .db.routers import (choose_replica, is_pinned, is_replica_view,
+                         pin_to_primary, read_alias, replicas,
+                         stream_from_replica)
+from .metrics import registry
+
+
+class RequestTimings:
+    def __init__(self):
+        self.queries = 0
+        self.db = 0
+        self.serialize = 0
+        self.render = 0
+        self.render_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    @contextmanager
+    def serializing(self):
+        """Время построения serializer.data без SQL-запросов, выполненных
+        при этом."""
+        started, db = time.perf_counter(), self.db
+        try:
+            yield
+        finally:
+            self.serialize += time.perf_counter() - started - (self.db - db)
+
+    def start_render(self):
+        self.render_started = time.perf_counter()
+
+    def finish_render(self, response):
+        self.render = time.perf_counter() - self.render_started
+
+
+class MetricsMiddleware:
+    """Замеряет число и время SQL-запросов, время сериализации
+    (serializer.data), время отрисовки ответа рендерером и полное время
+    запроса, отдает их в заголовке Server-Timing и копит гистограммы по
+    маршрутам для /metrics.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings = request._timings = RequestTimings()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            self.instrument(stack, timings)
+            response = self.get_response(request)
+        return self.finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        timings = request._timings = RequestTimings()
+        started = time.perf_counter()
+        stack = ExitStack()
+        await sync_to_async(self.instrument)(stack, timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, timings, started)
+
+    def instrument(self, stack, timings):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timings))
+
+    def finish(self, request, response, timings, started):
+        total = time.perf_counter() - started
+        view = max(
+            total - timings.db - timings.serialize - timings.render, 0
+        )
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={timings.db * 1000:.2f};desc="{timings.queries} SQL"',
+            f'view;dur={view * 1000:.2f}',
+            f'serialize;dur={timings.serialize * 1000:.2f}',
+            f'render;dur={timings.render * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ))
+        match = request.resolver_match
+        registry.observe(
+            match.view_name if match else 'unmatched',
+            request.method,
+            response.status_code,
+            {
+                'api_request_duration_seconds': total,
+                'api_db_duration_seconds': timings.db,
+                'api_serialize_duration_seconds': timings.serialize,
+                'api_render_duration_seconds': timings.render,
+                'api_db_queries': timings.queries,
+            }
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        timings = request._timings
+        timings.start_render()
+        response.add_post_render_callback(timings.finish_render)
+        return response
+
+
+class ReplicaMiddleware:
+    """Отправляет чтения безопасных запросов к представлениям из
+    DATABASE_REPLICA_VIEWS на реплику.
+
+    После успешного изменяющего запроса пользователь закрепляется за
+    основной базой на REPLICA_STICKY_SECONDS секунд, чтобы сразу видеть
+    свои изменения. Потоковый ответ читает из той же реплики и во время
+    отдачи.
+    """
+
+    jwt_authentication = JWTAuthentication()
+
+    def __init__(self, get_response):
+        if (replicas() and getattr(settings, 'REPLICA_STICKY_SECONDS', 5) > 0
+                and is_local_cache()):
+            raise ImproperlyConfigured(
+                'Для DATABASE_REPLICAS нужен общий кэш: метка записи в '
+                'кэше памяти процесса не видна другим воркерам.'
+            )
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = read_alias.set(None)
+        try:
+            response = self.get_response(request)
+            alias = read_alias.get()
+        finally:
+            read_alias.reset(token)
+        if response.streaming and alias is not None:
+            response.streaming_content = stream_from_replica(
+                response.streaming_content, alias
+            )
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(user.id)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in SAFE_METHODS
+                and is_replica_view(request.resolver_match.view_name)
+                and not is_pinned(self.user_id(request))):
+            read_alias.set(choose_replica())
+
+    def user_id(self, request):
+        """Номер пользователя из токена без запроса к БД, а для сессии
+        админки - из request.user."""
+        header = self.jwt_authentication.get_header(request)
+        if header is None:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                return user.id
+            return None
+        raw_token = self.jwt_authentication.get_raw_token(header)
+        if raw_token is None:
+            return None
+        try:
+            validated = self.jwt_authentication.get_validated_token(raw_token)
+        except (InvalidToken, TokenError):
+            return None
+        return validated.get(jwt_settings.USER_ID_CLAIM)
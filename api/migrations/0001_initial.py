@@ -0,0 +1,121 @@
+# Generated by Django 3.2.5 on 2026-10-18 10:45
+
+import api.validators
+from django.conf import settings
+import django.contrib.auth.models
+import django.contrib.auth.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('username', models.CharField(error_messages={'unique': 'A user with that username already exists.'}, help_text='Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.', max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='username')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
+                ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
+                ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active. Unselect this instead of deleting accounts.', verbose_name='active')),
+                ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
+                ('email', models.EmailField(max_length=254, unique=True, verbose_name='Почта пользователя')),
+                ('bio', models.TextField(blank=True, max_length=200, verbose_name='О себе')),
+                ('role', models.CharField(choices=[('user', 'user'), ('moderator', 'moderator'), ('admin', 'admin')], default='user', max_length=50, verbose_name='Роль пользователя')),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.Group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.Permission', verbose_name='user permissions')),
+            ],
+            options={
+                'verbose_name': 'Пользователь',
+                'verbose_name_plural': 'Пользователи',
+                'ordering': ('username',),
+            },
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Account',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Баланс')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='accounts', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Счет',
+                'verbose_name_plural': 'Счета',
+                'ordering': ('user',),
+            },
+        ),
+        migrations.CreateModel(
+            name='Service',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, verbose_name='Название услуги')),
+                ('description', models.TextField(verbose_name='Описание услуги')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12, validators=[api.validators.validate_price], verbose_name='Цена услуги')),
+                ('currency', models.CharField(choices=[('RUB', 'RUB'), ('USD', 'USD'), ('EUR', 'EUR')], default='RUB', max_length=10, verbose_name='Валюта')),
+            ],
+            options={
+                'verbose_name': 'Услуга',
+                'verbose_name_plural': 'Услуги',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.CreateModel(
+            name='Transfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Сумма')),
+                ('date', models.DateTimeField(auto_now_add=True, verbose_name='Дата перевода денежных средств')),
+                ('from_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='from_account', to='api.account', verbose_name='Счет отправителя')),
+                ('to_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='to_account', to='api.account', verbose_name='Счет получателя')),
+            ],
+            options={
+                'verbose_name': 'Перевод денежных средств',
+                'verbose_name_plural': 'Переводы денежных средств',
+                'ordering': ('date',),
+            },
+        ),
+        migrations.CreateModel(
+            name='Transaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(auto_now_add=True, verbose_name='Дата приобретения услуги')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Сумма')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='api.account', verbose_name='Счет')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='api.service', verbose_name='Услуга')),
+            ],
+            options={
+                'verbose_name': 'Приобретение',
+                'verbose_name_plural': 'Приобретения',
+                'ordering': ('date',),
+            },
+        ),
+        migrations.CreateModel(
+            name='Action',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Сумма')),
+                ('date', models.DateTimeField(auto_now_add=True, verbose_name='Дата пополнения счета')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actions', to='api.account', verbose_name='Счет')),
+            ],
+            options={
+                'verbose_name': 'Пополнение',
+                'verbose_name_plural': 'Пополнения',
+                'ordering': ('date',),
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.5 on 2026-10-18 10:45
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def remove_duplicate_purchases(apps, schema_editor):
+    """Оставляет первую покупку каждой пары (счет, услуга) и
+    возвращает на счет суммы повторных списаний."""
+    Account = apps.get_model('api', 'Account')
+    Transaction = apps.get_model('api', 'Transaction')
+    duplicates = (
+        Transaction.objects.order_by().values('account_id', 'service_id')
+        .annotate(first=Min('id'), count=Count('id')).filter(count__gt=1)
+    )
+    for pair in duplicates:
+        repeated = Transaction.objects.filter(
+            account_id=pair['account_id'], service_id=pair['service_id']
+        ).exclude(id=pair['first'])
+        refund = repeated.aggregate(total=Sum('amount'))['total']
+        Account.objects.filter(id=pair['account_id']).update(
+            balance=F('balance') + refund
+        )
+        repeated.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_purchases, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(fields=('account', 'service'), name='unique_account_service'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.5 on 2026-10-18 10:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_transaction_unique_account_service'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='action',
+            index=models.Index(fields=['account', 'date'], name='action_account_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', 'date'], name='transaction_account_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['from_account', 'date'], name='transfer_from_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['to_account', 'date'], name='transfer_to_date_idx'),
+        ),
+        migrations.AlterField(
+            model_name='action',
+            name='account',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='actions', to='api.account', verbose_name='Счет'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='account',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='api.account', verbose_name='Счет'),
+        ),
+        migrations.AlterField(
+            model_name='transfer',
+            name='from_account',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='from_account', to='api.account', verbose_name='Счет отправителя'),
+        ),
+        migrations.AlterField(
+            model_name='transfer',
+            name='to_account',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='to_account', to='api.account', verbose_name='Счет получателя'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.2.5 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+POSTGRESQL_FORWARD = [
+    "CREATE INDEX service_search_idx ON api_service USING gin "
+    "(to_tsvector('simple'::regconfig, COALESCE(name, '') || ' ' || "
+    "COALESCE(description, '')))",
+]
+POSTGRESQL_BACKWARD = [
+    'DROP INDEX IF EXISTS service_search_idx',
+]
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE api_service_fts USING fts5("
+    "name, description, content='api_service', content_rowid='id')",
+    "CREATE TRIGGER api_service_fts_insert AFTER INSERT ON api_service BEGIN "
+    "INSERT INTO api_service_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER api_service_fts_delete AFTER DELETE ON api_service BEGIN "
+    "INSERT INTO api_service_fts(api_service_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER api_service_fts_update AFTER UPDATE ON api_service BEGIN "
+    "INSERT INTO api_service_fts(api_service_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO api_service_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "INSERT INTO api_service_fts(api_service_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS api_service_fts_insert',
+    'DROP TRIGGER IF EXISTS api_service_fts_delete',
+    'DROP TRIGGER IF EXISTS api_service_fts_update',
+    'DROP TABLE IF EXISTS api_service_fts',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql, params=None)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_outgoing_email'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['currency', 'price'], name='service_currency_price_idx'),
+        ),
+        migrations.RunPython(
+            run({'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRESQL_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
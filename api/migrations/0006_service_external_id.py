@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 11:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_service_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True, verbose_name='Внешний идентификатор'),
+        ),
+    ]
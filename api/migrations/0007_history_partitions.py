@@ -0,0 +1,43 @@
+from django.db import migrations
+from django.utils import timezone
+
+from api.db import partitions
+
+TABLES = ('api_action', 'api_transaction', 'api_transfer')
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    now = timezone.now()
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            partitions.rebuild_table(cursor, table, now, partitioned=True)
+        for sql in partitions.GUARD_FORWARD:
+            cursor.execute(sql)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    now = timezone.now()
+    with schema_editor.connection.cursor() as cursor:
+        for sql in partitions.GUARD_BACKWARD:
+            cursor.execute(sql)
+        for table in TABLES:
+            partitions.rebuild_table(cursor, table, now, partitioned=False)
+        cursor.execute(
+            'ALTER TABLE api_transaction ADD CONSTRAINT unique_account_service '
+            'UNIQUE (account_id, service_id)'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_service_external_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    'DROP TRIGGER IF EXISTS api_service_fts_insert',
+    'DROP TRIGGER IF EXISTS api_service_fts_delete',
+    'DROP TRIGGER IF EXISTS api_service_fts_update',
+    "CREATE TRIGGER api_service_fts_insert AFTER INSERT ON api_service BEGIN "
+    "INSERT INTO api_service_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER api_service_fts_delete AFTER DELETE ON api_service BEGIN "
+    "INSERT INTO api_service_fts(api_service_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER api_service_fts_update AFTER UPDATE ON api_service BEGIN "
+    "INSERT INTO api_service_fts(api_service_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO api_service_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "INSERT INTO api_service_fts(api_service_fts) VALUES ('rebuild')",
+]
+
+
+def restore_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in SQLITE_FORWARD:
+        schema_editor.execute(sql, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_history_partitions'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 from .validators import validate_price
 
@@ -65,17 +66,22 @@ class Action(models.Model):
     date = models.DateTimeField('Дата пополнения счета', auto_now_add=True)
     account = models.ForeignKey(
         Account, on_delete=models.CASCADE,
-        related_name='actions', verbose_name='Счет'
+        related_name='actions', verbose_name='Счет', db_index=False
     )
 
     class Meta:
         ordering = ('date',)
         verbose_name = 'Пополнение'
         verbose_name_plural = 'Пополнения'
+        indexes = [
+            models.Index(
+                fields=('account', 'date'), name='action_account_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return (
-            f'Счет номер {self.account.id} '
+            f'Счет номер {self.account_id} '
             f'был пополнен на {self.amount} руб.'
         )
 
@@ -100,11 +106,21 @@ class Service(models.Model):
         'Валюта', choices=CUREENCY,
         default='RUB', max_length=10
     )
+    external_id = models.CharField(
+        'Внешний идентификатор', max_length=100,
+        unique=True, null=True, blank=True
+    )
 
     class Meta:
         ordering = ('name',)
         verbose_name = 'Услуга'
         verbose_name_plural = 'Услуги'
+        indexes = [
+            models.Index(
+                fields=('currency', 'price'),
+                name='service_currency_price_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -114,7 +130,7 @@ class Transaction(models.Model):
     date = models.DateTimeField('Дата приобретения услуги', auto_now_add=True)
     account = models.ForeignKey(
         Account, on_delete=models.CASCADE,
-        related_name='transactions', verbose_name='Счет'
+        related_name='transactions', verbose_name='Счет', db_index=False
     )
     service = models.ForeignKey(
         Service, on_delete=models.CASCADE,
@@ -128,10 +144,22 @@ class Transaction(models.Model):
         ordering = ('date',)
         verbose_name = 'Приобретение'
         verbose_name_plural = 'Приобретения'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('account', 'service'),
+                name='unique_account_service'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('account', 'date'),
+                name='transaction_account_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return (
-            f'Счет номер {self.account.id} '
+            f'Счет номер {self.account_id} '
             f'приобрел услугу {self.service.name} '
             f'за {self.service.price} {self.service.currency}'
         )
@@ -140,11 +168,13 @@ class Transaction(models.Model):
 class Transfer(models.Model):
     from_account = models.ForeignKey(
         Account, on_delete=models.CASCADE,
-        related_name='from_account', verbose_name='Счет отправителя'
+        related_name='from_account', verbose_name='Счет отправителя',
+        db_index=False
     )
     to_account = models.ForeignKey(
         Account, on_delete=models.CASCADE,
-        related_name='to_account', verbose_name='Счет получателя'
+        related_name='to_account', verbose_name='Счет получателя',
+        db_index=False
     )
     amount = models.DecimalField(
         'Сумма', max_digits=12, decimal_places=2
@@ -157,9 +187,47 @@ class Transfer(models.Model):
         ordering = ('date',)
         verbose_name = 'Перевод денежных средств'
         verbose_name_plural = 'Переводы денежных средств'
+        indexes = [
+            models.Index(
+                fields=('from_account', 'date'),
+                name='transfer_from_date_idx'
+            ),
+            models.Index(
+                fields=('to_account', 'date'),
+                name='transfer_to_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return (
             f'Перевод с {self.from_account} на {self.to_account}, '
             f'сумма перевода {self.amount}'
         )
+
+
+class OutgoingEmail(models.Model):
+    subject = models.CharField('Тема', max_length=255)
+    body = models.TextField('Текст письма')
+    from_email = models.CharField('Отправитель', max_length=254, blank=True)
+    recipient = models.EmailField('Получатель')
+    created = models.DateTimeField('Дата создания', auto_now_add=True)
+    next_attempt_at = models.DateTimeField(
+        'Дата следующей попытки', default=timezone.now
+    )
+    attempts = models.PositiveSmallIntegerField('Число попыток', default=0)
+    sent_at = models.DateTimeField('Дата отправки', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        ordering = ('created',)
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        indexes = [
+            models.Index(
+                fields=('next_attempt_at',), name='outgoing_email_pending_idx',
+                condition=models.Q(sent_at__isnull=True)
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipient}: {self.subject}'
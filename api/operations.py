@@ -0,0 +1,231 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Case, DecimalField, F, Value, When
+
+from . import archive
+from .models import Account, Action, Service, Transaction, Transfer
+
+
+class OperationError(Exception):
+    pass
+
+
+class AccountNotFound(OperationError):
+    pass
+
+
+class ServiceNotFound(OperationError):
+    pass
+
+
+class ForeignAccount(OperationError):
+    pass
+
+
+class SameAccount(OperationError):
+    pass
+
+
+class InvalidAmount(OperationError):
+    pass
+
+
+class InsufficientFunds(OperationError):
+    pass
+
+
+class AlreadyPurchased(OperationError):
+    pass
+
+
+PURCHASE_CONSTRAINT = 'unique_account_service'
+
+
+def lock_accounts(account_ids):
+    """Блокирует строки счетов в порядке возрастания id.
+
+    Единый порядок захвата блокировок исключает взаимные блокировки
+    между встречными переводами.
+    """
+    return list(
+        Account.objects.select_for_update()
+        .filter(id__in=set(account_ids))
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+
+
+def debit(account_id, amount):
+    return Account.objects.filter(
+        id=account_id, balance__gte=amount
+    ).update(balance=F('balance') - amount)
+
+
+def credit(account_id, amount):
+    return Account.objects.filter(
+        id=account_id
+    ).update(balance=F('balance') + amount)
+
+
+def deposit(account_id, amount):
+    """Пополняет счет атомарным UPDATE без чтения баланса."""
+    if amount <= 0:
+        raise InvalidAmount
+
+    with transaction.atomic():
+        if not credit(account_id, amount):
+            raise AccountNotFound
+        return Action.objects.create(account_id=account_id, amount=amount)
+
+
+def transfer(from_account_id, to_account_id, amount):
+    if from_account_id == to_account_id:
+        raise SameAccount
+    if amount <= 0:
+        raise InvalidAmount
+
+    with transaction.atomic():
+        if len(lock_accounts([from_account_id, to_account_id])) != 2:
+            raise AccountNotFound
+        if not debit(from_account_id, amount):
+            raise InsufficientFunds
+        credit(to_account_id, amount)
+        return Transfer.objects.create(
+            from_account_id=from_account_id,
+            to_account_id=to_account_id,
+            amount=amount
+        )
+
+
+def is_repeated_purchase(error):
+    """Нарушено ли уникальное ограничение на пару (счет, услуга), а не
+    внешний ключ или другое ограничение."""
+    diag = getattr(error.__cause__, 'diag', None)
+    if diag is not None:
+        return diag.constraint_name == PURCHASE_CONSTRAINT
+    return str(error).startswith('UNIQUE constraint failed')
+
+
+def purchased_in_archive(account_id, service_id):
+    """На PostgreSQL архивные покупки помнит отдельная таблица отметок,
+    на остальных базах архивация удаляет строки вместе с ограничением,
+    и покупку ищут в архиве счета."""
+    using = router.db_for_write(Transaction)
+    if connections[using].vendor == 'postgresql':
+        return False
+    return any(
+        item.service_id == service_id
+        for item in archive.archived(Transaction, account_id=account_id)
+    )
+
+
+def purchase(account_id, service_id, amount):
+    """Покупает услугу двумя запросами в одной короткой транзакции.
+
+    Повторная покупка отсекается уникальным ограничением на пару
+    (счет, услуга) и проверкой архива, списание выполняется условным
+    UPDATE. Удаленные счет и услуга не выдаются за повторную покупку
+    или нехватку средств.
+    """
+    if purchased_in_archive(account_id, service_id):
+        raise AlreadyPurchased
+    try:
+        with transaction.atomic():
+            created = Transaction.objects.create(
+                account_id=account_id,
+                service_id=service_id,
+                amount=amount
+            )
+            if not debit(account_id, amount):
+                if not Account.objects.filter(id=account_id).exists():
+                    raise AccountNotFound
+                raise InsufficientFunds
+    except IntegrityError as error:
+        if is_repeated_purchase(error):
+            raise AlreadyPurchased
+        if not Service.objects.filter(id=service_id).exists():
+            raise ServiceNotFound
+        raise
+    return created
+
+
+def apply_deltas(deltas):
+    """Применяет изменения балансов нескольких счетов одним UPDATE."""
+    deltas = {
+        account_id: delta for account_id, delta in deltas.items() if delta
+    }
+    if not deltas:
+        return 0
+    return Account.objects.filter(id__in=deltas).update(
+        balance=F('balance') + Case(
+            *[When(id=account_id, then=Value(delta))
+              for account_id, delta in deltas.items()],
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+    )
+
+
+def check_transfer(item, accounts, balances, owner_id):
+    from_id, to_id = item['from_account'], item['to_account']
+    if from_id not in accounts or to_id not in accounts:
+        return AccountNotFound()
+    if owner_id is not None and accounts[from_id] != owner_id:
+        return ForeignAccount()
+    if from_id == to_id:
+        return SameAccount()
+    if item['amount'] <= 0:
+        return InvalidAmount()
+    if balances[from_id] < item['amount']:
+        return InsufficientFunds()
+    return None
+
+
+def transfer_batch(items, owner_id=None):
+    """Проводит пачку переводов в одной транзакции.
+
+    Все затронутые счета блокируются одним запросом, переводы
+    проверяются по очереди на копии балансов в памяти, а затем
+    суммарные изменения применяются одним UPDATE и переводы
+    сохраняются через bulk_create. Возвращает список той же длины,
+    что и items: объект Transfer либо исключение OperationError.
+    """
+    account_ids = {item['from_account'] for item in items}
+    account_ids |= {item['to_account'] for item in items}
+    results = []
+    with transaction.atomic():
+        rows = (
+            Account.objects.select_for_update()
+            .filter(id__in=account_ids)
+            .order_by('id')
+            .values_list('id', 'user_id', 'balance')
+        )
+        accounts, balances = {}, {}
+        for account_id, user_id, balance in rows:
+            accounts[account_id] = user_id
+            balances[account_id] = balance
+
+        deltas = defaultdict(Decimal)
+        transfers = []
+        for item in items:
+            error = check_transfer(item, accounts, balances, owner_id)
+            if error is not None:
+                results.append(error)
+                continue
+            amount = item['amount']
+            for account_id, delta in ((item['from_account'], -amount),
+                                      (item['to_account'], amount)):
+                balances[account_id] += delta
+                deltas[account_id] += delta
+            transfer = Transfer(
+                from_account_id=item['from_account'],
+                to_account_id=item['to_account'],
+                amount=amount
+            )
+            transfers.append(transfer)
+            results.append(transfer)
+
+        apply_deltas(deltas)
+        Transfer.objects.bulk_create(transfers)
+    return results
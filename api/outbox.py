@@ -0,0 +1,107 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(subject, body, recipient, from_email=None):
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or '',
+        recipient=recipient,
+    )
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'OUTBOX_RETRY_DELAY', 30)
+    limit = getattr(settings, 'OUTBOX_MAX_RETRY_DELAY', 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), limit))
+
+
+def claim(batch_size, max_attempts):
+    """Забирает порцию писем, сдвигая их следующую попытку на
+    OUTBOX_LEASE секунд вперед, и сразу фиксирует транзакцию.
+
+    Письма выбираются с SKIP LOCKED, поэтому несколько воркеров не
+    заберут одно письмо дважды; если воркер упадет во время отправки,
+    письма вернутся в очередь по истечении аренды.
+    """
+    lease = timedelta(seconds=getattr(settings, 'OUTBOX_LEASE', 300))
+    with transaction.atomic():
+        batch = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True).filter(
+                sent_at__isnull=True,
+                attempts__lt=max_attempts,
+                next_attempt_at__lte=timezone.now(),
+            ).order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        leased_until = timezone.now() + lease
+        for email in batch:
+            email.attempts += 1
+            email.next_attempt_at = leased_until
+        OutgoingEmail.objects.bulk_update(
+            batch, ('attempts', 'next_attempt_at')
+        )
+    return batch
+
+
+def deliver_pending(batch_size=100, connection=None):
+    """Отправляет очередную порцию писем из очереди.
+
+    Письма забираются короткой транзакцией (claim), отправляются вне
+    транзакции через одно соединение с почтовым сервером, а результат
+    записывается второй короткой транзакцией, поэтому медленный сервер
+    не держит блокировки строк. Неудачные письма откладываются с
+    экспоненциально растущей задержкой, пока не исчерпан лимит
+    OUTBOX_MAX_ATTEMPTS. Возвращает пару (отправлено, с ошибкой).
+    """
+    max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8)
+    batch = claim(batch_size, max_attempts)
+    if not batch:
+        return 0, 0
+
+    connection = connection or get_connection()
+    done = []
+    try:
+        connection.open()
+        opened, connection_error = True, None
+    except Exception as error:
+        logger.warning('Почтовый сервер недоступен: %s', error)
+        opened, connection_error = False, error
+    try:
+        for email in batch:
+            error = connection_error
+            if opened:
+                try:
+                    EmailMessage(
+                        email.subject, email.body, email.from_email,
+                        [email.recipient], connection=connection
+                    ).send()
+                except Exception as exception:
+                    error = exception
+            if error is None:
+                email.sent_at = timezone.now()
+                email.last_error = ''
+            else:
+                email.next_attempt_at = (
+                    timezone.now() + retry_delay(email.attempts)
+                )
+                email.last_error = str(error)
+            done.append(email)
+    finally:
+        if opened:
+            connection.close()
+        with transaction.atomic():
+            OutgoingEmail.objects.bulk_update(
+                done, ('sent_at', 'next_attempt_at', 'last_error')
+            )
+    sent = sum(email.sent_at is not None for email in done)
+    return sent, len(done) - sent
@@ -0,0 +1,308 @@
+import base64
+import binascii
+import heapq
+import json
+from datetime import datetime
+from itertools import islice
+
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def sort_value(value, descending):
+    if isinstance(value, datetime):
+        value = value.timestamp()
+    return -value if descending else value
+
+
+def ordering_key(terms):
+    """Ключ сортировки объектов в Python по условиям order_by."""
+    fields = [(term.lstrip('-'), term.startswith('-')) for term in terms]
+
+    def key(item):
+        return tuple(
+            sort_value(getattr(item, name), descending)
+            for name, descending in fields
+        )
+    return key
+
+
+class ArchivedHistory:
+    """Строки queryset и архив истории счета как одна упорядоченная
+    последовательность для Paginator.
+
+    Архивные месяцы старше строк базы, поэтому при сортировке по дате
+    срез берется из базы через OFFSET и LIMIT, а архив читается, только
+    если срез заходит в его часть. При другой сортировке архив сливается
+    с queryset, и для дальних страниц из базы читаются все предыдущие
+    строки.
+    """
+
+    ordered = True
+
+    def __init__(self, queryset, archive):
+        terms = [
+            term for term in (
+                queryset.query.order_by or queryset.model._meta.ordering
+            ) if isinstance(term, str)
+        ] + ['id']
+        self.queryset = queryset.order_by(*terms)
+        self.key = ordering_key(terms)
+        self.archive = archive
+        self.by_date = terms[0].lstrip('-') == 'date'
+        self.archive_first = terms[0] == 'date'
+
+    @cached_property
+    def archived(self):
+        return sorted(self.archive.objects, key=self.key)
+
+    @cached_property
+    def stored(self):
+        return self.queryset.count()
+
+    def count(self):
+        return self.stored + self.archive.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        start, stop = index.start, index.stop
+        if not self.by_date:
+            merged = heapq.merge(
+                self.archived, self.queryset.iterator(), key=self.key
+            )
+            return list(islice(merged, start, stop))
+        if self.archive_first:
+            first, size = self.archived_slice, self.archive.count()
+            second = self.stored_slice
+        else:
+            first, size = self.stored_slice, self.stored
+            second = self.archived_slice
+        items = first(start, min(stop, size)) if start < size else []
+        if stop > size:
+            items += second(max(start - size, 0), stop - size)
+        return items
+
+    def stored_slice(self, start, stop):
+        return list(self.queryset[start:stop])
+
+    def archived_slice(self, start, stop):
+        return self.archived[start:stop]
+
+
+class KeysetPagination(BasePagination):
+    """Постраничный вывод по ключу (поле сортировки, id).
+
+    Курсор хранит значение поля сортировки и id граничной записи,
+    поэтому каждая страница выбирается условием по индексу без
+    COUNT(*) и OFFSET, за одинаковое время на любой глубине.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    default_ordering = 'date'
+    invalid_cursor_message = 'Некорректный курсор.'
+    archived = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.field, self.descending = self.get_ordering(
+            request, queryset, view
+        )
+        cursor = self.decode_cursor(request)
+        self.reverse = bool(cursor and cursor['reverse'])
+
+        descending = self.descending != self.reverse
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.field}', f'{prefix}id')
+        if cursor is not None:
+            queryset = queryset.filter(
+                self.after(cursor['value'], cursor['id'], descending)
+            )
+
+        page = list(queryset[:self.page_size + 1])
+        if self.needs_archive(page, queryset.model, cursor, descending):
+            page = self.merge_archived(
+                page, queryset.model, cursor, descending
+            )
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if self.reverse:
+            page.reverse()
+
+        self.next_item = self.previous_item = None
+        if page and (has_more or self.reverse):
+            self.next_item = page[-1]
+        if page and (has_more and self.reverse or cursor and not self.reverse):
+            self.previous_item = page[0]
+        return page
+
+    def needs_archive(self, page, model, cursor, descending):
+        """Архивные месяцы старше строк базы, поэтому при сортировке по
+        дате архив нужен, только если страница выходит за строки базы."""
+        if not self.archived:
+            return False
+        if self.field != 'date':
+            return True
+        if descending:
+            return len(page) <= self.page_size
+        if cursor is None:
+            return True
+        value = model._meta.get_field(self.field).to_python(cursor['value'])
+        return value < self.archived.end()
+
+    def merge_archived(self, page, model, cursor, descending):
+        prefix = '-' if descending else ''
+        key = ordering_key([f'{prefix}{self.field}', f'{prefix}id'])
+        archived = self.archived.objects
+        if cursor is not None:
+            value = model._meta.get_field(self.field).to_python(
+                cursor['value']
+            )
+            boundary = (
+                sort_value(value, descending),
+                sort_value(cursor['id'], descending),
+            )
+            archived = [item for item in archived if key(item) > boundary]
+        merged = heapq.merge(page, sorted(archived, key=key), key=key)
+        return list(islice(merged, self.page_size + 1))
+
+    def get_ordering(self, request, queryset, view):
+        ordering = OrderingFilter().get_ordering(request, queryset, view)
+        term = ordering[0] if ordering else self.default_ordering
+        return term.lstrip('-'), term.startswith('-')
+
+    def after(self, value, pk, descending):
+        lookup = 'lt' if descending else 'gt'
+        boundary = 'lte' if descending else 'gte'
+        return Q(**{f'{self.field}__{boundary}': value}) & (
+            Q(**{f'{self.field}__{lookup}': value})
+            | Q(**{self.field: value, f'id__{lookup}': pk})
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk, reverse = json.loads(
+                base64.urlsafe_b64decode(encoded.encode('ascii'))
+            )
+            return {'value': value, 'id': int(pk), 'reverse': bool(reverse)}
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, item, reverse):
+        payload = json.dumps(
+            [str(getattr(item, self.field)), item.id, reverse]
+        ).encode('utf-8')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param,
+            base64.urlsafe_b64encode(payload).decode('ascii')
+        )
+
+    def get_next_link(self):
+        if self.next_item is None:
+            return None
+        return self.encode_cursor(self.next_item, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_item is None:
+            return None
+        return self.encode_cursor(self.previous_item, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class HistoryPagination(PageNumberPagination):
+    """Постраничный вывод истории операций.
+
+    По умолчанию работает как PageNumberPagination, а с параметром
+    ?pagination=cursor переключается на KeysetPagination. Если у
+    представления есть get_archived, в вывод добавляются записи из
+    архива истории (archive.AccountArchive).
+    """
+
+    mode_query_param = 'pagination'
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        archived = None
+        if hasattr(view, 'get_archived'):
+            archived = view.get_archived()
+        if (request.query_params.get(self.mode_query_param) == 'cursor'
+                or self.keyset_class.cursor_query_param
+                in request.query_params):
+            self.keyset = self.keyset_class()
+            self.keyset.archived = archived
+            return self.keyset.paginate_queryset(queryset, request, view)
+        if archived:
+            queryset = ArchivedHistory(queryset, archived)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для больших таблиц в админке.
+
+    На PostgreSQL число строк берется из оценки планировщика (EXPLAIN),
+    и точный COUNT(*) выполняется, только если оценка не больше
+    exact_count_limit.
+    """
+
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            estimate = self.estimate_count(queryset, connection)
+            if estimate > self.exact_count_limit:
+                return estimate
+        return super().count
+
+    def estimate_count(self, queryset, connection):
+        try:
+            sql, params = queryset.order_by().query.get_compiler(
+                queryset.db
+            ).as_sql()
+        except EmptyResultSet:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
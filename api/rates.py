@@ -0,0 +1,133 @@
+import json
+import logging
+import threading
+import time
+from decimal import Decimal
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+BASE_CURRENCY = 'RUB'
+
+
+class RateSource:
+    """Источник курсов валют к рублю: {'USD': '72.56', ...}."""
+
+    def fetch(self):
+        raise NotImplementedError
+
+
+class StaticRateSource(RateSource):
+    def __init__(self, rates):
+        self.rates = rates
+
+    def fetch(self):
+        return self.rates
+
+
+class JSONFileRateSource(RateSource):
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self):
+        with open(self.path, encoding='utf-8') as file:
+            return json.load(file)
+
+
+class RateProvider:
+    """Кэш курсов валют в памяти процесса с обновлением по TTL.
+
+    Таблица курсов хранится в виде неизменяемого словаря готовых
+    Decimal и подменяется целиком, поэтому запрос никогда не видит
+    частично обновленную таблицу. Устаревшая таблица продолжает
+    отдаваться, пока новая загружается в фоновом потоке.
+    """
+
+    def __init__(self, source, ttl):
+        self.source = source
+        self.ttl = ttl
+        self._table = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def get_rates(self):
+        table = self._table
+        if table is None:
+            with self._lock:
+                if self._table is None:
+                    self.refresh()
+            return self._table
+        if (time.monotonic() >= self._expires_at
+                and self._lock.acquire(blocking=False)):
+            threading.Thread(
+                target=self._refresh_and_release, daemon=True
+            ).start()
+        return table
+
+    def get_rate(self, currency):
+        return self.get_rates()[currency]
+
+    def refresh(self):
+        try:
+            table = {
+                currency: Decimal(str(rate))
+                for currency, rate in self.source.fetch().items()
+            }
+            if any(rate <= 0 for rate in table.values()):
+                raise ValueError(f'Некорректные курсы валют: {table}')
+        except Exception:
+            if self._table is None:
+                raise
+            logger.exception('Не удалось обновить курсы валют')
+        else:
+            table[BASE_CURRENCY] = Decimal(1)
+            self._table = MappingProxyType(table)
+        self._expires_at = time.monotonic() + self.ttl
+
+    def _refresh_and_release(self):
+        try:
+            self.refresh()
+        finally:
+            self._lock.release()
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                config = settings.EXCHANGE_RATES
+                source_class = import_string(config['SOURCE'])
+                _provider = RateProvider(
+                    source_class(**config.get('OPTIONS', {})),
+                    config.get('TTL', 3600)
+                )
+    return _provider
+
+
+@receiver(setting_changed)
+def reset_provider(setting, **kwargs):
+    global _provider
+    if setting == 'EXCHANGE_RATES':
+        _provider = None
+
+
+def get_rate(currency):
+    return get_provider().get_rate(currency)
+
+
+def to_rub(amount, currency):
+    return round(amount * get_rate(currency), 2)
+
+
+def from_rub(amount, currency):
+    return round(amount / get_rate(currency), 2)
@@ -1,63 +1,97 @@
-import decimal
-
+from django.db.models import OuterRef, Subquery
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 
+from . import rates
 from .models import Account, Action, Service, Transaction, Transfer, User
 
-USD_RATE = 72.56
-EURO_RATE = 85.46
-RUB_RATE = 1
 
+class TimedDataMixin:
+    """Добавляет время построения data к замерам MetricsMiddleware
+    запроса из контекста."""
 
-class AccountSerializer(serializers.ModelSerializer):
-    actions = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
-    currency = serializers.CharField(default='RUB', read_only=True)
+    @property
+    def data(self):
+        timings = getattr(self.context.get('request'), '_timings', None)
+        if timings is None:
+            return super().data
+        with timings.serializing():
+            return super().data
 
-    class Meta:
-        model = Account
-        fields = ('id', 'balance', 'currency', 'actions')
-        read_only_fields = ('id', 'balance', 'currency', 'actions')
 
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
 
-class AccountUSDSerializer(serializers.ModelSerializer):
-    actions = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
-    currency = serializers.CharField(default='USD', read_only=True)
-    balance = serializers.SerializerMethodField(
-        method_name='currency_conversion'
-    )
 
+class TimedModelSerializer(TimedDataMixin, serializers.ModelSerializer):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        kwargs['child'] = cls()
+        return TimedListSerializer(*args, **kwargs)
+
+
+class ConvertedBalanceField(serializers.DecimalField):
+    def to_representation(self, value):
+        currency = self.context.get('currency', rates.BASE_CURRENCY)
+        return super().to_representation(rates.from_rub(value, currency))
+
+
+class AccountActionSerializer(serializers.ModelSerializer):
     class Meta:
-        model = Account
-        fields = ('id', 'balance', 'currency', 'actions')
-        read_only_fields = ('id', 'balance', 'currency', 'actions')
+        model = Action
+        fields = ('id', 'amount', 'date')
 
-    def currency_conversion(self, obj):
-        request = self.context.get('request')
-        user_account = Account.objects.filter(user=request.user).first()
-        balance = round(user_account.balance / decimal.Decimal(USD_RATE), 2)
-        return balance
 
+class AccountSerializer(TimedModelSerializer):
+    EXPAND_ACTIONS_LIMIT = 20
 
-class AccountEURSerializer(serializers.ModelSerializer):
-    actions = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
-    currency = serializers.CharField(default='EUR', read_only=True)
-    balance = serializers.SerializerMethodField(
-        method_name='currency_conversion'
+    currency = serializers.SerializerMethodField()
+    balance = ConvertedBalanceField(
+        max_digits=12, decimal_places=2, read_only=True
+    )
+    deposits_count = serializers.IntegerField(read_only=True, default=0)
+    last_deposit_date = serializers.DateTimeField(
+        read_only=True, default=None
+    )
+    total_deposited = ConvertedBalanceField(
+        max_digits=14, decimal_places=2, read_only=True, default=0
     )
+    actions = serializers.SerializerMethodField()
 
     class Meta:
         model = Account
-        fields = ('id', 'balance', 'currency', 'actions')
-        read_only_fields = ('id', 'balance', 'currency', 'actions')
+        fields = (
+            'id', 'balance', 'currency', 'deposits_count',
+            'last_deposit_date', 'total_deposited', 'actions'
+        )
 
-    def currency_conversion(self, obj):
-        request = self.context.get('request')
-        user_account = Account.objects.filter(user=request.user).first()
-        balance = round(user_account.balance / decimal.Decimal(EURO_RATE), 2)
-        return balance
+    @classmethod
+    def recent_actions_since(cls):
+        """Дата последнего из EXPAND_ACTIONS_LIMIT пополнений счета."""
+        limit = cls.EXPAND_ACTIONS_LIMIT
+        return Subquery(
+            Action.objects.filter(account_id=OuterRef('pk'))
+            .order_by('-date', '-id').values('date')[limit - 1:limit]
+        )
+
+    def get_currency(self, obj):
+        return self.context.get('currency', rates.BASE_CURRENCY)
+
+    def get_actions(self, obj):
+        if 'actions' not in self.context.get('expand', ()):
+            return reverse(
+                'accounts-actions', kwargs={'account_pk': obj.id},
+                request=self.context['request']
+            )
+        actions = getattr(obj, 'recent_actions', None)
+        if actions is None:
+            actions = obj.actions.order_by('-date', '-id')
+        return AccountActionSerializer(
+            actions[:self.EXPAND_ACTIONS_LIMIT], many=True
+        ).data
 
 
-class ActionSerializer(serializers.ModelSerializer):
+class ActionSerializer(TimedModelSerializer):
     currency = serializers.CharField(default='RUB', read_only=True)
 
     class Meta:
@@ -65,13 +99,8 @@ class ActionSerializer(serializers.ModelSerializer):
         fields = ('id', 'account', 'amount', 'currency', 'date')
         read_only_fields = ('id', 'date', 'currency')
 
-    def create(self, validated_data):
-        validated_data['account'].balance += validated_data['amount']
-        validated_data['account'].save()
-        return super().create(validated_data)
 
-
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedModelSerializer):
     class Meta:
         fields = (
             'first_name', 'last_name', 'username', 'bio', 'email', 'role'
@@ -80,15 +109,15 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_field = ('role',)
 
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(TimedModelSerializer):
     class Meta:
         model = Service
         fields = (
-            'id', 'name', 'description', 'price', 'currency'
+            'id', 'name', 'description', 'price', 'currency', 'external_id'
         )
 
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(TimedModelSerializer):
     currency = serializers.CharField(default='RUB', read_only=True)
 
     class Meta:
@@ -96,7 +125,7 @@ class TransactionSerializer(serializers.ModelSerializer):
         fields = ('id', 'date', 'account', 'service', 'amount', 'currency')
 
 
-class TransferSerializer(serializers.ModelSerializer):
+class TransferSerializer(TimedModelSerializer):
     currency = serializers.CharField(default='RUB', read_only=True)
 
     class Meta:
@@ -105,6 +134,26 @@ class TransferSerializer(serializers.ModelSerializer):
             'id', 'from_account', 'to_account', 'amount', 'currency', 'date'
         )
 
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError(
+                'Сумма перевода должна быть больше нуля!'
+            )
+        return value
+
+
+class TransferBatchItemSerializer(serializers.Serializer):
+    from_account = serializers.IntegerField()
+    to_account = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError(
+                'Сумма перевода должна быть больше нуля!'
+            )
+        return value
+
 
 class EmailSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)
@@ -0,0 +1,33 @@
+from django.apps import apps
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from . import catalog
+from .accounts import forget_account
+from .authentication import user_cache
+from .filters import restore_search_triggers
+from .models import Account, Service, User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def invalidate_cached_account(sender, instance, **kwargs):
+    forget_account(instance.user_id)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_catalog(sender, instance, **kwargs):
+    catalog.invalidate()
+
+
+@receiver(post_migrate, sender=apps.get_app_config('api'))
+def restore_service_search(sender, using, **kwargs):
+    restore_search_triggers(connections[using])
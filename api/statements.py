@@ -0,0 +1,136 @@
+import csv
+import heapq
+import json
+from collections import namedtuple
+
+from django.db import router, transaction
+
+from . import archive
+from .models import Action, Transaction, Transfer
+
+CHUNK_SIZE = 2000
+FIELDS = ('date', 'type', 'id', 'amount', 'counterparty', 'balance')
+
+Movement = namedtuple('Movement', FIELDS)
+
+DEPOSIT = 'deposit'
+PURCHASE = 'purchase'
+TRANSFER_OUT = 'transfer_out'
+TRANSFER_IN = 'transfer_in'
+
+
+def deposits(account_id):
+    rows = Action.objects.filter(account_id=account_id).order_by(
+        'date', 'id'
+    ).values_list('date', 'id', 'amount')
+    for date, pk, amount in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield Movement(date, DEPOSIT, pk, amount, None, None)
+
+
+def purchases(account_id):
+    rows = Transaction.objects.filter(account_id=account_id).order_by(
+        'date', 'id'
+    ).values_list('date', 'id', 'amount', 'service_id')
+    for date, pk, amount, service in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield Movement(date, PURCHASE, pk, -amount, service, None)
+
+
+def transfers_out(account_id):
+    rows = Transfer.objects.filter(from_account_id=account_id).order_by(
+        'date', 'id'
+    ).values_list('date', 'id', 'amount', 'to_account_id')
+    for date, pk, amount, account in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield Movement(date, TRANSFER_OUT, pk, -amount, account, None)
+
+
+def transfers_in(account_id):
+    rows = Transfer.objects.filter(to_account_id=account_id).order_by(
+        'date', 'id'
+    ).values_list('date', 'id', 'amount', 'from_account_id')
+    for date, pk, amount, account in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield Movement(date, TRANSFER_IN, pk, amount, account, None)
+
+
+def archived_movements(account_id):
+    """Движения из архива истории в том же порядке, что и слияние."""
+    movements = [
+        Movement(action.date, DEPOSIT, action.id, action.amount, None, None)
+        for action in archive.archived(Action, account_id=account_id)
+    ]
+    movements.extend(
+        Movement(item.date, PURCHASE, item.id, -item.amount,
+                 item.service_id, None)
+        for item in archive.archived(Transaction, account_id=account_id)
+    )
+    movements.extend(
+        Movement(item.date, TRANSFER_OUT, item.id, -item.amount,
+                 item.to_account_id, None)
+        for item in archive.archived(Transfer, from_account_id=account_id)
+    )
+    movements.extend(
+        Movement(item.date, TRANSFER_IN, item.id, item.amount,
+                 item.from_account_id, None)
+        for item in archive.archived(Transfer, to_account_id=account_id)
+    )
+    movements.sort(key=movement_key)
+    return iter(movements)
+
+
+def movement_key(movement):
+    return (movement.date, movement.type, movement.id)
+
+
+SOURCES = (
+    archived_movements, deposits, purchases, transfers_out, transfers_in
+)
+
+
+def iter_movements(account_id):
+    """Все движения средств по счету в порядке дат с текущим остатком.
+
+    Таблицы читаются серверными курсорами порциями по CHUNK_SIZE и
+    сливаются лениво, поэтому потребление памяти не зависит от длины
+    истории в базе; архивные движения счета читаются в память целиком.
+    Транзакция открывается на базе, с которой читаются движения (в
+    выписке это реплика), чтобы PostgreSQL не материализовал курсоры
+    WITH HOLD.
+    """
+    with transaction.atomic(using=router.db_for_read(Action)):
+        merged = heapq.merge(
+            *(source(account_id) for source in SOURCES), key=movement_key
+        )
+        balance = 0
+        for movement in merged:
+            balance += movement.amount
+            yield movement._replace(balance=balance)
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def render_csv(movements):
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS)
+    for movement in movements:
+        yield writer.writerow(
+            [movement.date.isoformat()] + list(movement[1:])
+        )
+
+
+def render_jsonl(movements):
+    for movement in movements:
+        row = movement._asdict()
+        row.update(
+            date=movement.date.isoformat(),
+            amount=str(movement.amount),
+            balance=str(movement.balance),
+        )
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+RENDERERS = {
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'jsonl': ('application/x-ndjson; charset=utf-8', render_jsonl),
+}
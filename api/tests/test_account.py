@@ -1,8 +1,16 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
 from rest_framework import status
 from rest_framework.test import (APIClient, APIRequestFactory, APITestCase,
                                  force_authenticate)
 
-from ..models import Account, User
+from .. import operations
+from ..accounts import cache_key
+from ..models import Account, Action, Service, User
+from ..serializers import AccountSerializer
 from ..views import AccountViewSet
 
 
@@ -21,7 +29,10 @@ class AccountTests(APITestCase):
         view = AccountViewSet.as_view({'post': 'create'})
         response = view(request)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(str(Account.objects.first()), '1 - testuser - 0.00')
+        self.assertEqual(
+            str(Account.objects.first()),
+            f'{response.data["id"]} - testuser - 0.00'
+        )
         self.assertEqual(Account.objects.count(), 1)
 
     def test_get_account(self):
@@ -31,3 +42,135 @@ class AccountTests(APITestCase):
         response = client.get('/api/v1/accounts/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.json()['count'], 1)
+
+    @override_settings(EXCHANGE_RATES={
+        'SOURCE': 'api.rates.StaticRateSource',
+        'OPTIONS': {'rates': {'USD': '72.56', 'EUR': '85.46'}},
+    })
+    def test_list_accounts_in_currency(self):
+        Account.objects.bulk_create(
+            Account(user=AccountTests.user, balance=balance)
+            for balance in (7256, 14512, 21768)
+        )
+        client = APIClient()
+        client.force_authenticate(user=AccountTests.user)
+        for currency, balances in (
+            ('USD', ['100.00', '200.00', '300.00']),
+            ('EUR', ['84.91', '169.81', '254.72']),
+            ('RUB', ['7256.00', '14512.00', '21768.00']),
+        ):
+            with self.assertNumQueries(2):
+                response = client.get(
+                    '/api/v1/accounts/', {'currency': currency}
+                )
+            results = sorted(
+                response.json()['results'], key=lambda account: account['id']
+            )
+            self.assertEqual(
+                [account['balance'] for account in results], balances
+            )
+            self.assertEqual(
+                {account['currency'] for account in results}, {currency}
+            )
+
+    def test_statement_export(self):
+        other = User.objects.create_user(
+            username='other', password='123', email='other@yandex.ru'
+        )
+        account = Account.objects.create(user=AccountTests.user, balance=100)
+        other_account = Account.objects.create(user=other, balance=5)
+        service = Service.objects.create(
+            name='test', description='test', price=30
+        )
+        Action.objects.create(account=account, amount=100)
+        operations.purchase(account.id, service.id, service.price)
+        operations.transfer(account.id, other_account.id, 20)
+        operations.transfer(other_account.id, account.id, 5)
+
+        client = APIClient()
+        client.force_authenticate(user=AccountTests.user)
+        response = client.get(f'/api/v1/accounts/{account.id}/statement.jsonl')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [(row['type'], row['amount'], row['balance']) for row in rows],
+            [('deposit', '100.00', '100.00'),
+             ('purchase', '-30.00', '70.00'),
+             ('transfer_out', '-20.00', '50.00'),
+             ('transfer_in', '5.00', '55.00')]
+        )
+        self.assertEqual(Account.objects.get(id=account.id).balance, 55)
+
+        response = client.get(f'/api/v1/accounts/{account.id}/statement.csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            lines[0], 'date,type,id,amount,counterparty,balance'
+        )
+        self.assertEqual(len(lines), 5)
+
+        client.force_authenticate(user=other)
+        response = client.get(f'/api/v1/accounts/{account.id}/statement.csv')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_accounts_deposit_summary(self):
+        account = Account.objects.create(user=AccountTests.user, balance=300)
+        Action.objects.bulk_create(
+            Action(account=account, amount=amount) for amount in (100, 200)
+        )
+        client = APIClient()
+        client.force_authenticate(user=AccountTests.user)
+        result = client.get('/api/v1/accounts/').json()['results'][0]
+        self.assertEqual(result['deposits_count'], 2)
+        self.assertEqual(result['total_deposited'], '300.00')
+        self.assertIsNotNone(result['last_deposit_date'])
+        self.assertTrue(result['actions'].endswith(
+            f'/api/v1/accounts/{account.id}/actions/'
+        ))
+        response = client.get(result['actions'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], 2)
+
+        second = Account.objects.create(user=AccountTests.user)
+        Action.objects.create(account=second, amount=50)
+        with mock.patch.object(AccountSerializer, 'EXPAND_ACTIONS_LIMIT', 1):
+            with self.assertNumQueries(3):
+                results = client.get(
+                    '/api/v1/accounts/', {'expand': 'actions'}
+                ).json()['results']
+        self.assertEqual(
+            [[item['amount'] for item in result['actions']]
+             for result in results],
+            [['200.00'], ['50.00']]
+        )
+
+        other = User.objects.create_user(
+            username='other', password='123', email='other@yandex.ru'
+        )
+        client.force_authenticate(user=other)
+        response = client.get(f'/api/v1/accounts/{account.id}/actions/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_account_id_is_cached_between_requests(self):
+        client = APIClient()
+        client.force_authenticate(user=AccountTests.user)
+        self.assertEqual(
+            client.get('/api/v1/actions/').status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+        account_id = client.post('/api/v1/accounts/').json()['id']
+        key = cache_key(AccountTests.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.get('/api/v1/actions/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(cache.get(key), account_id)
+
+        with self.assertNumQueries(1):
+            response = client.get('/api/v1/transfers/to_my_account/')
+        self.assertEqual(response.json()['count'], 0)
+
+        Account.objects.get(id=account_id).delete()
+        self.assertIsNone(cache.get(key))
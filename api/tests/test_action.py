@@ -1,3 +1,7 @@
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import (APIClient, APIRequestFactory, APITestCase,
                                  force_authenticate)
@@ -22,7 +26,7 @@ class ActionTests(APITestCase):
         request = factory.post(
             '/api/v1/actions/',
             {'amount': '1000',
-             'account': '3'}
+             'account': ActionTests.account.id}
         )
         force_authenticate(request, user=ActionTests.user)
         view = ActionViewSet.as_view({'post': 'create'})
@@ -30,21 +34,84 @@ class ActionTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(
             str(Action.objects.first()),
-            'Счет номер 3 был пополнен на 1000.00 руб.'
+            f'Счет номер {ActionTests.account.id} был пополнен на 1000.00 руб.'
         )
         self.assertEqual(Action.objects.count(), 1)
         self.assertEqual(
             Account.objects.get(user=ActionTests.user).balance, 1000
         )
 
+    def test_deposit_validation(self):
+        other = User.objects.create_user(
+            username='other', password='123', email='other@yandex.ru'
+        )
+        foreign = Account.objects.create(user=other)
+        client = APIClient()
+        client.force_authenticate(user=ActionTests.user)
+        response = client.post(
+            '/api/v1/actions/',
+            {'amount': '-10', 'account': ActionTests.account.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('amount', response.json())
+        response = client.post(
+            '/api/v1/actions/', {'amount': '10', 'account': foreign.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Action.objects.exists())
+        self.assertEqual(Account.objects.get(id=foreign.id).balance, 0)
+
+    def test_deposit_to_deleted_account(self):
+        client = APIClient()
+        client.force_authenticate(user=ActionTests.user)
+        with mock.patch('api.operations.credit', return_value=0):
+            response = client.post(
+                '/api/v1/actions/',
+                {'amount': '10', 'account': ActionTests.account.id}
+            )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Action.objects.exists())
+
     def test_get_account(self):
         client = APIClient()
         client.force_authenticate(user=ActionTests.user)
         client.post(
             '/api/v1/actions/',
             {'amount': '1000',
-             'account': '3'}
+             'account': ActionTests.account.id}
         )
         response = client.get('/api/v1/actions/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.json()['count'], 1)
+
+    def test_keyset_pagination(self):
+        Action.objects.bulk_create(
+            Action(account=ActionTests.account, amount=amount % 7)
+            for amount in range(25)
+        )
+        client = APIClient()
+        client.force_authenticate(user=ActionTests.user)
+        for ordering, key in (
+            ('date', lambda action: (action.date, action.id)),
+            ('-amount', lambda action: (-action.amount, -action.id)),
+        ):
+            expected = [
+                action.id for action in sorted(Action.objects.all(), key=key)
+            ]
+            url = f'/api/v1/actions/?pagination=cursor&ordering={ordering}'
+            pages = []
+            while url:
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                self.assertFalse(
+                    any('COUNT(' in query['sql'] for query in queries)
+                )
+                pages.append(response.json())
+                url = pages[-1]['next']
+            self.assertEqual(len(pages), 3)
+            self.assertEqual(
+                [item['id'] for page in pages for item in page['results']],
+                expected
+            )
+            previous = client.get(pages[-1]['previous']).json()
+            self.assertEqual(previous['results'], pages[1]['results'])
@@ -0,0 +1,103 @@
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..models import Account, Action, Service, Transaction, Transfer, User
+from ..pagination import EstimatedCountPaginator
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='root', email='root@yandex.ru', password='123'
+        )
+        cls.service = Service.objects.create(
+            name='Услуга', description='Описание', price=10
+        )
+
+    def setUp(self):
+        self.client.force_login(AdminChangelistTests.admin)
+
+    def create_rows(self, count):
+        accounts = []
+        first = Account.objects.count()
+        for i in range(count):
+            user = User.objects.create(
+                username=f'user{first + i}',
+                email=f'user{first + i}@yandex.ru'
+            )
+            accounts.append(Account.objects.create(
+                user=user, balance=Decimal(10 ** (i % 7))
+            ))
+            Action.objects.create(account=accounts[-1], amount=100)
+        for account, other in zip(accounts, accounts[1:]):
+            Transfer.objects.create(
+                from_account=account, to_account=other, amount=5
+            )
+            Transaction.objects.create(
+                account=account, service=self.service, amount=10
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow(self):
+        urls = (
+            '/admin/api/account/', '/admin/api/transfer/',
+            '/admin/api/transaction/', '/admin/api/action/',
+        )
+        self.create_rows(3)
+        before = [self.count_queries(url) for url in urls]
+        self.create_rows(10)
+        self.assertEqual([self.count_queries(url) for url in urls], before)
+
+    def test_balance_range_filter(self):
+        self.create_rows(7)
+        response = self.client.get(
+            '/admin/api/account/',
+            {'balance__gte': '1000', 'balance__lt': '10000'}
+        )
+        accounts = response.context['cl'].result_list
+        self.assertEqual(
+            [account.balance for account in accounts], [Decimal(1000)]
+        )
+        self.assertNotContains(response, 'user__id__exact')
+
+    def test_search_by_id(self):
+        self.create_rows(3)
+        account = Account.objects.last()
+        response = self.client.get(
+            '/admin/api/account/', {'q': str(account.id)}
+        )
+        self.assertIn(account, response.context['cl'].result_list)
+        response = self.client.get(
+            '/admin/api/account/', {'q': account.user.username}
+        )
+        self.assertEqual(list(response.context['cl'].result_list), [account])
+
+    def test_estimated_count(self):
+        self.create_rows(3)
+        queryset = Account.objects.order_by('id')
+        self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 3)
+        self.assertEqual(
+            EstimatedCountPaginator(queryset.none(), 2).count, 0
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'нужен EXPLAIN PostgreSQL')
+    def test_estimate_replaces_count_on_large_tables(self):
+        self.create_rows(3)
+        paginator = EstimatedCountPaginator(Account.objects.order_by('id'), 2)
+        paginator.exact_count_limit = 0
+        with CaptureQueriesContext(connection) as queries:
+            count = paginator.count
+        self.assertGreater(count, 0)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0]['sql'].startswith('EXPLAIN'))
@@ -0,0 +1,255 @@
+import io
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from .. import archive, operations
+from ..archive import MonthWriter, archived, cutoff_for, read_month
+from ..db import partitions
+from ..models import Account, Action, Service, Transaction, Transfer, User
+
+
+class HistoryArchiveTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='testuser', password='123', email='testuser@yandex.ru'
+        )
+        cls.account = Account.objects.create(user=cls.user)
+        other = User.objects.create_user(
+            username='other', password='123', email='other@yandex.ru'
+        )
+        cls.other = Account.objects.create(user=other, balance=100)
+        cls.services = [
+            Service.objects.create(
+                name=f'Услуга {i}', description='Описание', price=10 + i
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        archive_settings = override_settings(
+            HISTORY_ARCHIVE_DIR=directory.name
+        )
+        archive_settings.enable()
+        self.addCleanup(archive_settings.disable)
+        self.directory = directory.name
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        now = timezone.now()
+        account, other = self.account.id, self.other.id
+        history = [operations.deposit(account, 100 + i) for i in range(14)]
+        history += [
+            operations.purchase(account, service.id, service.price)
+            for service in self.services
+        ]
+        history += [operations.transfer(account, other, 7 + i)
+                    for i in range(3)]
+        history += [operations.transfer(other, account, 3 + i)
+                    for i in range(3)]
+        for index, item in enumerate(history):
+            days = 300 + index if index % 2 else index
+            type(item).objects.filter(id=item.id).update(
+                date=now - timedelta(days=days, minutes=index)
+            )
+
+    def archive(self, **options):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                'archive_history', retention_months=6, stdout=io.StringIO(),
+                **options
+            )
+
+    def get_all(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def keyset_ids(self, url):
+        ids = []
+        while url:
+            page = self.get_all(url)
+            ids += [item['id'] for item in page['results']]
+            url = page['next']
+        return ids
+
+    def snapshot(self):
+        statement = self.client.get(
+            f'/api/v1/accounts/{self.account.id}/statement.jsonl'
+        )
+        return {
+            'statement': b''.join(statement.streaming_content),
+            'lists': [
+                self.get_all(url) for url in (
+                    '/api/v1/actions/',
+                    '/api/v1/actions/?page=2',
+                    '/api/v1/actions/?ordering=-amount',
+                    '/api/v1/actions/?ordering=-amount&page=2',
+                    '/api/v1/transactions/',
+                    '/api/v1/transfers/',
+                    '/api/v1/transfers/to_my_account/',
+                )
+            ],
+            'keyset': [
+                self.keyset_ids(url) for url in (
+                    '/api/v1/actions/?pagination=cursor',
+                    '/api/v1/actions/?pagination=cursor&ordering=-date',
+                    '/api/v1/actions/?pagination=cursor&ordering=amount',
+                )
+            ],
+        }
+
+    def test_archived_history_is_still_readable(self):
+        before = self.snapshot()
+        self.archive()
+        cutoff = cutoff_for(6)
+        for model in (Action, Transaction, Transfer):
+            self.assertFalse(model.objects.filter(date__lt=cutoff).exists())
+        self.assertTrue(Action.objects.exists())
+        self.assertTrue(
+            os.listdir(os.path.join(self.directory, 'api_action'))
+        )
+        self.assertTrue(archived(Action, account_id=self.account.id))
+        self.assertEqual(self.snapshot(), before)
+
+    def test_archive_is_idempotent(self):
+        self.archive()
+        archived_before = {
+            item.id for item in archived(Action, account_id=self.account.id)
+        }
+        Action.objects.filter(account=self.account).update(
+            date=timezone.now() - timedelta(days=400)
+        )
+        self.archive()
+        self.assertFalse(Action.objects.exists())
+        ids = [
+            item.id for item in archived(Action, account_id=self.account.id)
+        ]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(len(ids), 14)
+        self.assertTrue(archived_before < set(ids))
+
+    def test_recent_pages_do_not_read_archive(self):
+        for amount in range(10):
+            operations.deposit(self.account.id, 1 + amount)
+        self.archive()
+        stored = Action.objects.filter(account=self.account).count()
+        blocks = []
+        read_block = archive.read_block
+
+        def record(*args):
+            blocks.append(read_block(*args))
+            return blocks[-1]
+
+        with mock.patch.object(archive, 'read_block', record):
+            page = self.get_all('/api/v1/actions/?ordering=-date')
+            self.assertEqual(page['count'], stored + 7)
+            self.get_all('/api/v1/actions/?pagination=cursor&ordering=-date')
+            self.assertEqual(blocks, [])
+            page = self.get_all('/api/v1/actions/?ordering=-date&page=2')
+            self.assertEqual(len(page['results']), 10)
+            self.assertEqual(len(blocks), 1)
+            transfers = archive.AccountArchive(
+                Transfer, to_account_id=self.account.id
+            ).objects
+        self.assertEqual(len(transfers), 1)
+        for rows in blocks:
+            for row in rows:
+                self.assertIn(self.account.id, (
+                    row.get('account_id'), row.get('from_account_id'),
+                    row.get('to_account_id')
+                ))
+
+    def test_account_totals_include_archive(self):
+        fields = ('deposits_count', 'total_deposited', 'last_deposit_date')
+        before = self.get_all('/api/v1/accounts/')['results']
+        self.archive()
+        after = self.get_all('/api/v1/accounts/')['results']
+        self.assertEqual(
+            [{key: item[key] for key in fields} for item in after],
+            [{key: item[key] for key in fields} for item in before]
+        )
+        self.assertEqual(after[0]['deposits_count'], 14)
+        Action.objects.all().delete()
+        account = self.get_all('/api/v1/accounts/')['results'][0]
+        self.assertEqual(account['deposits_count'], 7)
+        self.assertIsNotNone(account['last_deposit_date'])
+
+    def test_interrupted_publish_is_recovered(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            call_command(
+                'archive_history', retention_months=6, stdout=io.StringIO()
+            )
+        self.assertTrue(callbacks)
+        self.assertFalse(archived(Action, account_id=self.account.id))
+        self.archive()
+        ids = [
+            item.id for item in archived(Action, account_id=self.account.id)
+        ]
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(len(set(ids)), 7)
+
+    def test_month_writer_drops_repeated_ids(self):
+        directory = os.path.join(self.directory, 'api_action', '2020-01')
+        writer = MonthWriter(Action, directory)
+        row = {'id': 1, 'account_id': 5, 'amount': '1.00',
+               'date': '2020-01-01T00:00:00+00:00'}
+        writer.write(row)
+        writer.write(dict(row, amount='2.00'))
+        writer.finish()
+        writer.publish()
+        self.assertEqual(
+            [item['amount'] for item in read_month(Action, directory)],
+            ['2.00']
+        )
+
+    def test_archived_purchase_cannot_be_repeated(self):
+        self.archive()
+        service = self.services[1]
+        self.assertFalse(
+            Transaction.objects.filter(service=service).exists()
+        )
+        with self.assertRaises(operations.AlreadyPurchased):
+            operations.purchase(self.account.id, service.id, service.price)
+        balance = Account.objects.get(id=self.account.id).balance
+        response = self.client.get(f'/api/v1/services/{service.id}/purchase/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json()['status'],
+            f'У вас уже приобретена услуга {service.name}'
+        )
+        self.assertEqual(
+            Account.objects.get(id=self.account.id).balance, balance
+        )
+        self.assertFalse(
+            Transaction.objects.filter(service=service).exists()
+        )
+
+    def test_partitions(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Секционирование только на PostgreSQL')
+        self.archive(months_ahead=2)
+        current = partitions.month_start(timezone.now())
+        cutoff = cutoff_for(6)
+        with connection.cursor() as cursor:
+            for table in ('api_action', 'api_transaction', 'api_transfer'):
+                months = partitions.monthly_partitions(cursor, table)
+                self.assertTrue(all(month >= cutoff for month in months))
+                for count in range(3):
+                    self.assertIn(
+                        partitions.add_months(current, count), months
+                    )
+                default = partitions.default_partition(table)
+                cursor.execute(f'SELECT count(*) FROM {default}')
+                self.assertEqual(cursor.fetchone()[0], 0)
@@ -0,0 +1,107 @@
+from django.contrib.auth.tokens import default_token_generator
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ..authentication import user_cache
+from ..models import Account, Action, User
+
+
+class ClaimsAuthenticationTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='testuser', password='123', email='testuser@yandex.ru'
+        )
+        cls.account = Account.objects.create(user=cls.user, balance=100)
+
+    def setUp(self):
+        user_cache.clear()
+
+    def get_client(self):
+        response = self.client.post('/api/v1/auth/token/', {
+            'email': 'testuser@yandex.ru',
+            'confirmation_code': default_token_generator.make_token(
+                ClaimsAuthenticationTests.user
+            ),
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        token = response.json()['token']
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client, AccessToken(token)
+
+    def test_token_carries_claims(self):
+        _, token = self.get_client()
+        self.assertEqual(token['role'], User.USER)
+        self.assertFalse(token['is_staff'])
+        self.assertNotIn('account_id', token)
+
+    def test_user_is_loaded_once_per_ttl(self):
+        client, _ = self.get_client()
+        client.get('/api/v1/accounts/')
+        with self.assertNumQueries(2):
+            response = client.get('/api/v1/accounts/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json()['results'][0]['id'],
+            ClaimsAuthenticationTests.account.id
+        )
+
+    def test_role_change_revokes_token(self):
+        client, _ = self.get_client()
+        self.assertEqual(
+            client.get('/api/v1/users/').status_code,
+            status.HTTP_403_FORBIDDEN
+        )
+        user = User.objects.get(pk=ClaimsAuthenticationTests.user.id)
+        user.role = User.ADMIN
+        user.save()
+        self.assertEqual(
+            client.get('/api/v1/accounts/').status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+
+        admin_client, _ = self.get_client()
+        self.assertEqual(
+            admin_client.get('/api/v1/users/').status_code,
+            status.HTTP_200_OK
+        )
+
+    def test_inactive_user_is_rejected(self):
+        client, _ = self.get_client()
+        User.objects.filter(pk=ClaimsAuthenticationTests.user.id).update(
+            is_active=False
+        )
+        user_cache.clear()
+        self.assertEqual(
+            client.get('/api/v1/accounts/').status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_token_without_claims_is_accepted(self):
+        token = AccessToken.for_user(ClaimsAuthenticationTests.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = client.get('/api/v1/users/me/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['email'], 'testuser@yandex.ru')
+
+    def test_account_claim_of_old_tokens_is_ignored(self):
+        token = AccessToken.for_user(ClaimsAuthenticationTests.user)
+        token['role'] = User.USER
+        token['is_staff'] = False
+        token['account_id'] = ClaimsAuthenticationTests.account.id + 1000
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        Action.objects.create(
+            account=ClaimsAuthenticationTests.account, amount=10
+        )
+        response = client.get('/api/v1/actions/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], 1)
+
+        Account.objects.filter(user=ClaimsAuthenticationTests.user).delete()
+        response = client.get('/api/v1/actions/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,111 @@
+import io
+import json
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..management.fixtures import InvalidFixture, iter_array, load_fixture
+from ..models import Account, Action, Service, Transaction, Transfer, User
+
+FIXTURE = os.path.join(settings.BASE_DIR, 'fixtures.json')
+
+
+class FixtureLoaderTests(TestCase):
+    def test_iter_array_reads_in_small_chunks(self):
+        with open(FIXTURE, encoding='utf-8') as file:
+            expected = json.load(file)
+        with open(FIXTURE, encoding='utf-8') as file:
+            self.assertEqual(list(iter_array(file, read_size=7)), expected)
+        for broken in ('{}', '[{"a": 1},]', '[{"a": 1}', '[{"a": 1}] []'):
+            with self.assertRaises(InvalidFixture):
+                list(iter_array(io.StringIO(broken), read_size=3))
+
+    def test_load_fixtures(self):
+        call_command('load_fixtures', FIXTURE, stdout=io.StringIO())
+        with open(FIXTURE, encoding='utf-8') as file:
+            objects = json.load(file)
+        for model in (User, Account, Service, Action, Transaction, Transfer):
+            rows = [
+                item for item in objects
+                if item['model'] == model._meta.label_lower
+            ]
+            self.assertEqual(model.objects.count(), len(rows))
+        transfer = next(
+            item for item in objects if item['model'] == 'api.transfer'
+        )
+        self.assertEqual(
+            Transfer.objects.get(pk=transfer['pk']).date.isoformat()[:19],
+            transfer['fields']['date'][:19]
+        )
+        user = User.objects.create(username='new', email='new@yandex.ru')
+        self.assertGreater(user.pk, max(
+            item['pk'] for item in objects if item['model'] == 'api.user'
+        ))
+
+    def test_many_to_many_is_written_in_bulk(self):
+        permissions = list(Permission.objects.values_list('pk', flat=True))
+
+        def fixture(granted):
+            return io.StringIO(json.dumps([
+                {'model': 'api.user', 'pk': pk, 'fields': {
+                    'username': f'user{pk}', 'email': f'user{pk}@yandex.ru',
+                    'password': '', 'user_permissions': (
+                        granted if pk == 1 else []
+                    ),
+                }} for pk in range(1, 51)
+            ]))
+
+        through = User.user_permissions.through
+        with CaptureQueriesContext(connection) as queries:
+            load_fixture(fixture(permissions[:2]), 'default')
+        self.assertEqual(len([
+            query for query in queries
+            if through._meta.db_table in query['sql']
+        ]), 1)
+        self.assertCountEqual(
+            User.objects.get(pk=1).user_permissions.values_list(
+                'pk', flat=True
+            ), permissions[:2]
+        )
+        load_fixture(fixture(permissions[2:3]), 'default')
+        self.assertEqual(
+            list(through.objects.values_list('user_id', 'permission_id')),
+            [(1, permissions[2])]
+        )
+
+
+class SyntheticDataTests(TestCase):
+    def test_balances_match_history(self):
+        call_command(
+            'generate_data', users=30, services=5, chunk_size=12,
+            seed=1, stdout=io.StringIO()
+        )
+        accounts = Account.objects.filter(
+            user__username__startswith='synthetic-'
+        )
+        self.assertEqual(accounts.count(), 30)
+        self.assertTrue(Transfer.objects.exists())
+
+        def totals(model, field):
+            return dict(
+                model.objects.order_by().values(field)
+                .annotate(total=Sum('amount')).values_list(field, 'total')
+            )
+
+        deposits = totals(Action, 'account_id')
+        purchases = totals(Transaction, 'account_id')
+        sent = totals(Transfer, 'from_account_id')
+        received = totals(Transfer, 'to_account_id')
+        for account in accounts:
+            self.assertEqual(
+                account.balance,
+                deposits.get(account.id, 0) + received.get(account.id, 0)
+                - purchases.get(account.id, 0) - sent.get(account.id, 0)
+            )
+            self.assertGreaterEqual(account.balance, 0)
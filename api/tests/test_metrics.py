@@ -0,0 +1,100 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from ..metrics import Registry, merge, render
+from ..models import Service, User
+
+
+class MetricsTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='testuser', password='123'
+        )
+        Service.objects.create(name='test', description='test', price=100)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_header(self):
+        client = APIClient()
+        client.force_authenticate(user=MetricsTests.user)
+        response = client.get('/api/v1/services/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = response['Server-Timing']
+        for phase in ('db;dur=', 'view;dur=', 'serialize;dur=',
+                      'render;dur=', 'total;dur='):
+            self.assertIn(phase, timing)
+        self.assertIn('desc="2 SQL"', timing)
+
+        metrics = client.get('/metrics').content.decode()
+        self.assertIn(
+            'api_requests_total{route="services-list",method="GET",'
+            'status="200"}',
+            metrics
+        )
+        self.assertIn(
+            'api_db_queries_bucket{route="services-list",method="GET",'
+            'le="2"}',
+            metrics
+        )
+
+    def test_worker_snapshots_are_merged(self):
+        worker = Registry()
+        worker.observe('services-list', 'GET', 200, {'api_db_queries': 3})
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'metrics-1.json'), 'w') as file:
+                json.dump(worker.snapshot(), file)
+            with override_settings(METRICS_DIR=directory):
+                current = Registry()
+                current.observe(
+                    'services-list', 'GET', 200, {'api_db_queries': 1}
+                )
+                data = current.collect()
+        self.assertEqual(
+            data['requests']['api_requests_total|services-list|GET|200'], 2
+        )
+        text = render(merge([data]))
+        self.assertIn(
+            'api_db_queries_count{route="services-list",method="GET"} 2',
+            text
+        )
+        self.assertIn(
+            'api_db_queries_sum{route="services-list",method="GET"} 4', text
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_are_not_public(self):
+        client = APIClient(REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(
+            client.get('/metrics').status_code, status.HTTP_404_NOT_FOUND
+        )
+        response = client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_dead_worker_snapshots_are_retired(self):
+        worker = Registry()
+        worker.observe('services-list', 'GET', 200, {'api_db_queries': 3})
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        with tempfile.TemporaryDirectory() as directory:
+            dead = os.path.join(directory, f'metrics-{process.pid}.json')
+            with open(dead, 'w') as file:
+                json.dump(worker.snapshot(), file)
+            with override_settings(METRICS_DIR=directory):
+                current = Registry()
+                first = current.collect()
+                second = current.collect()
+            self.assertFalse(os.path.exists(dead))
+        key = 'api_requests_total|services-list|GET|200'
+        self.assertEqual(first['requests'][key], 1)
+        self.assertEqual(second['requests'][key], 1)
@@ -0,0 +1,109 @@
+import threading
+from unittest import TestCase, mock
+
+from django.db import connection
+from django.db.utils import ConnectionHandler, load_backend
+from django.test import TransactionTestCase, skipUnlessDBFeature
+
+from ..checks import check_database_backends
+from ..db.pool import ConnectionPool, PoolTimeout
+from ..metrics import render
+
+
+class FakeConnection:
+    closed = 0
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(TestCase):
+    def test_connections_are_reused(self):
+        pool = ConnectionPool(max_size=2, timeout=1)
+        first = pool.acquire(FakeConnection)
+        pool.release(first)
+        self.assertIs(pool.acquire(FakeConnection), first)
+        stats = pool.snapshot()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['acquired'], 2)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_waits_for_released_connection(self):
+        pool = ConnectionPool(max_size=1, timeout=5)
+        first = pool.acquire(FakeConnection)
+        timer = threading.Timer(0.05, pool.release, (first,))
+        timer.start()
+        self.assertIs(pool.acquire(FakeConnection), first)
+        timer.join()
+        self.assertEqual(pool.snapshot()['waits'], 1)
+
+    def test_timeout_when_exhausted(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        pool.acquire(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+        self.assertEqual(pool.snapshot()['timeouts'], 1)
+
+    def test_unusable_connection_is_replaced(self):
+        pool = ConnectionPool(
+            max_size=1, timeout=1,
+            check=lambda connection: not getattr(connection, 'broken', False)
+        )
+        first = pool.acquire(FakeConnection)
+        first.broken = True
+        pool.release(first)
+        second = pool.acquire(FakeConnection)
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        stats = pool.snapshot()
+        self.assertEqual(stats['closed'], 1)
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['acquired'], 2)
+        self.assertEqual(stats['created'], 2)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class PooledBackendTests(TransactionTestCase):
+    def test_closed_connection_returns_to_pool(self):
+        settings_dict = dict(
+            connection.settings_dict,
+            ENGINE='api.db.postgresql',
+            CONN_MAX_AGE=0,
+            POOL={'MAX_SIZE': 1, 'TIMEOUT': 1},
+        )
+        backend = load_backend('api.db.postgresql')
+        wrapper = backend.DatabaseWrapper(settings_dict, 'pool-test')
+        try:
+            for _ in range(3):
+                with wrapper.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                wrapper.close_if_unusable_or_obsolete()
+            stats = wrapper.pool.snapshot()
+            self.assertEqual(stats['created'], 1)
+            self.assertEqual(stats['acquired'], 3)
+            self.assertEqual(stats['idle'], 1)
+            self.assertIn(
+                'api_db_pool_acquired_total{database="pool-test"} 3',
+                render({'histograms': {}, 'requests': {}, 'gauges': (
+                    backend.collect_pool_metrics()
+                )})
+            )
+        finally:
+            wrapper.close()
+            backend.close_pools('pool-test')
+
+
+class DatabaseBackendCheckTests(TestCase):
+    def check(self, engine):
+        handler = ConnectionHandler({'default': {
+            'ENGINE': engine, 'NAME': 'check', 'CONN_HEALTH_CHECKS': True,
+        }})
+        with mock.patch('api.checks.connections', handler):
+            return check_database_backends(None)
+
+    def test_stock_backend_ignores_health_checks(self):
+        errors = self.check('django.db.backends.postgresql')
+        self.assertEqual([error.id for error in errors], ['api.W001'])
+
+    def test_project_backend_supports_health_checks(self):
+        self.assertEqual(self.check('api.db.postgresql'), [])
@@ -0,0 +1,48 @@
+import json
+import tempfile
+from decimal import Decimal
+
+from django.test import SimpleTestCase, override_settings
+
+from .. import rates
+
+
+class FailingRateSource(rates.RateSource):
+    def fetch(self):
+        raise OSError('source is down')
+
+
+class RateProviderTests(SimpleTestCase):
+    def test_json_file_source(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as file:
+            json.dump({'USD': '72.56', 'EUR': 85.46}, file)
+            file.flush()
+            with override_settings(EXCHANGE_RATES={
+                'SOURCE': 'api.rates.JSONFileRateSource',
+                'OPTIONS': {'path': file.name},
+            }):
+                self.assertEqual(rates.get_rate('USD'), Decimal('72.56'))
+                self.assertEqual(rates.get_rate('EUR'), Decimal('85.46'))
+                self.assertEqual(rates.get_rate('RUB'), 1)
+                self.assertEqual(
+                    rates.to_rub(Decimal(100), 'USD'), Decimal('7256.00')
+                )
+
+    def test_failed_refresh_keeps_previous_rates(self):
+        provider = rates.RateProvider(
+            rates.StaticRateSource({'USD': '70'}), ttl=0
+        )
+        self.assertEqual(provider.get_rate('USD'), 70)
+        provider.source = FailingRateSource()
+        with self.assertLogs('api.rates', 'ERROR'):
+            provider.refresh()
+        self.assertEqual(provider.get_rate('USD'), 70)
+
+    def test_expired_rates_are_refreshed_in_background(self):
+        source = rates.StaticRateSource({'USD': '70'})
+        provider = rates.RateProvider(source, ttl=0)
+        table = provider.get_rates()
+        source.rates = {'USD': '75'}
+        self.assertIs(provider.get_rates(), table)
+        with provider._lock:
+            self.assertEqual(provider.get_rate('USD'), 75)
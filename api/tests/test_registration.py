@@ -1,8 +1,67 @@
+import asyncio
+import json
+import threading
+import time
+from unittest import mock
+
 from django.contrib.auth.tokens import default_token_generator
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import DatabaseError, connection, transaction
+from django.test import (AsyncRequestFactory, TransactionTestCase,
+                         override_settings, skipUnlessDBFeature)
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APIClient, APITestCase
+
+from .. import async_views
+from ..models import OutgoingEmail, User
+from ..outbox import deliver_pending, enqueue
+from ..throttling import ConfirmationIPThrottle, TokenBucketThrottle
+
+
+class FailingBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('relay unavailable')
+
+
+class SlowCache:
+    """Кэш с задержкой чтения, как у сетевого кэша под нагрузкой."""
+
+    def __init__(self, cache):
+        self.cache = cache
 
-from ..models import User
+    def get(self, *args, **kwargs):
+        value = self.cache.get(*args, **kwargs)
+        time.sleep(0.01)
+        return value
+
+    def __getattr__(self, name):
+        return getattr(self.cache, name)
+
+
+class LockProbeBackend(BaseEmailBackend):
+    """Проверяет из другого соединения, что строки очереди не
+    заблокированы во время отправки."""
+
+    locked = []
+
+    def send_messages(self, email_messages):
+        def probe():
+            try:
+                with transaction.atomic():
+                    list(OutgoingEmail.objects.select_for_update(nowait=True))
+                self.locked.append(False)
+            except DatabaseError:
+                self.locked.append(True)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=probe)
+        thread.start()
+        thread.join()
+        return len(email_messages)
 
 
 class RegistrationTest(APITestCase):
@@ -14,6 +73,9 @@ class RegistrationTest(APITestCase):
             email='testuser1@yandex.ru'
         )
 
+    def setUp(self):
+        cache.clear()
+
     def test_auth_email(self):
         response = self.client.post(
             '/api/v1/auth/email/',
@@ -23,6 +85,33 @@ class RegistrationTest(APITestCase):
             response.json()['result'], 'Код подтверждения успешно отправлен!'
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(deliver_pending(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['testuser@yandex.ru'])
+        self.assertIn('Ваш код подтверждения', mail.outbox[0].body)
+        self.assertEqual(deliver_pending(), (0, 0))
+
+    @override_settings(
+        EMAIL_BACKEND='api.tests.test_registration.FailingBackend'
+    )
+    def test_failed_email_is_retried_later(self):
+        self.client.post('/api/v1/auth/email/', {'email': 'retry@yandex.ru'})
+        self.assertEqual(deliver_pending(), (0, 1))
+        email = OutgoingEmail.objects.get(recipient='retry@yandex.ru')
+        self.assertEqual(email.attempts, 1)
+        self.assertIsNone(email.sent_at)
+        self.assertIn('relay unavailable', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(deliver_pending(), (0, 0))
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+        ):
+            self.assertEqual(deliver_pending(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
 
     def test_auth_token(self):
         user = User.objects.filter(email='testuser1@yandex.ru').first()
@@ -33,3 +122,172 @@ class RegistrationTest(APITestCase):
              'confirmation_code': str(confirmation_code)}
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_existing_user_lookup_queries(self):
+        queries = 2 if connection.vendor == 'postgresql' else 3
+        with self.assertNumQueries(queries):
+            response = self.client.post(
+                '/api/v1/auth/email/', {'email': 'testuser1@yandex.ru'}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_confirmation_code_is_throttled(self):
+        rates = {'confirmation_email': '2/min', 'confirmation_ip': '3/min'}
+        with mock.patch.dict(TokenBucketThrottle.THROTTLE_RATES, rates), \
+                mock.patch.object(TokenBucketThrottle, 'timer') as timer:
+            timer.return_value = 1000
+            for _ in range(2):
+                response = self.client.post(
+                    '/api/v1/auth/email/', {'email': 'bot@yandex.ru'}
+                )
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.post(
+                '/api/v1/auth/email/', {'email': 'BOT@yandex.ru'}
+            )
+            self.assertEqual(
+                response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+            )
+            self.assertEqual(response['Retry-After'], '30')
+
+            timer.return_value = 1030
+            response = self.client.post(
+                '/api/v1/auth/email/', {'email': 'bot@yandex.ru'}
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            response = self.client.post(
+                '/api/v1/auth/email/', {'email': 'other@yandex.ru'}
+            )
+            self.assertEqual(
+                response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+            )
+        self.assertEqual(
+            OutgoingEmail.objects.filter(recipient='bot@yandex.ru').count(), 3
+        )
+
+    def test_concurrent_requests_share_the_bucket(self):
+        rates = {'confirmation_ip': '3/min'}
+        request = APIClient().request().wsgi_request
+        barrier = threading.Barrier(8)
+        allowed = []
+
+        def attempt():
+            throttle = ConfirmationIPThrottle()
+            barrier.wait()
+            allowed.append(throttle.allow_request(request, None))
+
+        slow = SlowCache(cache)
+        with mock.patch.dict(TokenBucketThrottle.THROTTLE_RATES, rates), \
+                mock.patch.object(TokenBucketThrottle, 'cache', slow):
+            threads = [threading.Thread(target=attempt) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(allowed.count(True), 3)
+
+
+class AsyncAuthViewsTests(TransactionTestCase):
+    """Асинхронные ручки работают с БД из потоков пула, поэтому данные
+    теста должны быть зафиксированы."""
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_helpers_run_in_parallel(self):
+        barrier = threading.Barrier(2, timeout=5)
+        await asyncio.gather(*(
+            async_views.in_pool(barrier.wait)() for _ in range(2)
+        ))
+
+    async def test_async_auth_views(self):
+        factory = AsyncRequestFactory()
+        response = await async_views.send_confirmation_code(factory.post(
+            '/api/v1/auth/email/', {'email': 'async@yandex.ru'},
+            content_type='application/json'
+        ))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(response.content),
+            {'result': 'Код подтверждения успешно отправлен!'}
+        )
+
+        response = await async_views.send_jwt_token(factory.post(
+            '/api/v1/auth/token/',
+            {'email': 'async@yandex.ru', 'confirmation_code': 'wrong'},
+            content_type='application/json'
+        ))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = await async_views.send_jwt_token(factory.post(
+            '/api/v1/auth/token/', {'email': 'async@yandex.ru'},
+            content_type='application/json'
+        ))
+        self.assertIn('confirmation_code', json.loads(response.content))
+
+        response = await async_views.send_jwt_token(
+            factory.get('/api/v1/auth/token/')
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+
+
+class ConcurrentRegistrationTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_first_time_signups(self):
+        barrier = threading.Barrier(4)
+        statuses = []
+
+        def signup():
+            barrier.wait()
+            try:
+                response = APIClient().post(
+                    '/api/v1/auth/email/', {'email': 'new@yandex.ru'}
+                )
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=signup) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, [status.HTTP_200_OK] * 4)
+        self.assertEqual(User.objects.filter(email='new@yandex.ru').count(), 1)
+        self.assertEqual(
+            OutgoingEmail.objects.filter(recipient='new@yandex.ru').count(), 4
+        )
+
+
+class OutboxDeliveryTests(TransactionTestCase):
+    @skipUnlessDBFeature('has_select_for_update_nowait')
+    @override_settings(
+        EMAIL_BACKEND='api.tests.test_registration.LockProbeBackend'
+    )
+    def test_rows_are_not_locked_while_sending(self):
+        enqueue('Тема', 'Текст', 'lease@yandex.ru')
+        LockProbeBackend.locked.clear()
+        self.assertEqual(deliver_pending(), (1, 0))
+        self.assertEqual(LockProbeBackend.locked, [False])
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.attempts, 1)
+        self.assertIsNotNone(email.sent_at)
+
+    def test_claimed_emails_are_leased(self):
+        enqueue('Тема', 'Текст', 'lease@yandex.ru')
+        with mock.patch(
+            'api.outbox.EmailMessage.send', side_effect=KeyboardInterrupt
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                deliver_pending()
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.attempts, 1)
+        self.assertIsNone(email.sent_at)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(deliver_pending(), (0, 0))
@@ -0,0 +1,192 @@
+import os
+import tempfile
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from ..authentication import issue_token, user_cache
+from ..db.routers import ReplicaRouter, read_from_replica
+from ..middleware import ReplicaMiddleware
+from ..models import Account, Action, Service, User
+
+MIRRORS = [
+    alias for alias in connections
+    if connections.settings[alias].get('TEST', {}).get('MIRROR') == 'default'
+]
+SHARED_CACHE = os.path.join(tempfile.gettempdir(), 'api-replica-tests')
+REPLICAS = override_settings(
+    DATABASE_REPLICAS=['replica'], REPLICA_STICKY_SECONDS=30,
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': SHARED_CACHE,
+    }},
+)
+
+
+class RoutedReads:
+    """Запоминает базы, выбранные роутером для чтения, но выполняет
+    запросы в default: в тестах реплика - зеркало основной базы."""
+
+    def __init__(self):
+        self.aliases = []
+        self.original = ReplicaRouter.db_for_read
+
+    def db_for_read(self, router, model, **hints):
+        self.aliases.append(self.original(router, model, **hints))
+        return None
+
+    def __enter__(self):
+        self.patch = mock.patch.object(
+            ReplicaRouter, 'db_for_read',
+            lambda router, model, **hints: self.db_for_read(
+                router, model, **hints
+            )
+        )
+        self.patch.start()
+        return self.aliases
+
+    def __exit__(self, *exc_info):
+        self.patch.stop()
+
+
+@REPLICAS
+class ReplicaRouterTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='testuser', password='123', email='testuser@yandex.ru'
+        )
+        cls.account = Account.objects.create(user=cls.user, balance=100)
+        Service.objects.create(name='Услуга', description='Описание', price=1)
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {issue_token(self.user)}'
+        )
+
+    def test_router(self):
+        self.assertEqual(Service.objects.all().db, 'default')
+        with read_from_replica():
+            self.assertEqual(Service.objects.all().db, 'replica')
+            self.assertEqual(router.db_for_write(Service), 'default')
+        self.assertEqual(Service.objects.all().db, 'default')
+        self.assertFalse(router.allow_migrate('replica', 'api'))
+        self.assertTrue(router.allow_migrate('default', 'api'))
+
+    def test_read_views_use_replica(self):
+        with RoutedReads() as aliases:
+            response = self.client.get('/api/v1/services/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('replica', aliases)
+        with RoutedReads() as aliases:
+            response = self.client.get('/api/v1/accounts/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('replica', aliases)
+        self.assertIn('default', aliases)
+
+    def test_reads_stick_to_primary_after_write(self):
+        with RoutedReads() as aliases:
+            self.client.get('/api/v1/actions/')
+        self.assertIn('replica', aliases)
+        response = self.client.post(
+            '/api/v1/actions/', {'amount': '10', 'account': self.account.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        with RoutedReads() as aliases:
+            response = self.client.get('/api/v1/actions/')
+        self.assertEqual(response.json()['count'], 1)
+        self.assertNotIn('replica', aliases)
+        other = User.objects.create_user(
+            username='other', password='123', email='other@yandex.ru'
+        )
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {issue_token(other)}')
+        with RoutedReads() as aliases:
+            client.get('/api/v1/actions/')
+        self.assertIn('replica', aliases)
+        cache.clear()
+        with RoutedReads() as aliases:
+            self.client.get('/api/v1/actions/')
+        self.assertIn('replica', aliases)
+
+    def test_failed_write_does_not_pin(self):
+        response = self.client.post(
+            '/api/v1/actions/', {'amount': '-10', 'account': self.account.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with RoutedReads() as aliases:
+            self.client.get('/api/v1/actions/')
+        self.assertIn('replica', aliases)
+
+    def test_streamed_statement_reads_from_replica(self):
+        with RoutedReads() as aliases:
+            response = self.client.get(
+                f'/api/v1/accounts/{self.account.id}/statement.csv'
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            served = len(aliases)
+            b''.join(response.streaming_content)
+        self.assertGreater(len(aliases), served)
+        self.assertEqual(set(aliases[served:]), {'replica'})
+
+    def test_replicas_require_shared_cache(self):
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}):
+            with self.assertRaises(ImproperlyConfigured):
+                ReplicaMiddleware(lambda request: None)
+            with override_settings(REPLICA_STICKY_SECONDS=0):
+                ReplicaMiddleware(lambda request: None)
+
+
+@skipUnless(MIRRORS, 'Нет базы-зеркала default')
+class ReplicaDatabaseTests(TransactionTestCase):
+    """Чтения идут в настоящее второе соединение с зеркалом default."""
+
+    databases = {'default', *MIRRORS[:1]}
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser', password='123', email='testuser@yandex.ru'
+        )
+        self.account = Account.objects.create(user=self.user, balance=30)
+        for amount in (10, 20):
+            Action.objects.create(account=self.account, amount=amount)
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {issue_token(self.user)}'
+        )
+
+    def test_lists_and_statement_read_from_replica(self):
+        alias = MIRRORS[0]
+        with REPLICAS, override_settings(DATABASE_REPLICAS=[alias]), \
+                CaptureQueriesContext(connections[alias]) as queries:
+            response = self.client.get('/api/v1/actions/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json()['count'], 2)
+            listed = len(queries)
+            response = self.client.get(
+                f'/api/v1/accounts/{self.account.id}/statement.csv'
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            content = iter(response.streaming_content)
+            started = next(content) + next(content)
+            self.assertTrue(connections[alias].in_atomic_block)
+            lines = (started + b''.join(content)).splitlines()
+        self.assertGreater(listed, 0)
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[-1].endswith(b',30.00'))
+        statement = [query['sql'] for query in queries[listed:]]
+        self.assertTrue(any('api_action' in sql for sql in statement))
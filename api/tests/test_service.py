@@ -1,7 +1,16 @@
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import override_settings
 from rest_framework import status
-from rest_framework.test import (APIRequestFactory, APITestCase,
+from rest_framework.test import (APIClient, APIRequestFactory, APITestCase,
                                  force_authenticate)
 
+from ..checks import check_shared_cache
+from ..filters import restore_search_triggers
+from ..imports import import_services
 from ..models import Service, User
 from ..views import ServiceViewSet
 
@@ -20,6 +29,9 @@ class ServiceTests(APITestCase):
             currency='USD'
         )
 
+    def setUp(self):
+        cache.clear()
+
     def test_create_service(self):
         factory = APIRequestFactory()
         request = factory.get('/api/v1/services/')
@@ -29,3 +41,237 @@ class ServiceTests(APITestCase):
         self.assertEqual(Service.objects.count(), 1)
         self.assertEqual(str(Service.objects.first()), 'test')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_catalog_etag(self):
+        response = self.client.get('/api/v1/services/?currency=USD')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/v1/services/?currency=USD')
+        self.assertEqual(cached.json(), response.json())
+        self.assertEqual(cached['ETag'], etag)
+        response = self.client.get(
+            '/api/v1/services/?currency=USD', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get(
+            f'/api/v1/services/{ServiceTests.service.id}/',
+            HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['name'], 'test')
+
+    def test_write_invalidates_catalog(self):
+        admin = User.objects.create_user(
+            username='admin', password='123', email='admin@yandex.ru',
+            role=User.ADMIN
+        )
+        etag = self.client.get('/api/v1/services/')['ETag']
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/v1/services/', {
+                'name': 'new', 'description': 'new', 'price': 10,
+            })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(
+            '/api/v1/services/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_catalog_without_cache(self):
+        with mock.patch('api.catalog.cache') as broken:
+            broken.get.side_effect = ConnectionError
+            response = self.client.get('/api/v1/services/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertIn('ETag', response)
+
+    @skipUnless(connection.vendor == 'sqlite', 'Триггеры FTS5 SQLite')
+    def test_search_triggers_are_restored(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER api_service_fts_insert')
+        Service.objects.create(
+            name='Стрижка', description='Салон', price=300
+        )
+        self.assertEqual(
+            restore_search_triggers(connection), ['api_service_fts_insert']
+        )
+        self.assertEqual(restore_search_triggers(connection), [])
+        response = self.client.get('/api/v1/services/?search=стрижк')
+        self.assertEqual(response.json()['count'], 1)
+
+    def test_process_local_cache_warning(self):
+        self.assertEqual(
+            [error.id for error in check_shared_cache(None)], ['api.W002']
+        )
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }}):
+            self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(EXCHANGE_RATES={
+        'SOURCE': 'api.rates.StaticRateSource',
+        'OPTIONS': {'rates': {'USD': '70', 'EUR': '80'}},
+    })
+    def test_search_and_price_filters(self):
+        Service.objects.bulk_create([
+            Service(name='Доставка пиццы', description='Быстрая доставка',
+                    price=500),
+            Service(name='Уборка', description='Уборка квартиры',
+                    price=20, currency='EUR'),
+        ])
+
+        def names(query):
+            response = self.client.get(f'/api/v1/services/?{query}')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return sorted(item['name'] for item in response.json()['results'])
+
+        self.assertEqual(names('search=ДОСТ'), ['Доставка пиццы'])
+        self.assertEqual(names('search=квартир уборк'), ['Уборка'])
+        self.assertEqual(names('search=пицца'), [])
+        self.assertEqual(names('min_price=100&max_price=500'), [
+            'test', 'Доставка пиццы'
+        ])
+        self.assertEqual(
+            names('min_price=1500&price_currency=RUB'), ['test', 'Уборка']
+        )
+        self.assertEqual(
+            names('min_price=6&max_price=10&price_currency=USD'),
+            ['Доставка пиццы']
+        )
+
+
+class ServiceImportTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_user(
+            username='admin', password='123', email='admin@yandex.ru',
+            role=User.ADMIN
+        )
+        Service.objects.create(
+            name='old', description='old', price=100, external_id='p-1'
+        )
+
+    def get_client(self):
+        client = APIClient()
+        client.force_authenticate(user=ServiceImportTests.admin)
+        return client
+
+    def test_csv_import(self):
+        rows = ['external_id,name,description,price,currency']
+        rows += [f'n-{i},new {i},new,{10 + i},' for i in range(50)]
+        rows += ['p-1,renamed,old,100,USD', 'p-2,free,free,0,RUB']
+        with self.assertNumQueries(5):
+            response = self.get_client().post(
+                '/api/v1/services/import/', '\n'.join(rows),
+                content_type='text/csv'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        report = response.json()
+        self.assertEqual(report['created'], 50)
+        self.assertEqual(report['updated'], 1)
+        self.assertEqual(report['failed'], 1)
+        self.assertEqual(report['errors'][0]['row'], 52)
+        self.assertIn('price', report['errors'][0]['errors'])
+        service = Service.objects.get(external_id='p-1')
+        self.assertEqual((service.name, service.currency), ('renamed', 'USD'))
+        self.assertEqual(Service.objects.get(external_id='n-0').currency,
+                         Service.RUB)
+
+    def test_jsonl_import_reports_bad_lines(self):
+        body = '\n'.join([
+            '{"external_id": "p-1", "name": "old", "description": "old", '
+            '"price": "100.00", "currency": "RUB"}',
+            '{"external_id": "j-1", "name": "json"',
+            '{"external_id": "j-2", "name": "json", "description": "json", '
+            '"price": 5}',
+            '{"external_id": "j-2", "name": "json", "description": "json", '
+            '"price": 6}',
+        ])
+        response = self.get_client().post(
+            '/api/v1/services/import/', body,
+            content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        report = response.json()
+        self.assertEqual(report['unchanged'], 1)
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(
+            [error['row'] for error in report['errors']], [2, 4]
+        )
+
+    def test_content_type_parameters(self):
+        body = 'external_id,name,description,price\nw-1,Ремонт,Окна,10\n'
+        response = self.get_client().post(
+            '/api/v1/services/import/', body.encode('cp1251'),
+            content_type='text/csv; charset=windows-1251'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(Service.objects.get(external_id='w-1').name, 'Ремонт')
+        response = self.get_client().post(
+            '/api/v1/services/import/', '[]',
+            content_type='Application/JSON; charset="UTF-8"'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.get_client().post(
+            '/api/v1/services/import/', '[]',
+            content_type='application/json; charset=unknown'
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        )
+
+    def test_unreadable_line_keeps_imported_rows(self):
+        body = (
+            'external_id,name,description,price\n'
+            'r-1,first,first,10\nr-2,second,second,20\n'
+        ).encode() + b'r-3,\xff,bad,30\n'
+        response = self.get_client().post(
+            '/api/v1/services/import/', body, content_type='text/csv'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        report = response.json()
+        self.assertIn('строки 3', report['error'])
+        self.assertEqual(report['created'], 2)
+        self.assertTrue(Service.objects.filter(external_id='r-2').exists())
+
+    def test_concurrently_created_service_is_updated(self):
+        in_bulk = QuerySet.in_bulk
+        calls = []
+
+        def stale_in_bulk(queryset, *args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                return {}
+            return in_bulk(queryset, *args, **kwargs)
+
+        rows = [{'external_id': 'p-1', 'name': 'raced',
+                 'description': 'old', 'price': '100'}]
+        with mock.patch.object(QuerySet, 'in_bulk', stale_in_bulk):
+            report = import_services(rows)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual((report.created, report.updated), (0, 1))
+        self.assertEqual(Service.objects.get(external_id='p-1').name, 'raced')
+
+    def test_import_requires_admin(self):
+        user = User.objects.create_user(
+            username='user', password='123', email='user@yandex.ru'
+        )
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.post(
+            '/api/v1/services/import/', '[]', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.get_client().post(
+            '/api/v1/services/import/', 'x', content_type='text/plain'
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        )
@@ -1,6 +1,11 @@
+import threading
+
+from django.db import connection
+from django.test import TransactionTestCase, skipUnlessDBFeature
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 
+from .. import operations
 from ..models import Account, Service, Transaction, User
 
 
@@ -25,18 +30,106 @@ class TransactionTests(APITestCase):
     def test_create_transaction(self):
         client = APIClient()
         client.force_authenticate(user=TransactionTests.user)
-        response = client.get('/api/v1/services/2/purchase/')
+        response = client.get(
+            f'/api/v1/services/{TransactionTests.service.id}/purchase/'
+        )
         self.assertEqual(Transaction.objects.count(), 1)
         self.assertEqual(
             str(Transaction.objects.first()),
-            'Счет номер 4 приобрел услугу test123 за 100.00 RUB'
+            f'Счет номер {TransactionTests.account.id} '
+            'приобрел услугу test123 за 100.00 RUB'
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
     def test_get_transaction(self):
         client = APIClient()
         client.force_authenticate(user=TransactionTests.user)
-        client.get('/api/v1/services/2/purchase/')
+        client.get(
+            f'/api/v1/services/{TransactionTests.service.id}/purchase/'
+        )
         response = client.get('/api/v1/transactions/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.json()['count'], 1)
+
+    def test_repeated_purchase_is_charged_once(self):
+        client = APIClient()
+        client.force_authenticate(user=TransactionTests.user)
+        url = f'/api/v1/services/{TransactionTests.service.id}/purchase/'
+        client.get(url)
+        response = client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json()['status'], 'У вас уже приобретена услуга test123'
+        )
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(
+            Account.objects.get(id=TransactionTests.account.id).balance, 0
+        )
+
+    def test_purchase_insufficient_funds(self):
+        Account.objects.filter(id=TransactionTests.account.id).update(
+            balance=99
+        )
+        client = APIClient()
+        client.force_authenticate(user=TransactionTests.user)
+        response = client.get(
+            f'/api/v1/services/{TransactionTests.service.id}/purchase/'
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_402_PAYMENT_REQUIRED
+        )
+        self.assertEqual(Transaction.objects.count(), 0)
+        self.assertEqual(
+            Account.objects.get(id=TransactionTests.account.id).balance, 99
+        )
+
+
+class ConcurrentPurchaseTests(TransactionTestCase):
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_purchases_are_charged_once(self):
+        user = User.objects.create_user(username='buyer', password='123')
+        account = Account.objects.create(user=user, balance=500)
+        service = Service.objects.create(
+            name='test', description='test', price=100
+        )
+        barrier = threading.Barrier(5)
+        outcomes = []
+
+        def buy():
+            barrier.wait()
+            try:
+                operations.purchase(account.id, service.id, service.price)
+                outcomes.append('ok')
+            except operations.AlreadyPurchased:
+                outcomes.append('duplicate')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(outcomes), ['duplicate'] * 4 + ['ok'])
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(Account.objects.get(id=account.id).balance, 400)
+
+    def test_purchase_for_missing_account(self):
+        service = Service.objects.create(
+            name='test', description='test', price=100
+        )
+        with self.assertRaises(operations.AccountNotFound):
+            operations.purchase(0, service.id, service.price)
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_purchase_of_deleted_service(self):
+        user = User.objects.create_user(username='buyer', password='123')
+        account = Account.objects.create(user=user, balance=500)
+        service = Service.objects.create(
+            name='test', description='test', price=100
+        )
+        Service.objects.filter(id=service.id).delete()
+        with self.assertRaises(operations.ServiceNotFound):
+            operations.purchase(account.id, service.id, service.price)
+        self.assertEqual(Account.objects.get(id=account.id).balance, 500)
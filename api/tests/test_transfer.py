@@ -1,3 +1,10 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 
@@ -30,14 +37,15 @@ class TransferTests(APITestCase):
         client.force_authenticate(user=TransferTests.user1)
         response = client.post(
             '/api/v1/transfers/',
-            {'from_account': '5',
-             'to_account': '6',
+            {'from_account': TransferTests.account1.id,
+             'to_account': TransferTests.account2.id,
              'amount': '100'}
         )
         self.assertEqual(Transfer.objects.count(), 1)
         self.assertEqual(
             str(Transfer.objects.first()),
-            ('Перевод с 5 - testuser1 - 0.00 на 6 - testuser2 - 200.00, '
+            (f'Перевод с {TransferTests.account1.id} - testuser1 - 0.00 '
+             f'на {TransferTests.account2.id} - testuser2 - 200.00, '
              'сумма перевода 100.00')
         )
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
@@ -47,8 +55,8 @@ class TransferTests(APITestCase):
         client.force_authenticate(user=TransferTests.user1)
         client.post(
             '/api/v1/transfers/',
-            {'from_account': '5',
-             'to_account': '6',
+            {'from_account': TransferTests.account1.id,
+             'to_account': TransferTests.account2.id,
              'amount': '100'}
         )
         response = client.get('/api/v1/transfers/')
@@ -62,11 +70,96 @@ class TransferTests(APITestCase):
         client2.force_authenticate(user=TransferTests.user2)
         client1.post(
             '/api/v1/transfers/',
-            {'from_account': '5',
-             'to_account': '6',
+            {'from_account': TransferTests.account1.id,
+             'to_account': TransferTests.account2.id,
              'amount': '100'}
         )
         response = client2.get('/api/v1/transfers/to_my_account/')
         self.assertEqual(Transfer.objects.count(), 1)
         self.assertEqual(response.json()['count'], 1)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_transfer_insufficient_funds(self):
+        client = APIClient()
+        client.force_authenticate(user=TransferTests.user1)
+        response = client.post(
+            '/api/v1/transfers/',
+            {'from_account': TransferTests.account1.id,
+             'to_account': TransferTests.account2.id,
+             'amount': '100.01'}
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_402_PAYMENT_REQUIRED
+        )
+        self.assertEqual(Transfer.objects.count(), 0)
+        self.assertEqual(
+            Account.objects.get(id=TransferTests.account1.id).balance, 100
+        )
+
+    def test_transfer_from_foreign_account(self):
+        client = APIClient()
+        client.force_authenticate(user=TransferTests.user1)
+        response = client.post(
+            '/api/v1/transfers/',
+            {'from_account': TransferTests.account2.id,
+             'to_account': TransferTests.account1.id,
+             'amount': '10'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Transfer.objects.count(), 0)
+
+    def test_transfer_batch(self):
+        client = APIClient()
+        client.force_authenticate(user=TransferTests.user1)
+        account1, account2 = TransferTests.account1, TransferTests.account2
+        response = client.post(
+            '/api/v1/transfers/batch/',
+            [{'from_account': account1.id, 'to_account': account2.id,
+              'amount': '30'},
+             {'from_account': account2.id, 'to_account': account1.id,
+              'amount': '10'},
+             {'from_account': account1.id, 'to_account': account2.id,
+              'amount': '100'},
+             {'from_account': account1.id, 'to_account': account2.id,
+              'amount': '-5'}],
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result['status'] for result in response.json()['results']],
+            ['ok', 'error', 'error', 'error']
+        )
+        self.assertEqual(Transfer.objects.count(), 1)
+        self.assertEqual(Account.objects.get(id=account1.id).balance, 70)
+        self.assertEqual(Account.objects.get(id=account2.id).balance, 130)
+
+    def test_transfer_batch_query_count_is_flat(self):
+        client = APIClient()
+        client.force_authenticate(user=TransferTests.user1)
+        counts = []
+        for size in (2, 20):
+            items = [{'from_account': TransferTests.account1.id,
+                      'to_account': TransferTests.account2.id,
+                      'amount': '1'}] * size
+            with CaptureQueriesContext(connection) as queries:
+                response = client.post(
+                    '/api/v1/transfers/batch/', items, format='json'
+                )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(Transfer.objects.count(), 22)
+
+
+class MoneyStressTests(TransactionTestCase):
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_money_movement_conserves_balances(self):
+        output = StringIO()
+        call_command(
+            'stress_money', accounts=5, services=3, threads=4,
+            operations=40, balance=100, stdout=output
+        )
+        report = json.loads(output.getvalue())
+        self.assertEqual(report['violations'], [])
+        self.assertEqual(report['operations'], 160)
+        self.assertFalse(Account.objects.exists())
@@ -0,0 +1,80 @@
+import hashlib
+import time
+
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Ограничение частоты запросов по алгоритму token bucket.
+
+    Корзина вмещает num_requests жетонов и равномерно пополняется
+    со скоростью num_requests за duration секунд: короткий всплеск
+    пропускается, а средняя частота не превышает заданную. Состояние
+    корзины хранится в кэше Django; чтение и запись корзины выполняются
+    под блокировкой cache.add, поэтому параллельные запросы не тратят
+    один и тот же жетон. Если блокировку не удалось взять за
+    lock_attempts попыток, запрос отклоняется.
+    """
+
+    lock_attempts = 20
+    lock_wait = 0.005
+    lock_timeout = 1
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        lock = f'{self.key}:lock'
+        for _ in range(self.lock_attempts):
+            if self.cache.add(lock, 1, self.lock_timeout):
+                break
+            time.sleep(self.lock_wait)
+        else:
+            self.tokens = 0
+            return False
+        try:
+            return self.take_token()
+        finally:
+            self.cache.delete(lock)
+
+    def take_token(self):
+        now = self.timer()
+        tokens, updated = self.cache.get(self.key, (self.num_requests, now))
+        self.tokens = min(
+            self.num_requests,
+            tokens + (now - updated) * self.num_requests / self.duration
+        )
+        if self.tokens < 1:
+            return False
+        self.cache.set(self.key, (self.tokens - 1, now), self.duration)
+        return True
+
+    def wait(self):
+        return (1 - self.tokens) * self.duration / self.num_requests
+
+
+class ConfirmationEmailThrottle(TokenBucketThrottle):
+    scope = 'confirmation_email'
+
+    def get_cache_key(self, request, view):
+        data = request.data
+        email = data.get('email') if hasattr(data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        ident = hashlib.sha1(
+            email.strip().lower().encode('utf-8')
+        ).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class ConfirmationIPThrottle(TokenBucketThrottle):
+    scope = 'confirmation_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope, 'ident': self.get_ident(request)
+        }
@@ -1,6 +1,8 @@
-from django.urls import include, path
+from django.conf import settings
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
 from .views import (AccountViewSet, ActionViewSet, ServiceViewSet,
                     TransactionViewSet, TransferViewSet, UserViewSet,
                     send_confirmation_code, send_jwt_token)
@@ -31,12 +33,29 @@ router_v1.register(
     TransferViewSet, basename='transfers'
 )
 
-auth_patterns = [
-    path('email/', send_confirmation_code),
-    path('token/', send_jwt_token),
-]
+if settings.ASYNC_VIEWS:
+    auth_patterns = [
+        path('email/', async_views.send_confirmation_code),
+        path('token/', async_views.send_jwt_token),
+    ]
+else:
+    auth_patterns = [
+        path('email/', send_confirmation_code),
+        path('token/', send_jwt_token),
+    ]
+
+statement_view = AccountViewSet.as_view({'get': 'statement'})
+account_actions_view = ActionViewSet.as_view({'get': 'list'})
 
 urlpatterns = [
+    re_path(
+        r'^v1/accounts/(?P<pk>\d+)/statement\.(?P<fmt>csv|jsonl)$',
+        statement_view, name='accounts-statement'
+    ),
+    re_path(
+        r'^v1/accounts/(?P<account_pk>\d+)/actions/$',
+        account_actions_view, name='accounts-actions'
+    ),
     path('v1/', include(router_v1.urls)),
     path('v1/auth/', include(auth_patterns)),
 ]
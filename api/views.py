@@ -1,54 +1,121 @@
-import decimal
+from decimal import Decimal
 
-from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
-from django.db import transaction
+from django.db import connections, router
+from django.db.models import (Count, Max, Prefetch, Q, Sum,
+                              prefetch_related_objects)
+from django.db.models.functions import Coalesce
+from django.db.models.sql.subqueries import InsertQuery
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import filters, mixins, permissions, status, viewsets
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import (action, api_view, permission_classes,
+                                       throttle_classes)
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import AccessToken
 
-from .models import Account, Service, Transaction, Transfer, User
+from . import archive, imports, operations, outbox, rates, statements
+from .accounts import forget_account, get_account_id, get_account_id_or_404
+from .authentication import issue_token, user_cache
+from .catalog import CatalogCacheMixin
+from .filters import ServiceFilter
+from .models import Account, Action, Service, Transaction, Transfer, User
+from .pagination import HistoryPagination
 from .permissions import IsAdmin, IsAdminOrReadOnly
-from .serializers import (AccountEURSerializer, AccountSerializer,
-                          AccountUSDSerializer, ActionSerializer,
-                          EmailSerializer, ServiceSerializer, TokenSerializer,
-                          TransactionSerializer, TransferSerializer,
-                          UserSerializer)
-
-USD_RATE = 72.56
-EURO_RATE = 85.46
-RUB_RATE = 1
-CURRENCY_INFO = {
-    'RUB': ('руб', RUB_RATE),
-    'USD': ('USD', USD_RATE),
-    'EUR': ('Euro', EURO_RATE),
+from .serializers import (AccountSerializer, ActionSerializer, EmailSerializer,
+                          ServiceSerializer, TokenSerializer,
+                          TransactionSerializer, TransferBatchItemSerializer,
+                          TransferSerializer, UserSerializer)
+from .throttling import ConfirmationEmailThrottle, ConfirmationIPThrottle
+
+TRANSFER_BATCH_LIMIT = 1000
+TRANSFER_ERRORS = {
+    operations.AccountNotFound: 'Счет не найден!',
+    operations.ForeignAccount: 'Укажите номер своего счета!',
+    operations.SameAccount: ('Получатель и отправитель совпадают, '
+                             'укажите номер счета получателя!'),
+    operations.InvalidAmount: 'Сумма перевода должна быть больше нуля!',
+    operations.InsufficientFunds: 'У вас недостаточно средств для перевода!',
+}
+CONFIRMATION_THROTTLES = [ConfirmationEmailThrottle, ConfirmationIPThrottle]
+CONFIRMATION_CODE_SENT = 'Код подтверждения успешно отправлен!'
+INVALID_CONFIRMATION_CODE = {
+    'confirmation_code': 'Неверный код подтверждения!'
 }
 
 
-@api_view(['POST'])
-@permission_classes([permissions.AllowAny])
-def send_confirmation_code(request):
-    serializer = EmailSerializer(data=request.data)
-    serializer.is_valid(raise_exception=True)
-    email = serializer.validated_data.get('email')
-    if not User.objects.filter(email=email).exists():
-        User.objects.create(
-            username=email, email=email
+def insert_or_select_user(email):
+    """Один запрос PostgreSQL: INSERT ... ON CONFLICT DO NOTHING
+    RETURNING и поиск существующего пользователя с этой почтой.
+
+    Возвращает None, если строку вставил параллельный запрос, еще не
+    видимый в снимке этого запроса, или занято имя пользователя.
+    """
+    using = router.db_for_write(User)
+    quote = connections[using].ops.quote_name
+    query = InsertQuery(User, ignore_conflicts=True)
+    query.insert_values(
+        [field for field in User._meta.concrete_fields
+         if not field.primary_key],
+        [User(username=email, email=email)]
+    )
+    (insert, params), = query.get_compiler(using).as_sql()
+    columns = ', '.join(
+        quote(field.column) for field in User._meta.concrete_fields
+    )
+    sql = (
+        f'WITH created AS ({insert} RETURNING {columns}) '
+        f'SELECT {columns} FROM created UNION ALL '
+        f'(SELECT {columns} FROM {quote(User._meta.db_table)} '
+        f'WHERE {quote("email")} = %s LIMIT 1) LIMIT 1'
+    )
+    return next(
+        iter(User.objects.using(using).raw(sql, [*params, email])), None
+    )
+
+
+def get_or_create_user(email):
+    user = None
+    if connections[router.db_for_write(User)].vendor == 'postgresql':
+        user = insert_or_select_user(email)
+    if user is None:
+        User.objects.bulk_create(
+            [User(username=email, email=email)], ignore_conflicts=True
+        )
+        user = User.objects.filter(email=email).first()
+    if user is None:
+        raise ValidationError(
+            {'email': 'Пользователь с таким именем уже существует!'}
         )
-    user = User.objects.filter(email=email).first()
+    return user
+
+
+def send_code(email):
+    user = get_or_create_user(email)
     confirmation_code = default_token_generator.make_token(user)
-    send_mail(
+    outbox.enqueue(
         'Код подтверждения API',
         f'Ваш код подтверждения: {confirmation_code}',
-        settings.DEFAULT_FROM_EMAIL,
-        [email]
+        email
     )
+
+
+def obtain_token(email, confirmation_code):
+    user = get_object_or_404(User, email=email)
+    if default_token_generator.check_token(user, confirmation_code):
+        return issue_token(user)
+    return None
+
+
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+@throttle_classes(CONFIRMATION_THROTTLES)
+def send_confirmation_code(request):
+    serializer = EmailSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    send_code(serializer.validated_data.get('email'))
     return Response(
-        {'result': 'Код подтверждения успешно отправлен!'},
-        status=status.HTTP_200_OK
+        {'result': CONFIRMATION_CODE_SENT}, status=status.HTTP_200_OK
     )
 
 
@@ -57,20 +124,15 @@ def send_confirmation_code(request):
 def send_jwt_token(request):
     serializer = TokenSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
-    email = serializer.validated_data.get('email')
-    confirmation_code = serializer.validated_data.get(
-        'confirmation_code'
+    token = obtain_token(
+        serializer.validated_data.get('email'),
+        serializer.validated_data.get('confirmation_code')
     )
-    user = get_object_or_404(User, email=email)
-    if default_token_generator.check_token(user, confirmation_code):
-        token = AccessToken.for_user(user)
+    if token is None:
         return Response(
-            {'token': str(token)}, status=status.HTTP_200_OK
+            INVALID_CONFIRMATION_CODE, status=status.HTTP_400_BAD_REQUEST
         )
-    return Response(
-        {'confirmation_code': 'Неверный код подтверждения!'},
-        status=status.HTTP_400_BAD_REQUEST
-    )
+    return Response({'token': str(token)}, status=status.HTTP_200_OK)
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -84,125 +146,239 @@ class UserViewSet(viewsets.ModelViewSet):
     @action(methods=['patch', 'get'], detail=False,
             permission_classes=[permissions.IsAuthenticated])
     def me(self, request):
-        user = self.request.user
-        serializer = self.get_serializer(user)
         if self.request.method == 'PATCH':
+            user = get_object_or_404(User, pk=self.request.user.id)
             serializer = self.get_serializer(
                 user, data=request.data, partial=True
             )
             serializer.is_valid(raise_exception=True)
             serializer.save(role=user.role)
-        return Response(serializer.data)
+            return Response(serializer.data)
+        user = user_cache.get(self.request.user.id)
+        return Response(self.get_serializer(user).data)
 
 
 class AccountViewSet(mixins.CreateModelMixin,
                      mixins.ListModelMixin,
                      viewsets.GenericViewSet):
+    serializer_class = AccountSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        user = self.request.user
-        return user.accounts.all()
+    def get_expand(self):
+        return set(self.request.query_params.get('expand', '').split(','))
 
-    def get_serializer_class(self):
-        query_params = self.request.query_params.get('currency', '')
-        if 'USD' in query_params:
-            return AccountUSDSerializer
-        if 'EUR' in query_params:
-            return AccountEURSerializer
-        return AccountSerializer
+    def get_queryset(self):
+        queryset = Account.objects.filter(
+            user_id=self.request.user.id
+        ).annotate(
+            deposits_count=Count('actions'),
+            last_deposit_date=Max('actions__date'),
+            total_deposited=Coalesce(Sum('actions__amount'), Decimal(0))
+        ).order_by('id')
+        if 'actions' in self.get_expand():
+            queryset = queryset.annotate(
+                recent_actions_since=AccountSerializer.recent_actions_since()
+            )
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        """Последние пополнения всех счетов страницы читаются одним
+        запросом по индексу (счет, дата), итоги пополнений дополняются
+        архивными из индексов корзин."""
+        page = super().paginate_queryset(queryset)
+        for account in page or ():
+            self.add_archived_deposits(account)
+        if page and 'actions' in self.get_expand():
+            recent = Q()
+            for account in page:
+                since = account.recent_actions_since
+                recent |= Q(account_id=account.id) & (
+                    Q(date__gte=since) if since is not None else Q()
+                )
+            prefetch_related_objects(page, Prefetch(
+                'actions',
+                queryset=Action.objects.filter(recent)
+                .order_by('-date', '-id'),
+                to_attr='recent_actions'
+            ))
+        return page
+
+    @staticmethod
+    def add_archived_deposits(account):
+        deposits = archive.AccountArchive(Action, account_id=account.id)
+        if not deposits:
+            return
+        account.deposits_count += deposits.count()
+        account.total_deposited += deposits.amount()
+        if account.last_deposit_date is None:
+            account.last_deposit_date = deposits.last_date()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        currency = self.request.query_params.get('currency', '').upper()
+        if currency in rates.get_provider().get_rates():
+            context['currency'] = currency
+        context['expand'] = self.get_expand()
+        return context
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        account = Account.objects.filter(user=self.request.user)
-        if account.exists():
+        account_id = get_account_id(request)
+        if account_id is not None:
             return Response(
-                {'status': f'У вас уже есть счет {account.first().id}'},
+                {'status': f'У вас уже есть счет {account_id}'},
                 status=status.HTTP_200_OK
             )
 
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.id)
         headers = self.get_success_headers(serializer.data)
         return Response(
             serializer.data, status=status.HTTP_201_CREATED, headers=headers
         )
 
+    def statement(self, request, pk, fmt):
+        account = get_object_or_404(
+            Account, pk=pk, user_id=self.request.user.id
+        )
+        content_type, render = statements.RENDERERS[fmt]
+        response = StreamingHttpResponse(
+            render(statements.iter_movements(account.id)),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="statement-{account.id}.{fmt}"'
+        )
+        return response
+
 
 class ActionViewSet(mixins.CreateModelMixin,
                     mixins.ListModelMixin,
                     viewsets.GenericViewSet):
     serializer_class = ActionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HistoryPagination
     ordering_fields = ['date', 'amount']
 
+    def get_account_id(self):
+        """Счет из адреса /accounts/{id}/actions/ или счет пользователя."""
+        if 'account_pk' not in self.kwargs:
+            return get_account_id_or_404(self.request)
+        account_id = int(self.kwargs['account_pk'])
+        owned = (
+            account_id == get_account_id(self.request)
+            or Account.objects.filter(
+                id=account_id, user_id=self.request.user.id
+            ).exists()
+        )
+        if not owned:
+            raise Http404('Ваш счет не найден!')
+        return account_id
+
     def get_queryset(self):
-        account = get_object_or_404(Account, user=self.request.user)
-        return account.actions.all()
+        return Action.objects.filter(account_id=self.get_account_id())
+
+    def get_archived(self):
+        return archive.AccountArchive(
+            Action, account_id=self.get_account_id()
+        )
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        try:
-            account = Account.objects.filter(
-                user=self.request.user).get(id=self.request.data['account'])
-        except Exception:
+        account = serializer.validated_data['account']
+        if account.user_id != self.request.user.id:
             return Response(
                 {'account': 'Укажите номер своего счета!'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        serializer.save(account=account)
-        headers = self.get_success_headers(serializer.data)
+        try:
+            action = operations.deposit(
+                account.id, serializer.validated_data['amount']
+            )
+        except operations.InvalidAmount:
+            return Response(
+                {'amount': 'Сумма пополнения должна быть больше нуля!'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except operations.AccountNotFound:
+            forget_account(self.request.user.id)
+            return Response(
+                {'account': 'Счет не найден!'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        data = self.get_serializer(action).data
+        headers = self.get_success_headers(data)
         return Response(
-            serializer.data, status=status.HTTP_201_CREATED, headers=headers
+            data, status=status.HTTP_201_CREATED, headers=headers
         )
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
     permission_classes = [IsAdminOrReadOnly]
-    filterset_fields = ['currency']
+    filterset_class = ServiceFilter
+
+    @action(methods=['post'], detail=False, url_path='import',
+            permission_classes=[IsAdmin])
+    def bulk_import(self, request):
+        file_format, charset = imports.parse_content_type(
+            request.content_type
+        )
+        if file_format is None:
+            return Response(
+                {'error': 'Поддерживаются text/csv, application/json '
+                          'и application/x-ndjson'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        lines = imports.decode_lines(request.stream or (), charset)
+        try:
+            report = imports.import_services(
+                imports.read_rows(lines, file_format)
+            )
+        except imports.InvalidImport as error:
+            data = {'error': str(error)}
+            if error.report is not None:
+                data.update(error.report.as_dict())
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
 
     @action(methods=['get'], detail=True,
             permission_classes=[permissions.IsAuthenticated])
     def purchase(self, request, pk):
         service = self.get_object()
-        currency_name, currency_rate = CURRENCY_INFO[service.currency]
-        if not Account.objects.filter(user=self.request.user).exists():
+        account_id = get_account_id(request)
+        if account_id is None:
             return Response(
                 {'error': 'Ваш счет не найден!'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        user_account = Account.objects.get(user=self.request.user)
-        if Transaction.objects.filter(
-            account=user_account, service=service
-        ).exists():
+        service_price = rates.to_rub(service.price, service.currency)
+        try:
+            operations.purchase(account_id, service.id, service_price)
+        except operations.AlreadyPurchased:
             return Response(
                 {'status': f'У вас уже приобретена услуга {service.name}'},
                 status=status.HTTP_200_OK
             )
-        service_price = round(
-            service.price * decimal.Decimal(currency_rate), 2
-        )
-        remains_cash = user_account.balance - service_price
-        if remains_cash < 0:
+        except operations.AccountNotFound:
+            forget_account(request.user.id)
+            return Response(
+                {'error': 'Ваш счет не найден!'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except operations.ServiceNotFound:
+            raise Http404
+        except operations.InsufficientFunds:
             return Response(
                 {'status': 'У вас недостаточно средств '
                            f'для покупки {service.name}'},
                 status=status.HTTP_402_PAYMENT_REQUIRED
             )
-        user_account.balance -= service_price
-        user_account.save()
-        transaction = Transaction.objects.create(
-            account=user_account,
-            service=service,
-            amount=service_price
-        )
-        transaction.save()
         return Response(
             {'status': f'Вы успешно купили услугу {service.name}'},
             status=status.HTTP_200_OK
@@ -212,11 +388,18 @@ class ServiceViewSet(viewsets.ModelViewSet):
 class TransactionViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HistoryPagination
     ordering_fields = ['date', 'amount']
 
     def get_queryset(self):
-        account = get_object_or_404(Account, user=self.request.user)
-        return account.transactions.all()
+        return Transaction.objects.filter(
+            account_id=get_account_id_or_404(self.request)
+        )
+
+    def get_archived(self):
+        return archive.AccountArchive(
+            Transaction, account_id=get_account_id_or_404(self.request)
+        )
 
 
 class TransferViewSet(viewsets.GenericViewSet,
@@ -224,67 +407,113 @@ class TransferViewSet(viewsets.GenericViewSet,
                       mixins.CreateModelMixin):
     serializer_class = TransferSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HistoryPagination
     ordering_fields = ['date', 'amount']
 
     def get_queryset(self):
-        account = get_object_or_404(Account, user=self.request.user)
-        return account.from_account.all()
+        return Transfer.objects.filter(
+            from_account_id=get_account_id_or_404(self.request)
+        )
+
+    def get_archived(self):
+        field = (
+            'to_account_id' if self.action == 'to_my_account'
+            else 'from_account_id'
+        )
+        return archive.AccountArchive(
+            Transfer, **{field: get_account_id_or_404(self.request)}
+        )
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        from_account = Account.objects.filter(
-            user=self.request.user
-        ).get(id=self.request.data['from_account'])
-        amount = self.request.data['amount']
-        to_account = Account.objects.get(
-            id=self.request.data['to_account']
-        )
-
-        remains_cash = from_account.balance - decimal.Decimal(amount)
-        if remains_cash < 0:
+        from_account = serializer.validated_data['from_account']
+        if from_account.user_id != self.request.user.id:
             return Response(
-                {'status': 'У вас недостаточно средств '
-                           'для перевода!'},
-                status=status.HTTP_402_PAYMENT_REQUIRED
+                {'from_account': 'Укажите номер своего счета!'},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        if from_account == to_account:
+        try:
+            transfer = operations.transfer(
+                from_account.id,
+                serializer.validated_data['to_account'].id,
+                serializer.validated_data['amount']
+            )
+        except operations.SameAccount:
             return Response(
                 {'error': 'Получатель и отправитель совпадают, '
                           'укажите номер счета получателя!'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-        with transaction.atomic():
-            from_account.balance -= decimal.Decimal(amount)
-            from_account.save()
-
-            to_account.balance += decimal.Decimal(amount)
-            to_account.save()
-
-            Transfer.objects.create(
-                from_account=from_account,
-                to_account=to_account,
-                amount=amount
+        except operations.AccountNotFound:
+            return Response(
+                {'error': 'Счет не найден!'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except operations.InsufficientFunds:
+            return Response(
+                {'status': 'У вас недостаточно средств '
+                           'для перевода!'},
+                status=status.HTTP_402_PAYMENT_REQUIRED
             )
 
-        headers = self.get_success_headers(serializer.data)
+        data = self.get_serializer(transfer).data
+        headers = self.get_success_headers(data)
         return Response(
-            serializer.data, status=status.HTTP_201_CREATED, headers=headers
+            data, status=status.HTTP_201_CREATED, headers=headers
         )
 
+    @action(methods=['post'], detail=False,
+            permission_classes=[permissions.IsAuthenticated])
+    def batch(self, request):
+        if not isinstance(request.data, list) or not request.data:
+            return Response(
+                {'error': 'Передайте непустой список переводов!'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(request.data) > TRANSFER_BATCH_LIMIT:
+            return Response(
+                {'error': 'Слишком много переводов в одном запросе, '
+                          f'максимум {TRANSFER_BATCH_LIMIT}!'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        items, results = [], [None] * len(request.data)
+        for index, data in enumerate(request.data):
+            serializer = TransferBatchItemSerializer(data=data)
+            if serializer.is_valid():
+                items.append((index, serializer.validated_data))
+            else:
+                results[index] = {'status': 'error',
+                                  'errors': serializer.errors}
+
+        outcomes = []
+        if items:
+            outcomes = operations.transfer_batch(
+                [item for _, item in items], owner_id=request.user.id
+            )
+        for (index, _), outcome in zip(items, outcomes):
+            if isinstance(outcome, operations.OperationError):
+                results[index] = {'status': 'error',
+                                  'error': TRANSFER_ERRORS[type(outcome)]}
+            else:
+                data = self.get_serializer(outcome).data
+                results[index] = {'status': 'ok', 'transfer': data}
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
     @action(methods=['get'], detail=False,
             permission_classes=[permissions.IsAuthenticated])
     def to_my_account(self, request):
-        account = get_object_or_404(Account, user=self.request.user)
-        queryset = account.to_account.all()
+        queryset = self.filter_queryset(Transfer.objects.filter(
+            to_account_id=get_account_id_or_404(request)
+        ))
 
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
 
-        data = self.get_response_data(queryset)
-        return Response(data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
@@ -1,9 +1,47 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault(
     'DJANGO_SETTINGS_MODULE', 'api_avito.settings.production'
 )
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
-application = get_asgi_application()
+
+class ConcurrencyLimitedApplication:
+    """Обертка над ASGI-приложением Django для работы под uvicorn.
+
+    Django 3.2 выполняет синхронный код запросов в одном общем потоке
+    процесса, поэтому у этого потока одно постоянное соединение с БД,
+    как в режиме sync, и CONN_MAX_AGE и пул соединений работают как
+    обычно. Асинхронные ручки выполняют работу с БД в пуле из
+    ASGI_THREADS потоков (api.async_views.in_pool), у каждого из которых
+    свое соединение. Число одновременно принятых воркером запросов
+    ограничено ASGI_CONCURRENCY.
+    """
+
+    def __init__(self, application, concurrency, threads):
+        self.application = application
+        self.concurrency = concurrency
+        self.threads = threads
+        self.semaphore = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.application(scope, receive, send)
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(max_workers=self.threads)
+            )
+        async with self.semaphore:
+            await self.application(scope, receive, send)
+
+
+application = ConcurrencyLimitedApplication(
+    get_asgi_application(),
+    concurrency=int(os.environ.get('ASGI_CONCURRENCY', 32)),
+    threads=int(os.environ.get('ASGI_THREADS', 8)),
+)
@@ -27,16 +27,20 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'api_avito.urls'
 
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '0') == '1'
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
@@ -56,17 +60,54 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'api_avito.wsgi.application'
 
+DB_POOL_SIZE = os.environ.get('DB_POOL_SIZE')
+
 DATABASES = {
     'default': {
-        'ENGINE': os.environ.get('DB_ENGINE'),
+        'ENGINE': os.environ.get('DB_ENGINE', 'api.db.postgresql'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('POSTGRES_USER'),
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT'),
+        'CONN_MAX_AGE': (
+            0 if DB_POOL_SIZE else int(os.environ.get('DB_CONN_MAX_AGE', 60))
+        ),
+        'CONN_HEALTH_CHECKS': True,
+        'POOL': {
+            'MAX_SIZE': int(DB_POOL_SIZE),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+        } if DB_POOL_SIZE else None,
     }
 }
 
+DATABASE_REPLICAS = []
+for number, host in enumerate(
+    filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1
+):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['api.db.routers.ReplicaRouter']
+
+DATABASE_REPLICA_VIEWS = [
+    'actions-list',
+    'accounts-actions',
+    'transactions-list',
+    'transfers-list',
+    'transfers-to-my-account',
+    'accounts-statement',
+    'services-list',
+    'services-detail',
+    'admin:api_*_changelist',
+]
+
+REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME':
@@ -92,7 +133,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -102,12 +143,60 @@ REST_FRAMEWORK = {
         'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DATETIME_FORMAT': "%d.%m.%Y - %H:%M:%S",
+    'DEFAULT_THROTTLE_RATES': {
+        'confirmation_email': '5/hour',
+        'confirmation_ip': '30/min',
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
 }
 
+EXCHANGE_RATES = {
+    'SOURCE': 'api.rates.JSONFileRateSource',
+    'OPTIONS': {
+        'path': os.environ.get(
+            'EXCHANGE_RATES_FILE', os.path.join(BASE_DIR, 'rates.json')
+        ),
+    },
+    'TTL': int(os.environ.get('EXCHANGE_RATES_TTL', 3600)),
+}
+
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_ALLOWED_NETWORKS = os.environ.get(
+    'METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128'
+).split(',')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_DELAY = 30
+OUTBOX_LEASE = 300
+OUTBOX_MAX_RETRY_DELAY = 3600
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=365),
+    'TOKEN_USER_CLASS': 'api.authentication.ClaimsUser',
 }
 
+JWT_USER_CACHE_SIZE = 10000
+JWT_USER_CACHE_TTL = 60
+
+ACCOUNT_CACHE_TTL = 300
+
+CATALOG_CACHE_TTL = 300
+
+HISTORY_ARCHIVE_DIR = os.environ.get(
+    'HISTORY_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive')
+)
+HISTORY_RETENTION_MONTHS = int(os.environ.get('HISTORY_RETENTION_MONTHS', 12))
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Bearer': {
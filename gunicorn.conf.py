@@ -0,0 +1,22 @@
+import multiprocessing
+import os
+
+SERVER_MODES = {
+    'sync': ('api_avito.wsgi:application', 'sync'),
+    'gthread': ('api_avito.wsgi:application', 'gthread'),
+    'asgi': ('api_avito.asgi:application', 'uvicorn.workers.UvicornWorker'),
+}
+
+server_mode = os.environ.get('SERVER_MODE', 'sync')
+wsgi_app, worker_class = SERVER_MODES[server_mode]
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(
+    os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)
+)
+threads = (
+    int(os.environ.get('GUNICORN_THREADS', 4))
+    if server_mode == 'gthread' else 1
+)
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5